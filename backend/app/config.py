@@ -5,9 +5,135 @@ load_dotenv()
 
 class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Endpoint compatible con OpenAI alternativo (p. ej. el servidor simulado de benchmarks/)
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     UPLOAD_FOLDER: str = os.getenv("UPLOAD_FOLDER", "./uploads")
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set = {".pdf"}
 
+    # Cola de ingesta en segundo plano
+    # Procesos para extraer páginas en paralelo (cada uno abre el PDF por su cuenta)
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    INGEST_CONCURRENT_JOBS: int = int(os.getenv("INGEST_CONCURRENT_JOBS", "2"))
+    INGEST_JOB_HISTORY: int = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    INGEST_PAGE_WINDOW: int = int(os.getenv("INGEST_PAGE_WINDOW", "16"))
+    INGEST_COMMIT_CHUNKS: int = int(os.getenv("INGEST_COMMIT_CHUNKS", "1024"))
+
+    # Motor de embeddings por lotes
+    EMBEDDING_MAX_BATCH_TOKENS: int = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "100000"))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "512"))
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+
+    # Caché persistente de embeddings
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv(
+        "EMBEDDING_CACHE_PATH",
+        os.path.join(CHROMA_PERSIST_DIRECTORY, "embedding_cache.sqlite3")
+    )
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+    # Segmentos del índice en disco y compactación
+    SEGMENT_MAX_COUNT: int = int(os.getenv("SEGMENT_MAX_COUNT", "8"))
+    SEGMENT_MERGE_FACTOR: int = int(os.getenv("SEGMENT_MERGE_FACTOR", "4"))
+
+    # Tipo de índice ANN: flat, ivf, hnsw o ivfpq. Los segmentos con menos
+    # vectores que ANN_PROMOTION_THRESHOLD se mantienen planos (búsqueda exacta)
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "ivf")
+    ANN_PROMOTION_THRESHOLD: int = int(os.getenv("ANN_PROMOTION_THRESHOLD", "50000"))
+    ANN_TRAIN_SAMPLE: int = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", "0"))  # 0 = automático (~4*sqrt(n))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "16"))
+    HNSW_M: int = int(os.getenv("HNSW_M", "32"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    PQ_M: int = int(os.getenv("PQ_M", "64"))
+
+    # Espacios de nombres y borrado de documentos
+    DEFAULT_TENANT: str = os.getenv("DEFAULT_TENANT", "default")
+    SEGMENT_PURGE_RATIO: float = float(os.getenv("SEGMENT_PURGE_RATIO", "0.2"))
+
+    # Chunking: tamaño y overlap en caracteres o en tokens estimados (CHUNK_UNIT=tokens)
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNK_UNIT: str = os.getenv("CHUNK_UNIT", "chars")
+
+    # Streaming por WebSocket (protocolo "delta"): frames agrupados por tiempo o tamaño
+    WS_FLUSH_INTERVAL_MS: int = int(os.getenv("WS_FLUSH_INTERVAL_MS", "50"))
+    WS_FLUSH_CHARS: int = int(os.getenv("WS_FLUSH_CHARS", "512"))
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+    # Consultas simultáneas por conexión
+    WS_MAX_INFLIGHT: int = int(os.getenv("WS_MAX_INFLIGHT", "4"))
+
+    # Micro-batching de embeddings de consultas entre clientes (0 ms = desactivado)
+    QUERY_BATCH_MAX_SIZE: int = int(os.getenv("QUERY_BATCH_MAX_SIZE", "64"))
+    QUERY_BATCH_MAX_WAIT_MS: float = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+    # Proveedores de embeddings y de chat: "openai" o "local" (sin red ni OPENAI_API_KEY)
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "openai")
+    CHAT_PROVIDER: str = os.getenv("CHAT_PROVIDER", "openai")
+    OPENAI_EMBEDDING_MODEL: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    OPENAI_CHAT_MODEL: str = os.getenv("OPENAI_CHAT_MODEL", "gpt-3.5-turbo")
+    LOCAL_EMBEDDING_DIM: int = int(os.getenv("LOCAL_EMBEDDING_DIM", "384"))
+    LOCAL_CHAT_TOKEN_DELAY_MS: float = float(os.getenv("LOCAL_CHAT_TOKEN_DELAY_MS", "0"))
+
+    # Contexto del prompt: candidatos recuperados, presupuesto de tokens estimados y
+    # equilibrio relevancia/diversidad del reranking MMR (1 = solo relevancia)
+    CONTEXT_CANDIDATES: int = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1000"))
+    CONTEXT_MMR_LAMBDA: float = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+
+    # Caché semántica de respuestas: coseno mínimo entre preguntas, caducidad y tamaño
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+    # Cliente de OpenAI compartido por el proceso: pool HTTP, límites de la cuenta por
+    # minuto (0 = sin límite), peticiones simultáneas y espera máxima de una petición
+    # interactiva antes de rechazarla por saturación
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+    OPENAI_CHAT_RPM: int = int(os.getenv("OPENAI_CHAT_RPM", "3500"))
+    OPENAI_CHAT_TPM: int = int(os.getenv("OPENAI_CHAT_TPM", "1000000"))
+    OPENAI_EMBEDDING_RPM: int = int(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+    OPENAI_EMBEDDING_TPM: int = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+    OPENAI_MAX_QUEUE: int = int(os.getenv("OPENAI_MAX_QUEUE", "256"))
+    OPENAI_MAX_WAIT_SECONDS: float = float(os.getenv("OPENAI_MAX_WAIT_SECONDS", "10"))
+
+    # Varios workers de uvicorn sobre el mismo índice: segmentos mapeados (páginas
+    # compartidas entre procesos), recarga en caliente cuando otro worker confirma una
+    # versión nueva (0 ms = desactivada) e hilos de FAISS por worker (0 = núcleos / WORKERS)
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
+    INDEX_MMAP: bool = os.getenv("INDEX_MMAP", "true").lower() == "true"
+    INDEX_RELOAD_INTERVAL_MS: int = int(os.getenv("INDEX_RELOAD_INTERVAL_MS", "500"))
+    FAISS_THREADS: int = int(os.getenv("FAISS_THREADS", "0"))
+
+    # Ingesta masiva (POST /upload-pdfs y python -m app.ingest_dir): ficheros por
+    # subida, tamaño máximo de cada ZIP, chunks por llamada de embeddings, chunks por
+    # commit (un segmento) y PDFs extraídos por adelantado
+    BULK_MAX_FILES: int = int(os.getenv("BULK_MAX_FILES", "1000"))
+    BULK_MAX_UPLOAD_SIZE: int = int(os.getenv("BULK_MAX_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+    BULK_EMBED_CHUNKS: int = int(os.getenv("BULK_EMBED_CHUNKS", "2048"))
+    BULK_COMMIT_CHUNKS: int = int(os.getenv("BULK_COMMIT_CHUNKS", "8192"))
+    BULK_PREFETCH_FILES: int = int(os.getenv("BULK_PREFETCH_FILES", "8"))
+
+    # Deduplicación en la ingesta: PDFs idénticos (hash del fichero) y chunks casi
+    # duplicados (MinHash + LSH por bandas sobre shingles de palabras), que se enlazan
+    # al vector existente en lugar de indexarse de nuevo. Umbral: Jaccard estimado
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+    DEDUP_BANDS: int = int(os.getenv("DEDUP_BANDS", "16"))
+
+    # Almacenamiento compacto: vectores del índice FAISS como float16 o int8 (none =
+    # float32). Las distancias aproximadas se recalculan con los vectores float32 del
+    # segmento sobre VECTOR_RESCORE_FACTOR veces los resultados pedidos (1 = sin recalcular)
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    VECTOR_RESCORE_FACTOR: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
 settings = Settings()
@@ -0,0 +1,85 @@
+"""Ingesta masiva de un directorio de PDFs sin pasar por la API
+
+Uso (desde backend/):
+    python -m app.ingest_dir /ruta/a/pdfs
+    python -m app.ingest_dir /ruta/a/pdfs --tenant clientes --no-recursive
+
+Usa el mismo pipeline que POST /upload-pdfs (extracción en procesos,
+embeddings agrupados entre ficheros y commits grandes) y escribe en el índice
+configurado en CHROMA_PERSIST_DIRECTORY. Puede ejecutarse con el servidor en
+marcha: los commits toman el cerrojo del índice y los workers recargan solos.
+Si se interrumpe, volver a lanzarlo continúa donde se quedó: los PDFs que ya
+están indexados se saltan.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.config import settings
+from app.services.bulk_ingest import BulkIngest, BulkJob, collect_pdfs
+from app.services.rate_limiter import background
+from app.services.vector_store import get_vector_store
+
+
+async def _report_progress(job: BulkJob, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        print(
+            f"[{job.stage}] {job.files_done} indexados, {job.files_skipped} saltados, "
+            f"{job.files_failed} fallidos de {len(job.files)} ({job.chunks_done} chunks)",
+            file=sys.stderr
+        )
+
+
+async def ingest(job: BulkJob, workers: int, interval: float):
+    vector_store = get_vector_store()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reporter = asyncio.ensure_future(_report_progress(job, interval))
+        try:
+            # Prioridad de fondo: si se comparte el limitador, el chat va primero
+            with background():
+                return await BulkIngest(vector_store, executor).run(job)
+        finally:
+            reporter.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directorio con los PDFs")
+    parser.add_argument("--tenant", default=settings.DEFAULT_TENANT, help="Tenant de los documentos")
+    parser.add_argument("--no-recursive", action="store_true", help="No entrar en subdirectorios")
+    parser.add_argument("--workers", type=int, default=settings.PDF_EXTRACT_WORKERS, help="Procesos de extracción")
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    parser.add_argument("--output", help="Fichero JSON donde guardar el resultado de cada PDF")
+    args = parser.parse_args()
+
+    files = collect_pdfs(args.directory, recursive=not args.no_recursive)
+    if not files:
+        sys.exit(f"No hay PDFs en {args.directory}")
+    print(f"{len(files)} PDFs en {args.directory}", file=sys.stderr)
+
+    job = BulkJob(files, args.tenant)
+    started = time.perf_counter()
+    try:
+        result = asyncio.run(ingest(job, args.workers, args.progress_seconds))
+    except KeyboardInterrupt:
+        sys.exit(
+            f"Interrumpido: {job.files_done} PDFs quedaron indexados; "
+            "vuelva a lanzar el comando para continuar"
+        )
+    elapsed = time.perf_counter() - started
+    result["chunks_per_second"] = round(job.chunks_done / elapsed, 1) if elapsed else None
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    for failed in (item for item in job.file_results if item["status"] == "failed"):
+        print(f"Error en {failed['filename']}: {failed['error']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(job.to_dict(), file, indent=2, ensure_ascii=False)
+    sys.exit(1 if job.files_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
+import time
+_import_started = time.perf_counter()
 import os
 import json
+import shutil
+import asyncio
 import uuid
-from typing import Dict, List
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.config import settings
-from app.services.pdf_processor import PDFProcessor
-from app.services.vector_store import VectorStore
-from app.services.chat_service import ChatService
+from app.services.delta_stream import DeltaStream, PROTOCOLS, encode_message
+from app.services.openai_clients import openai_clients_stats
+from app.services.rate_limiter import Overloaded
+from app.services.startup import Startup
+from app.services import metrics
 
 # Crear directorios necesarios
 os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
@@ -25,10 +31,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar servicios
-pdf_processor = PDFProcessor()
-vector_store = VectorStore()
-chat_service = ChatService()
+# Los servicios pesados se crean en segundo plano al arrancar (ver /ready)
+startup = Startup()
+
+
+class Services:
+    """Servicios pesados del proceso; los crea el calentamiento en segundo plano"""
+
+    def __init__(self, vector_store, chat_service, ingest_queue):
+        self.vector_store = vector_store
+        self.chat_service = chat_service
+        self.ingest_queue = ingest_queue
+
+
+def build_services() -> Services:
+    """Importa los servicios, carga el índice y crea los clientes (se ejecuta en un hilo)"""
+    with startup.phase("import_services"):
+        # FAISS, NumPy, PyPDF2 y OpenAI no se importan hasta aquí
+        from app.services.vector_store import get_vector_store
+        from app.services.chat_service import ChatService
+        from app.services.ingest_queue import IngestQueue
+    with startup.phase("index_load"):
+        vector_store = get_vector_store()
+    with startup.phase("chat_service"):
+        chat_service = ChatService(vector_store)
+    return Services(vector_store, chat_service, IngestQueue(vector_store))
+
+
+async def get_services() -> Services:
+    """Servicios listos para atender una petición; 503 si no se pudieron iniciar"""
+    try:
+        return await startup.wait()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 
 # Almacenar conexiones WebSocket activas
 active_connections: Dict[str, WebSocket] = {}
@@ -36,32 +72,136 @@ active_connections: Dict[str, WebSocket] = {}
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        self.send_locks: Dict[str, asyncio.Lock] = {}
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        self.send_locks[client_id] = asyncio.Lock()
 
     def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+        self.send_locks.pop(client_id, None)
 
     async def send_personal_message(self, message: str, client_id: str):
-        if client_id in self.active_connections:
-            await self.active_connections[client_id].send_text(message)
+        websocket = self.active_connections.get(client_id)
+        lock = self.send_locks.get(client_id)
+        if websocket is None or lock is None:
+            return
+        # Varias consultas en curso comparten el socket: un envío cada vez
+        async with lock:
+            await websocket.send_text(message)
 
 manager = ConnectionManager()
 
+# Métricas que se leen en el momento de exportarlas
+metrics.registry.gauge(
+    "rag_websocket_connections", "Conexiones WebSocket abiertas",
+    callback=lambda: len(manager.active_connections)
+)
+def _index_vectors() -> int:
+    # Antes de terminar el arranque no hay índice que medir
+    if startup.services is None:
+        return 0
+    return startup.services.vector_store.snapshot.ntotal
+
+def _index_segments() -> int:
+    if startup.services is None:
+        return 0
+    return len(startup.services.vector_store.snapshot.segments)
+
+def _ingest_jobs_active() -> int:
+    if startup.services is None:
+        return 0
+    jobs = startup.services.ingest_queue.jobs.values()
+    return sum(1 for job in jobs if job.status in ("queued", "running"))
+
+metrics.registry.gauge(
+    "rag_index_vectors", "Vectores en el índice publicado", callback=_index_vectors
+)
+metrics.registry.gauge(
+    "rag_index_segments", "Segmentos en el índice publicado", callback=_index_segments
+)
+metrics.registry.gauge(
+    "rag_ingest_jobs_active", "Trabajos de ingesta en cola o en curso", callback=_ingest_jobs_active
+)
+metrics.registry.gauge(
+    "rag_openai_requests_in_flight", "Peticiones a OpenAI en curso (chat y embeddings)",
+    callback=lambda: sum(stats["in_flight"] for stats in openai_clients_stats().values())
+)
+metrics.registry.gauge(
+    "rag_openai_requests_queued", "Peticiones a OpenAI esperando turno en los limitadores",
+    callback=lambda: sum(stats["queued"] for stats in openai_clients_stats().values())
+)
+
+@app.on_event("startup")
+async def start_services():
+    # El servidor empieza a aceptar conexiones sin esperar a que se cargue el índice
+    startup.start(build_services, on_ready=lambda services: services.ingest_queue.start())
+
+@app.on_event("shutdown")
+async def stop_ingest_queue():
+    if startup.services:
+        await startup.services.ingest_queue.stop()
+
 @app.get("/")
 async def root():
     return {"message": "RAG Chat API está funcionando"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "vector_store": vector_store.get_collection_info()}
+    """Vivacidad del proceso: responde siempre, sin tocar el índice ni esperar al calentamiento"""
+    services = startup.services
+    health = {"status": "healthy", "ready": startup.ready}
+    if services:
+        cache = services.vector_store.embeddings.cache
+        batcher = services.vector_store.embeddings.query_batcher
+        answer_cache = services.chat_service.answer_cache
+        health.update(
+            embedding_cache=cache.stats() if cache else None,
+            query_batcher=batcher.stats() if batcher else None,
+            answer_cache=answer_cache.stats() if answer_cache else None,
+            openai_limits=openai_clients_stats() or None
+        )
+    return health
+
+@app.get("/ready")
+async def readiness_check():
+    """Preparado para atender: índice cargado y servicios creados (503 mientras tanto)
+
+    Incluye el desglose de tiempos del arranque.
+    """
+    readiness = startup.status()
+    if not startup.ready:
+        return JSONResponse(status_code=503, content=readiness)
+    readiness["vector_store"] = startup.services.vector_store.get_collection_info()
+    return readiness
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def save_upload(file: UploadFile, file_path: str, max_size: int):
+    """Guarda un archivo subido por partes, cortando en cuanto se supera `max_size`"""
+    received = 0
+    with open(file_path, "wb") as buffer:
+        while True:
+            piece = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not piece:
+                break
+            received += len(piece)
+            if received > max_size:
+                raise HTTPException(
+                    status_code=413, detail=f"El archivo {file.filename} supera el tamaño máximo permitido"
+                )
+            buffer.write(piece)
 
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Endpoint para subir y procesar un PDF"""
+async def upload_pdf(file: UploadFile = File(...), tenant_id: Optional[str] = Form(None)):
+    """Endpoint para subir un PDF y encolar su procesamiento"""
+    services = await get_services()
     try:
         # Validar archivo
         if not file.filename.lower().endswith('.pdf'):
@@ -71,37 +211,22 @@ async def upload_pdf(file: UploadFile = File(...)):
         file_id = str(uuid.uuid4())
         file_path = os.path.join(settings.UPLOAD_FOLDER, f"{file_id}.pdf")
         
-        # Guardar archivo
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        await save_upload(file, file_path, settings.MAX_FILE_SIZE)
         
-        # Validar PDF
-        if not pdf_processor.validate_pdf(file_path):
-            os.remove(file_path)
-            raise HTTPException(status_code=400, detail="Archivo PDF inválido o corrupto")
-        
-        # Procesar PDF
-        result = pdf_processor.process_pdf(file_path)
+        # La validación, extracción, embeddings e indexación se hacen en segundo plano
+        job = await services.ingest_queue.submit(file_path, file.filename, document_id=file_id, tenant_id=tenant_id)
         
-        # Añadir al almacén vectorial
-        success = vector_store.add_documents(result["chunks"])
-        
-        if not success:
-            os.remove(file_path)
-            raise HTTPException(status_code=500, detail="Error al procesar el documento")
-        
-        # Limpiar archivo temporal
-        os.remove(file_path)
-        
-        return JSONResponse(content={
-            "message": "PDF procesado exitosamente",
+        return JSONResponse(status_code=202, content={
+            "message": "PDF recibido, procesamiento en curso",
             "file_id": file_id,
-            "total_chunks": result["total_chunks"],
-            "total_characters": result["total_characters"]
+            "document_id": file_id,
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
         })
         
     except HTTPException:
+        if 'file_path' in locals() and os.path.exists(file_path):
+            os.remove(file_path)
         raise
     except Exception as e:
         # Limpiar archivo si existe
@@ -109,18 +234,91 @@ async def upload_pdf(file: UploadFile = File(...)):
             os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Error al procesar el PDF: {str(e)}")
 
+@app.post("/upload-pdfs")
+async def upload_pdfs(files: List[UploadFile] = File(...), tenant_id: Optional[str] = Form(None)):
+    """Ingesta masiva: varios PDFs o ZIPs con PDFs en una sola petición
+
+    Se procesan juntos, solapando la extracción, los embeddings y la
+    indexación entre ficheros. Los PDFs que ya están indexados para el tenant
+    se saltan, así que repetir una subida interrumpida la reanuda.
+    """
+    services = await get_services()
+    # Import diferido, como el resto de servicios (ver build_services)
+    from app.services.bulk_ingest import BulkJob, unpack_zip
+
+    job_dir = os.path.join(settings.UPLOAD_FOLDER, f"bulk-{uuid.uuid4()}")
+    os.makedirs(job_dir)
+    try:
+        loop = asyncio.get_running_loop()
+        saved = []
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".pdf"):
+                file_path = os.path.join(job_dir, f"{uuid.uuid4()}.pdf")
+                await save_upload(file, file_path, settings.MAX_FILE_SIZE)
+                saved.append((file_path, name))
+            elif name.lower().endswith(".zip"):
+                zip_path = os.path.join(job_dir, f"{uuid.uuid4()}.zip")
+                await save_upload(file, zip_path, settings.BULK_MAX_UPLOAD_SIZE)
+                try:
+                    saved.extend(await loop.run_in_executor(
+                        None, unpack_zip, zip_path, job_dir, settings.BULK_MAX_FILES - len(saved)
+                    ))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"{name}: {str(e)}")
+                os.remove(zip_path)
+            else:
+                raise HTTPException(status_code=400, detail=f"Solo se permiten archivos PDF o ZIP: {name}")
+            if len(saved) > settings.BULK_MAX_FILES:
+                raise HTTPException(status_code=400, detail=f"Se permiten como mucho {settings.BULK_MAX_FILES} PDFs")
+        if not saved:
+            raise HTTPException(status_code=400, detail="No se recibió ningún PDF")
+
+        job = services.ingest_queue.submit_bulk(BulkJob(saved, tenant_id, cleanup_dir=job_dir))
+        return JSONResponse(status_code=202, content={
+            "message": f"{len(saved)} PDFs recibidos, procesamiento en curso",
+            "files": len(saved),
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
+        })
+    except HTTPException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    except Exception as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error al procesar los archivos: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Obtiene la etapa y el progreso de un trabajo de ingesta"""
+    job = (await get_services()).ingest_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return JSONResponse(content=job.to_dict())
+
 @app.get("/documents")
-async def get_documents():
+async def get_documents(tenant_id: Optional[str] = None):
     """Obtiene información sobre los documentos cargados"""
+    vector_store = (await get_services()).vector_store
     try:
         info = vector_store.get_collection_info()
+        info["items"] = vector_store.list_documents(tenant_id)
         return JSONResponse(content=info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener documentos: {str(e)}")
 
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str):
+    """Obtiene el registro de un documento: tenant, chunks y rangos de vectores"""
+    document = (await get_services()).vector_store.get_document(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return JSONResponse(content=document)
+
 @app.delete("/documents")
 async def clear_documents():
     """Limpia todos los documentos del almacén vectorial"""
+    vector_store = (await get_services()).vector_store
     try:
         success = vector_store.clear_collection()
         if success:
@@ -130,56 +328,264 @@ async def clear_documents():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al limpiar documentos: {str(e)}")
 
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Elimina un documento del índice sin reconstruirlo"""
+    vector_store = (await get_services()).vector_store
+    try:
+        loop = asyncio.get_running_loop()
+        deleted = await loop.run_in_executor(None, vector_store.delete_document, document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al eliminar el documento: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return JSONResponse(content={"message": "Documento eliminado exitosamente", "document_id": document_id})
+
+async def answer_query(
+    client_id: str,
+    request_id: str,
+    protocol: str,
+    query: str,
+    chat_history: List[Dict[str, str]],
+    document_ids: Optional[List[str]],
+    tenant_id: Optional[str],
+    include_timings: bool = False
+):
+    """Genera y envía la respuesta a una consulta. Se ejecuta como tarea para poder cancelarla
+
+    Con `include_timings` el mensaje "complete" lleva el desglose de tiempos
+    por etapa de esta consulta (embedding, búsqueda, primer token...).
+    """
+    metrics.QUERIES_IN_FLIGHT.inc()
+    status = "error"
+    try:
+        with metrics.collect_timings() as timings:
+            if await send_answer(
+                client_id, request_id, protocol, query, chat_history, document_ids, tenant_id,
+                timings if include_timings else None
+            ):
+                status = "completed"
+    except Overloaded:
+        # Ya se avisó al cliente con un error "overloaded"
+        status = "overloaded"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        metrics.QUERIES_IN_FLIGHT.dec()
+        metrics.CHAT_REQUESTS.inc(status=status)
+
+async def send_answer(
+    client_id: str,
+    request_id: str,
+    protocol: str,
+    query: str,
+    chat_history: List[Dict[str, str]],
+    document_ids: Optional[List[str]],
+    tenant_id: Optional[str],
+    timings: Optional[Dict[str, float]]
+) -> bool:
+    """Envía la respuesta en el protocolo del cliente. Devuelve si se completó"""
+    started = time.perf_counter()
+    # Enviar indicador de que está procesando
+    await manager.send_personal_message(
+        json.dumps({"type": "processing", "message": "Procesando...", "request_id": request_id}), 
+        client_id
+    )
+    
+    try:
+        chat_service = (await startup.wait()).chat_service
+    except RuntimeError as e:
+        await manager.send_personal_message(
+            json.dumps({"type": "error", "message": f"Error: {str(e)}", "request_id": request_id}),
+            client_id
+        )
+        return False
+
+    first_chunk_pending = True
+
+    def on_chunk(chunk: str):
+        # Tiempo hasta el primer texto que sale hacia el cliente
+        nonlocal first_chunk_pending
+        if first_chunk_pending and chunk:
+            first_chunk_pending = False
+            metrics.record("ttft", time.perf_counter() - started)
+
+    def complete_fields() -> Dict[str, Any]:
+        metrics.record("response", time.perf_counter() - started)
+        return {"timings": metrics.timings_ms(timings)} if timings is not None else {}
+    
+    response_stream = chat_service.generate_response_stream(
+        query, chat_history, document_ids=document_ids, tenant_id=tenant_id
+    )
+    try:
+        if protocol == "delta":
+            # Solo el texto nuevo, agrupado en frames; el cliente concatena
+            stream = DeltaStream(
+                lambda text: manager.send_personal_message(
+                    encode_message({"type": "delta", "content": text, "request_id": request_id}), client_id
+                )
+            )
+            try:
+                async for chunk in response_stream:
+                    on_chunk(chunk)
+                    await stream.push(chunk)
+            except BaseException:
+                stream.abort()
+                raise
+            await stream.close()
+            await manager.send_personal_message(
+                encode_message({
+                    "type": "complete",
+                    "message": "Respuesta completada",
+                    "request_id": request_id,
+                    "length": stream.characters,
+                    "frames": stream.frames,
+                    **complete_fields()
+                }),
+                client_id
+            )
+            return True
+        
+        # Generar respuesta en streaming
+        full_response = ""
+        async for chunk in response_stream:
+            on_chunk(chunk)
+            full_response += chunk
+            await manager.send_personal_message(
+                json.dumps({
+                    "type": "chunk", 
+                    "content": chunk,
+                    "full_response": full_response,
+                    "request_id": request_id
+                }), 
+                client_id
+            )
+        
+        # Enviar mensaje de finalización
+        await manager.send_personal_message(
+            json.dumps({
+                "type": "complete", 
+                "message": "Respuesta completada",
+                "full_response": full_response,
+                "request_id": request_id,
+                **complete_fields()
+            }), 
+            client_id
+        )
+        return True
+    except asyncio.CancelledError:
+        try:
+            await manager.send_personal_message(
+                encode_message({"type": "cancelled", "request_id": request_id}), client_id
+            )
+        except Exception:
+            pass
+        raise
+    except Overloaded as e:
+        # Saturado: error específico para que el cliente reintente pasado `retry_after`
+        await manager.send_personal_message(
+            json.dumps({
+                "type": "error",
+                "code": "overloaded",
+                "message": f"Error: {str(e)}",
+                "retry_after": e.retry_after,
+                "request_id": request_id
+            }),
+            client_id
+        )
+        raise
+    except Exception as e:
+        await manager.send_personal_message(
+            json.dumps({"type": "error", "message": f"Error: {str(e)}", "request_id": request_id}), 
+            client_id
+        )
+        return False
+    finally:
+        # Cerrar el generador corta también el stream de OpenAI si aún seguía abierto
+        await response_stream.aclose()
+
 @app.websocket("/ws/chat")
 async def websocket_endpoint(websocket: WebSocket):
-    """Endpoint WebSocket para chat en tiempo real"""
+    """Endpoint WebSocket para chat en tiempo real
+
+    Por defecto usa el protocolo "legacy" (cada chunk con la respuesta completa).
+    Si el cliente envía {"type": "hello", "protocol": "delta"}, los chunks se
+    envían como mensajes "delta" que solo llevan el texto nuevo, agrupados por
+    tiempo o tamaño (ver DeltaStream).
+
+    Cada consulta se atiende en su propia tarea, así que puede haber varias en
+    curso (hasta WS_MAX_INFLIGHT). Todos los mensajes de respuesta llevan el
+    `request_id` de la consulta (el del cliente o uno generado), y
+    {"type": "cancel", "request_id": ...} detiene una consulta en curso.
+    Con "timings": true en la consulta, el mensaje "complete" incluye el
+    desglose de tiempos por etapa en milisegundos.
+    """
     client_id = str(uuid.uuid4())
     await manager.connect(websocket, client_id)
+    protocol = "legacy"
+    in_flight: Dict[str, asyncio.Task] = {}
     
     try:
         while True:
             # Recibir mensaje del cliente
             data = await websocket.receive_text()
             message_data = json.loads(data)
+            message_type = message_data.get("type")
+            
+            # Negociación del protocolo de streaming
+            if message_type == "hello":
+                requested = message_data.get("protocol")
+                protocol = requested if requested in PROTOCOLS else "legacy"
+                await manager.send_personal_message(
+                    encode_message({
+                        "type": "hello",
+                        "protocol": protocol,
+                        "flush_interval_ms": settings.WS_FLUSH_INTERVAL_MS,
+                        "flush_chars": settings.WS_FLUSH_CHARS,
+                        "max_inflight": settings.WS_MAX_INFLIGHT
+                    }),
+                    client_id
+                )
+                continue
             
+            if message_type == "cancel":
+                task = in_flight.get(str(message_data.get("request_id")))
+                if task is not None:
+                    task.cancel()
+                continue
+            
+            request_id = str(message_data.get("request_id") or uuid.uuid4())
             query = message_data.get("query", "")
             chat_history = message_data.get("chat_history", [])
+            document_ids = message_data.get("document_ids")
+            tenant_id = message_data.get("tenant_id")
+            include_timings = bool(message_data.get("timings"))
             
             if not query.strip():
                 await manager.send_personal_message(
-                    json.dumps({"type": "error", "message": "Consulta vacía"}), 
+                    json.dumps({"type": "error", "message": "Consulta vacía", "request_id": request_id}), 
                     client_id
                 )
                 continue
             
-            # Enviar indicador de que está procesando
-            await manager.send_personal_message(
-                json.dumps({"type": "processing", "message": "Procesando..."}), 
-                client_id
-            )
-            
-            # Generar respuesta en streaming
-            full_response = ""
-            async for chunk in chat_service.generate_response_stream(query, chat_history):
-                full_response += chunk
+            if request_id in in_flight or len(in_flight) >= settings.WS_MAX_INFLIGHT:
                 await manager.send_personal_message(
                     json.dumps({
-                        "type": "chunk", 
-                        "content": chunk,
-                        "full_response": full_response
+                        "type": "error",
+                        "message": "Demasiadas consultas en curso o request_id repetido",
+                        "request_id": request_id
                     }), 
                     client_id
                 )
+                continue
             
-            # Enviar mensaje de finalización
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "complete", 
-                    "message": "Respuesta completada",
-                    "full_response": full_response
-                }), 
-                client_id
-            )
+            task = asyncio.create_task(answer_query(
+                client_id, request_id, protocol, query, chat_history, document_ids, tenant_id,
+                include_timings
+            ))
+            in_flight[request_id] = task
+            task.add_done_callback(lambda _, rid=request_id: in_flight.pop(rid, None))
             
     except WebSocketDisconnect:
         manager.disconnect(client_id)
@@ -189,7 +595,20 @@ async def websocket_endpoint(websocket: WebSocket):
             client_id
         )
         manager.disconnect(client_id)
+    finally:
+        # Las respuestas pendientes de un cliente que se fue ya no se leerán
+        for task in list(in_flight.values()):
+            task.cancel()
+
+startup.record("import_app", time.perf_counter() - _import_started)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Con varios workers uvicorn necesita importar la app por su ruta en cada proceso
+    uvicorn.run(
+        "app.main:app" if settings.WORKERS > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        workers=settings.WORKERS,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
+    )
@@ -0,0 +1,238 @@
+import math
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import faiss
+import numpy as np
+from app.config import settings
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+# Codificación de los vectores dentro del índice: float32, float16 o int8 por dimensión
+QUANTIZATIONS = {"none": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+
+def resolve_index_type(n_vectors: int, index_type: str = None) -> str:
+    """Tipo de índice para un segmento: plano hasta superar el umbral de promoción"""
+    index_type = (index_type or settings.VECTOR_INDEX_TYPE).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice no soportado: {index_type}")
+    if index_type != "flat" and n_vectors < settings.ANN_PROMOTION_THRESHOLD:
+        return "flat"
+    return index_type
+
+
+def resolve_quantization(quantization: str = None) -> str:
+    quantization = (quantization or settings.VECTOR_QUANTIZATION).lower()
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Cuantización no soportada: {quantization}")
+    return quantization
+
+
+def index_key(index_type: str, quantization: str = "none") -> str:
+    """Nombre del índice persistido: cada codificación tiene su fichero"""
+    if quantization == "none" or index_type == "ivfpq":
+        return index_type
+    return f"{index_type}-{quantization}"
+
+
+def is_lossy(index_type: str, quantization: str = "none") -> bool:
+    """Si las distancias del índice son aproximadas y conviene recalcularlas con los vectores float32"""
+    return index_type == "ivfpq" or quantization != "none"
+
+
+def exact_distances(
+    query_vector: np.ndarray,
+    vectors: np.ndarray,
+    norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Distancias L2 al cuadrado (la métrica de los índices) de una consulta a unos vectores
+
+    Con `norms` (normas al cuadrado de los vectores) se calculan como
+    |v|² - 2·v·q + |q|², sin copiar los vectores: sirve para recorrer un
+    segmento entero mapeado.
+    """
+    if norms is not None:
+        query_vector = query_vector.reshape(-1)
+        distances = norms - 2 * (vectors @ query_vector) + float(query_vector @ query_vector)
+        return np.maximum(distances, 0, out=distances)
+    diff = np.asarray(vectors, dtype=np.float32) - query_vector.reshape(1, -1)
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def squared_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors)
+
+
+def exact_search(
+    query_vector: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    norms: Optional[np.ndarray] = None,
+    excluded_rows: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Los k vectores más cercanos por fuerza bruta, sin índice FAISS: (distancias, filas)
+
+    Las filas de `excluded_rows` (vectores borrados) nunca se devuelven.
+    """
+    distances = exact_distances(query_vector, vectors, norms)
+    if excluded_rows is not None and len(excluded_rows):
+        distances[excluded_rows] = np.inf
+    k = min(k, len(distances))
+    if k <= 0:
+        return distances[:0], np.empty(0, dtype=np.int64)
+    rows = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(k)
+    rows = rows[np.argsort(distances[rows])]
+    rows = rows[np.isfinite(distances[rows])]
+    return distances[rows], rows
+
+
+def _nlist_for(n_vectors: int) -> int:
+    if settings.IVF_NLIST > 0:
+        return settings.IVF_NLIST
+    # Regla habitual: ~4*sqrt(n) listas, con al menos 39 vectores de entrenamiento por lista
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def factory_string(index_type: str, dim: int, n_vectors: int, quantization: str = "none") -> str:
+    storage = QUANTIZATIONS[quantization]
+    if index_type == "flat":
+        return f"IDMap2,{storage}"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{settings.HNSW_M},{storage}"
+    if index_type == "ivf":
+        return f"IVF{_nlist_for(n_vectors)},{storage}"
+    if index_type == "ivfpq":
+        pq_m = settings.PQ_M
+        if dim % pq_m != 0:
+            raise ValueError(f"PQ_M={pq_m} debe dividir la dimensión {dim}")
+        return f"IVF{_nlist_for(n_vectors)},PQ{pq_m}x8"
+    raise ValueError(f"Tipo de índice no soportado: {index_type}")
+
+
+def build_index(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    index_type: str,
+    quantization: str = "none"
+) -> faiss.Index:
+    """Construye (y entrena si hace falta) un índice FAISS con ids externos
+
+    Con `quantization` los vectores se guardan en el índice como float16 o
+    int8 (cuantización escalar por dimensión, entrenada con la muestra).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    dim = vectors.shape[1]
+    index = faiss.index_factory(
+        dim, factory_string(index_type, dim, len(vectors), quantization), faiss.METRIC_L2
+    )
+
+    if index_type == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        # Entrenar con una muestra para acotar el coste en corpus grandes
+        sample_size = min(len(vectors), settings.ANN_TRAIN_SAMPLE)
+        rng = np.random.default_rng(0)
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        index.train(sample)
+
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def search_params(
+    index_type: str,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """Parámetros de búsqueda en tiempo de consulta para cada tipo de índice
+
+    `selector` restringe la búsqueda a un subconjunto de ids dentro de FAISS.
+    """
+    if index_type in ("ivf", "ivfpq"):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = nprobe or settings.IVF_NPROBE
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or settings.HNSW_EF_SEARCH
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+        # Mantener vivo el selector mientras existan los parámetros
+        params.referenced_selector = selector
+    return params
+
+
+def recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    configs: List[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Compara recall@k, latencia y tamaño de varias configuraciones frente a la búsqueda plana exacta
+
+    Cada configuración es un dict con "index_type" y opcionalmente "nprobe",
+    "ef_search", "quantization" y "rescore" (se piden k·rescore candidatos y
+    se reordenan con las distancias exactas, como en VectorStore). Los
+    índices se construyen una sola vez por tipo y cuantización.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    ids = np.arange(len(vectors), dtype=np.int64)
+
+    exact = build_index(vectors, ids, "flat")
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    if configs is None:
+        configs = (
+            [{"index_type": "ivf", "nprobe": p} for p in (1, 4, 16, 64)]
+            + [{"index_type": "hnsw", "ef_search": ef} for ef in (16, 64, 256)]
+            + [{"index_type": "ivfpq", "nprobe": p} for p in (4, 16, 64)]
+        )
+
+    report = [{
+        "index_type": "flat",
+        "recall": 1.0,
+        "ms_per_query": round(flat_ms, 4),
+        "build_s": 0.0,
+        "bytes_per_vector": round(len(faiss.serialize_index(exact)) / len(vectors), 1)
+    }]
+    built: Dict[str, Any] = {}
+    for config in configs:
+        index_type = config["index_type"]
+        quantization = config.get("quantization", "none")
+        key = index_key(index_type, quantization)
+        if key not in built:
+            start = time.perf_counter()
+            index = build_index(vectors, ids, index_type, quantization)
+            built[key] = (index, time.perf_counter() - start, len(faiss.serialize_index(index)) / len(vectors))
+        index, build_s, size = built[key]
+
+        params = search_params(index_type, config.get("nprobe"), config.get("ef_search"))
+        rescore = config.get("rescore", 1)
+        start = time.perf_counter()
+        _, found = index.search(queries, k * rescore, params=params)
+        if rescore > 1:
+            reranked = np.full((len(queries), k), -1, dtype=np.int64)
+            for row, (query, candidates) in enumerate(zip(queries, found)):
+                candidates = candidates[candidates != -1]
+                order = np.argsort(exact_distances(query, vectors[candidates]))[:k]
+                reranked[row, :len(order)] = candidates[order]
+            found = reranked
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+        report.append({
+            **config,
+            "recall": round(hits / truth.size, 4),
+            "ms_per_query": round(ms, 4),
+            "build_s": round(build_s, 3),
+            "bytes_per_vector": round(size, 1)
+        })
+    return report
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+
+# Trozos para reproducir una respuesta cacheada por el mismo camino de streaming
+_REPLAY_PIECE = re.compile(r"\s*\S+\s*")
+
+
+def replay_pieces(answer: str) -> Iterator[str]:
+    for match in _REPLAY_PIECE.finditer(answer):
+        yield match.group()
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "answer", "created_at")
+
+    def __init__(self, scope: Tuple, vector: np.ndarray, answer: str):
+        self.scope = scope
+        self.vector = vector
+        self.answer = answer
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """Caché semántica de respuestas: misma pregunta (o casi), mismo corpus, misma respuesta
+
+    La clave es el embedding normalizado de la consulta; hay acierto si el
+    coseno con una pregunta cacheada del mismo ámbito supera `threshold`. El
+    ámbito incluye los filtros (tenant, documentos) y el historial de chat, y
+    todo se descarta en cuanto cambia la versión del corpus (documentos
+    añadidos, borrados o colección limpiada). Expulsión por TTL y LRU.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl_seconds: float = None,
+        threshold: float = None
+    ):
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl = settings.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.threshold = settings.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.corpus_version: Optional[int] = None
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # Por ámbito: ids de entrada y sus vectores apilados para comparar de una vez
+        self._scopes: Dict[Tuple, Tuple[List[int], Optional[np.ndarray]]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_scope(
+        tenant_id: Optional[str],
+        document_ids: Optional[List[str]],
+        chat_history: Optional[List[Dict[str, str]]]
+    ) -> Tuple:
+        history = json.dumps(chat_history or [], ensure_ascii=False, sort_keys=True)
+        return (
+            tenant_id or "",
+            tuple(sorted(document_ids or [])),
+            hashlib.blake2b(history.encode("utf-8"), digest_size=16).digest()
+        )
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _sync_version(self, corpus_version: int):
+        if corpus_version != self.corpus_version:
+            self.clear()
+            self.corpus_version = corpus_version
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        ids, _ = self._scopes[entry.scope]
+        ids.remove(entry_id)
+        if ids:
+            # La matriz se vuelve a apilar en la siguiente búsqueda del ámbito
+            self._scopes[entry.scope] = (ids, None)
+        else:
+            del self._scopes[entry.scope]
+
+    def _expire(self):
+        now = time.monotonic()
+        # El orden LRU no es el de creación, así que se revisan todas (son pocas)
+        expired = [eid for eid, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for entry_id in expired:
+            self._remove(entry_id)
+
+    def get(self, corpus_version: int, scope: Tuple, query_vector) -> Optional[str]:
+        """Respuesta cacheada para una consulta parecida del mismo ámbito, o None"""
+        self._sync_version(corpus_version)
+        self._expire()
+        ids, matrix = self._scopes.get(scope, ([], None))
+        if not ids:
+            self.misses += 1
+            return None
+        if matrix is None:
+            matrix = np.stack([self._entries[eid].vector for eid in ids])
+            self._scopes[scope] = (ids, matrix)
+
+        similarity = matrix @ self._normalize(query_vector)
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            self.misses += 1
+            return None
+        entry_id = ids[best]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return self._entries[entry_id].answer
+
+    def put(self, corpus_version: int, scope: Tuple, query_vector, answer: str):
+        """Guarda una respuesta generada con la versión del corpus que se usó al buscar"""
+        if corpus_version != self.corpus_version:
+            # El corpus cambió mientras se generaba: la respuesta ya no vale
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(scope, self._normalize(query_vector), answer)
+        ids, _ = self._scopes.get(scope, ([], None))
+        ids.append(entry_id)
+        self._scopes[scope] = (ids, None)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self._scopes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "corpus_version": self.corpus_version
+        }
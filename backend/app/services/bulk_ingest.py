@@ -0,0 +1,387 @@
+import asyncio
+import functools
+import hashlib
+import os
+import time
+import uuid
+import zipfile
+import numpy as np
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services import dedup, metrics
+from app.services.ingest_queue import IngestJob, _inspect_pdf
+from app.services.pdf_processor import PDFProcessor
+from app.services.vector_store import VectorStore
+
+
+def bulk_document_id(digest: str, tenant_id: str) -> str:
+    """Id de documento determinista para un contenido y un tenant
+
+    Al reanudar una ingesta interrumpida, el mismo fichero da el mismo id, así
+    que basta mirar el registro del índice para saber si ya está.
+    """
+    return str(uuid.UUID(hashlib.sha256(f"{tenant_id}:{digest}".encode("utf-8")).hexdigest()[:32]))
+
+
+def _extract_document(file_path: str, document_id: str) -> Dict[str, Any]:
+    """Valida, extrae y trocea un PDF entero. Se ejecuta en un proceso del pool
+
+    En la ingesta masiva el paralelismo está entre ficheros, así que cada
+    proceso se encarga de un documento completo (el chunker conserva el
+    overlap entre páginas sin coordinar procesos).
+    """
+    started = time.perf_counter()
+    pages = _inspect_pdf(file_path)
+    processor = PDFProcessor()
+    chunker = processor.make_chunker(document_id)
+    chunks = []
+    for page, text in processor.iter_pages(file_path):
+        chunks.extend(chunker.feed(text, page))
+    chunks.extend(chunker.finish())
+    if not chunks:
+        raise ValueError("El PDF no contiene texto extraíble")
+    return {
+        "chunks": chunks,
+        "pages": pages,
+        "characters": chunker.total_characters,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def collect_pdfs(directory: str, recursive: bool = True) -> List[Tuple[str, str]]:
+    """(ruta, nombre relativo) de los PDFs de un directorio, en orden estable"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                found.append((path, os.path.relpath(path, directory)))
+        if not recursive:
+            break
+    return found
+
+
+def unpack_zip(zip_path: str, destination: str, max_files: int) -> List[Tuple[str, str]]:
+    """Extrae los PDFs de un ZIP con nombres generados (sin rutas del archivo)
+
+    Los miembros que superan MAX_FILE_SIZE se descartan leyendo como mucho
+    ese tamaño, aunque la cabecera del ZIP declare otro.
+    """
+    try:
+        extracted = []
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                    continue
+                if len(extracted) >= max_files:
+                    raise ValueError(f"El ZIP contiene más de {max_files} PDFs")
+                if member.file_size > settings.MAX_FILE_SIZE:
+                    continue
+                path = os.path.join(destination, f"{uuid.uuid4()}.pdf")
+                received = 0
+                with archive.open(member) as source, open(path, "wb") as target:
+                    for piece in iter(lambda: source.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                        received += len(piece)
+                        if received > settings.MAX_FILE_SIZE:
+                            break
+                        target.write(piece)
+                if received > settings.MAX_FILE_SIZE:
+                    os.remove(path)
+                    continue
+                extracted.append((path, member.filename))
+        return extracted
+    except zipfile.BadZipFile:
+        raise ValueError("Archivo ZIP inválido o corrupto")
+
+
+class BulkJob(IngestJob):
+    """Trabajo de ingesta de muchos PDFs, con el resultado de cada fichero"""
+
+    def __init__(
+        self,
+        files: List[Tuple[str, str]],
+        tenant_id: Optional[str] = None,
+        cleanup_dir: Optional[str] = None
+    ):
+        super().__init__(cleanup_dir or "", f"{len(files)} archivos", None, tenant_id or settings.DEFAULT_TENANT)
+        self.files = files
+        self.cleanup_dir = cleanup_dir
+        self.files_done = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.file_results: List[Dict[str, Any]] = []
+
+    def add_result(self, result: Dict[str, Any]):
+        self.file_results.append(result)
+        if result["status"] == "completed":
+            self.files_done += 1
+        elif result["status"] == "skipped":
+            self.files_skipped += 1
+        else:
+            self.files_failed += 1
+        finished = self.files_done + self.files_skipped + self.files_failed
+        self.update(progress=finished / max(len(self.files), 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = super().to_dict()
+        data.update(
+            files_total=len(self.files),
+            files_done=self.files_done,
+            files_skipped=self.files_skipped,
+            files_failed=self.files_failed,
+            files=self.file_results
+        )
+        return data
+
+
+class BulkIngest:
+    """Ingesta masiva en tres etapas solapadas entre ficheros
+
+    - Extracción: varios PDFs a la vez en el pool de procesos (un documento
+      entero por proceso), con unos pocos más en vuelo para no dejarlo ocioso.
+    - Embeddings: cada llamada agrupa los chunks de todos los documentos ya
+      extraídos (hasta BULK_EMBED_CHUNKS), así que los ficheros pequeños no
+      generan peticiones pequeñas. Antes se quitan los chunks casi duplicados
+      del índice o del propio lote (ver dedup.plan_dedup).
+    - Indexación: los documentos con embeddings se acumulan hasta
+      BULK_COMMIT_CHUNKS y se confirman en un solo segmento y un solo commit
+      del manifiesto, en un hilo, mientras se calculan los siguientes.
+
+    Los documentos nunca se parten entre commits, así que una interrupción deja
+    cada documento entero o ausente. Como los ids son deterministas (contenido
+    y tenant), repetir la ingesta la reanuda: se saltan los ficheros que ya
+    están en el índice.
+    """
+
+    def __init__(self, vector_store: VectorStore, executor: Executor):
+        self.vector_store = vector_store
+        self.executor = executor
+        # Documentos ya vistos en esta ingesta (ficheros repetidos dentro del lote)
+        self._seen = set()
+        # Firmas de los documentos deduplicados que aún esperan su commit
+        self._pending: Dict[str, np.ndarray] = {}
+
+    async def run(self, job: BulkJob) -> Dict[str, Any]:
+        job.update(stage="extracting", status="running")
+        started = time.perf_counter()
+        extracted: asyncio.Queue = asyncio.Queue(maxsize=settings.BULK_PREFETCH_FILES)
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=1)
+        stages = [
+            asyncio.ensure_future(self._extract_stage(job, extracted)),
+            asyncio.ensure_future(self._embed_stage(job, extracted, embedded)),
+            asyncio.ensure_future(self._index_stage(job, embedded))
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException as e:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            if not isinstance(e, Exception):
+                raise
+            job.error = str(e)
+            job.update(stage="failed", status="failed")
+            metrics.INGEST_JOBS.inc(status="failed")
+            raise Exception(f"Error en la ingesta masiva: {str(e)}")
+
+        job.result = {
+            "files_total": len(job.files),
+            "files_done": job.files_done,
+            "files_skipped": job.files_skipped,
+            "files_failed": job.files_failed,
+            "total_chunks": job.chunks_done,
+            "total_pages": job.pages_done,
+            "dedup": job.dedup or None,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        job.update(stage="completed", status="completed", progress=1.0)
+        metrics.INGEST_JOBS.inc(status="completed")
+        return job.result
+
+    async def _prepare(self, job: BulkJob, file_path: str, filename: str) -> Dict[str, Any]:
+        """Identifica un fichero y, si no está ya indexado, lo extrae en el pool"""
+        loop = asyncio.get_running_loop()
+        item = {"filename": filename, "document_id": None, "status": "failed", "error": None}
+        try:
+            digest = await loop.run_in_executor(None, dedup.file_digest, file_path)
+            document_id = bulk_document_id(digest, job.tenant_id)
+            item.update(document_id=document_id, digest=digest)
+            if document_id in self._seen or self.vector_store.get_document(document_id):
+                item["status"] = "skipped"
+                return item
+            self._seen.add(document_id)
+            # El mismo fichero subido antes por /upload-pdf tiene otro id, pero el mismo hash
+            duplicate_of = self.vector_store.find_document_by_hash(digest, job.tenant_id)
+            if duplicate_of:
+                item.update(status="skipped", duplicate_of=duplicate_of)
+                metrics.INGEST_DUPLICATES.inc(kind="file")
+                return item
+            extraction = await loop.run_in_executor(self.executor, _extract_document, file_path, document_id)
+            metrics.record("pdf_extract", extraction.pop("seconds"))
+            item.update(extraction, status="extracted")
+        except Exception as e:
+            item["error"] = str(e)
+        return item
+
+    async def _extract_stage(self, job: BulkJob, outbox: asyncio.Queue):
+        pending = list(reversed(job.files))
+        in_flight = set()
+        limit = max(1, settings.PDF_EXTRACT_WORKERS) + settings.BULK_PREFETCH_FILES
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < limit:
+                    in_flight.add(asyncio.ensure_future(self._prepare(job, *pending.pop())))
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    await outbox.put(task.result())
+        finally:
+            for task in in_flight:
+                task.cancel()
+        await outbox.put(None)
+
+    async def _embed_stage(self, job: BulkJob, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        finished = False
+        while not finished:
+            # Lo que haya ya extraído entra en la misma llamada, hasta el tope
+            items = [await inbox.get()]
+            count = len(items[0]["chunks"]) if items[0] and items[0]["status"] == "extracted" else 0
+            while not inbox.empty() and count < settings.BULK_EMBED_CHUNKS:
+                item = inbox.get_nowait()
+                items.append(item)
+                if item and item["status"] == "extracted":
+                    count += len(item["chunks"])
+            if None in items:
+                finished = True
+                items = [item for item in items if item is not None]
+
+            ready = [item for item in items if item["status"] == "extracted"]
+            if ready:
+                job.update(stage="embedding")
+                try:
+                    if settings.DEDUP_ENABLED:
+                        await self._dedup(job, ready)
+                    chunks = [chunk for item in ready for chunk in item["chunks"]]
+                    embeddings = await self.vector_store.aembed_documents(chunks)
+                    offset = 0
+                    for item in ready:
+                        item["embeddings"] = embeddings[offset:offset + len(item["chunks"])]
+                        item["status"] = "embedded"
+                        offset += len(item["chunks"])
+                except Exception as e:
+                    # Se reintentarán al repetir la ingesta
+                    for item in ready:
+                        item.update(status="failed", error=str(e))
+                        self._pending.pop(item["document_id"], None)
+            await outbox.put(items)
+        await outbox.put(None)
+
+    async def _dedup(self, job: BulkJob, items: List[Dict[str, Any]]):
+        """Deja en cada documento solo los chunks nuevos, con sus firmas y enlaces"""
+        pending = [
+            {"document_id": document_id, "signatures": signatures}
+            for document_id, signatures in self._pending.items()
+        ]
+        with metrics.span("dedup"):
+            plans = await asyncio.get_running_loop().run_in_executor(
+                None, dedup.plan_dedup, self.vector_store, items, job.tenant_id, pending
+            )
+        for item, plan in zip(items, plans):
+            self._pending[item["document_id"]] = plan["signatures"]
+            item.update(
+                chunks=plan["chunks"],
+                signatures=plan["signatures"],
+                linked_ids=plan["linked_ids"],
+                batch_links=plan["batch_links"],
+                dedup=plan["stats"]
+            )
+
+    async def _index_stage(self, job: BulkJob, inbox: asyncio.Queue):
+        buffered: List[Dict[str, Any]] = []
+        count = 0
+        while True:
+            items = await inbox.get()
+            if items is None:
+                break
+            for item in items:
+                if item["status"] == "embedded":
+                    buffered.append(item)
+                    count += len(item["chunks"])
+                else:
+                    self._finish(job, item)
+            if count >= settings.BULK_COMMIT_CHUNKS:
+                await self._commit(job, buffered)
+                buffered, count = [], 0
+        await self._commit(job, buffered)
+
+    async def _commit(self, job: BulkJob, items: List[Dict[str, Any]]):
+        """Confirma varios documentos en un solo segmento y un solo commit"""
+        if not items:
+            return
+        job.update(stage="indexing")
+        loop = asyncio.get_running_loop()
+        batch = [
+            {
+                "documents": item["chunks"],
+                "embeddings": item["embeddings"],
+                "document_id": item["document_id"],
+                "tenant_id": job.tenant_id,
+                "filename": item["filename"],
+                "content_hash": item["digest"],
+                "signatures": item.get("signatures"),
+                "linked_ids": item.get("linked_ids"),
+                "batch_links": item.get("batch_links")
+            }
+            for item in items
+        ]
+        try:
+            added = await loop.run_in_executor(
+                None, functools.partial(self.vector_store.add_embedded_batch, batch, skip_existing=True)
+            )
+        except Exception as e:
+            for item in items:
+                item.update(status="failed", error=str(e))
+                self._finish(job, item)
+            return
+        finally:
+            for item in items:
+                # Ya confirmados: los siguientes lotes los encuentran en el índice
+                self._pending.pop(item["document_id"], None)
+
+        added = set(added)
+        for item in items:
+            if item["document_id"] not in added:
+                # Otro proceso lo indexó mientras tanto
+                item["status"] = "skipped"
+                self._finish(job, item)
+                continue
+            item["status"] = "completed"
+            stats = item.get("dedup")
+            job.chunks_done += len(item["chunks"])
+            job.pages_done += item["pages"]
+            metrics.INGEST_CHUNKS.inc(len(item["chunks"]))
+            metrics.INGEST_PAGES.inc(item["pages"])
+            if stats:
+                dedup.merge_stats(job.dedup, stats)
+                metrics.INGEST_DUPLICATES.inc(stats["linked"], kind="linked")
+                metrics.INGEST_DUPLICATES.inc(stats["dropped"], kind="dropped")
+            self._finish(job, item)
+
+    @staticmethod
+    def _finish(job: BulkJob, item: Dict[str, Any]):
+        result = {
+            "filename": item["filename"],
+            "document_id": item["document_id"],
+            "status": item["status"],
+            "error": item["error"]
+        }
+        if item.get("duplicate_of"):
+            result["duplicate_of"] = item["duplicate_of"]
+        if item["status"] == "completed":
+            stats = item.get("dedup")
+            result["chunks"] = len(item["chunks"])
+            result["pages"] = item["pages"]
+            if stats:
+                result["dedup"] = dedup.merge_stats({}, stats)
+        job.add_result(result)
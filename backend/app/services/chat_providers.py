@@ -0,0 +1,143 @@
+import asyncio
+import re
+from typing import List, Dict, AsyncIterator
+from app.config import settings
+from app.services.openai_clients import estimate_tokens, get_openai_clients
+
+NO_INFO_MESSAGE = "No poseo información sobre ese tema en el documento cargado"
+
+_WORD = re.compile(r"\w+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_STREAM_TOKEN = re.compile(r"\S+\s*")
+_CONTEXT_HEADER = re.compile(r"^(Contexto de los documentos:|Documento \d+:)\s*", re.M)
+
+
+class OpenAIChatProvider:
+    """Generación con la API de chat de OpenAI
+
+    Cada llamada reserva en el limitador los tokens del prompt más
+    `max_tokens`, y un stream mantiene su turno hasta que termina.
+    """
+
+    def __init__(self, model: str = None):
+        self.clients = get_openai_clients()
+        self.limiter = self.clients.limiters["chat"]
+        self.model = model or settings.OPENAI_CHAT_MODEL
+
+    @staticmethod
+    def _tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        return estimate_tokens([m["content"] for m in messages]) + max_tokens
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> AsyncIterator[str]:
+        async with self.clients.request("chat", self._tokens(messages, max_tokens)) as client:
+            stream = await client.with_options(max_retries=2).chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Si se cancela la consulta o se cierra el generador, cerrar la
+                # conexión corta la generación y no se pagan más tokens. Se cierra la
+                # respuesta HTTP: AsyncStream no tiene close() en el openai fijado
+                await stream.response.aclose()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        async with self.clients.request("chat", self._tokens(messages, max_tokens)) as client:
+            response = await client.with_options(max_retries=2).chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        return response.choices[0].message.content
+
+
+class LocalChatProvider:
+    """Generador local y determinista, sin red: respuesta extractiva a partir del contexto
+
+    Toma el último mensaje (contexto + "Pregunta: ...", como lo construye
+    ChatService), puntúa cada frase del contexto por las palabras que comparte
+    con la pregunta y devuelve las mejores en su orden original, palabra a
+    palabra. Misma entrada, misma salida; útil para trabajar sin conexión y
+    para pruebas de carga sin coste por token.
+    """
+
+    model = "local-extractive"
+    MAX_SENTENCES = 3
+
+    def __init__(self, token_delay_ms: float = None):
+        delay = settings.LOCAL_CHAT_TOKEN_DELAY_MS if token_delay_ms is None else token_delay_ms
+        self.token_delay = delay / 1000
+
+    def answer(self, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        context, separator, question = prompt.rpartition("\n\nPregunta: ")
+        if not separator:
+            context, question = "", prompt
+
+        question_words = set(_WORD.findall(question.lower()))
+        sentences = [
+            sentence.strip()
+            for sentence in _SENTENCE.split(_CONTEXT_HEADER.sub("", context))
+            if sentence.strip()
+        ]
+        scored = [
+            (len(question_words & set(_WORD.findall(sentence.lower()))), position, sentence)
+            for position, sentence in enumerate(sentences)
+        ]
+        best = sorted((s for s in scored if s[0] > 0), key=lambda s: (-s[0], s[1]))[:self.MAX_SENTENCES]
+        if not best:
+            return NO_INFO_MESSAGE
+        return " ".join(sentence for _, _, sentence in sorted(best, key=lambda s: s[1]))
+
+    def _tokens(self, messages: List[Dict[str, str]], max_tokens: int) -> List[str]:
+        return _STREAM_TOKEN.findall(self.answer(messages))[:max_tokens]
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> AsyncIterator[str]:
+        for token in self._tokens(messages, max_tokens):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        return "".join(self._tokens(messages, max_tokens))
+
+
+CHAT_PROVIDERS = {
+    "openai": OpenAIChatProvider,
+    "local": LocalChatProvider
+}
+
+
+def get_chat_provider(name: str = None):
+    """Crea el proveedor de chat configurado en CHAT_PROVIDER"""
+    name = (name or settings.CHAT_PROVIDER).lower()
+    if name not in CHAT_PROVIDERS:
+        raise ValueError(f"Proveedor de chat no soportado: {name}")
+    return CHAT_PROVIDERS[name]()
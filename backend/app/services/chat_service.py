@@ -1,16 +1,76 @@
 import json
-from typing import List, Dict, Any, AsyncGenerator
-from openai import AsyncOpenAI
+import time
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple
 from app.config import settings
-from app.services.vector_store import VectorStore
+from app.services import metrics
+from app.services.answer_cache import AnswerCache, replay_pieces
+from app.services.chat_providers import get_chat_provider
+from app.services.context_builder import ContextBuilder
+from app.services.rate_limiter import Overloaded
+from app.services.vector_store import VectorStore, get_vector_store
 
 class ChatService:
-    def __init__(self):
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY no está configurada")
-        
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: VectorStore = None, provider=None):
+        # Proveedor configurado en CHAT_PROVIDER (OpenAI o generador local)
+        self.provider = provider or get_chat_provider()
+        # Compartir el almacén del proceso para ver al instante los documentos nuevos
+        self.vector_store = vector_store or get_vector_store()
+        self.context_builder = ContextBuilder()
+        self.answer_cache = AnswerCache() if settings.ANSWER_CACHE_ENABLED else None
+    
+    async def _cached_answer(
+        self,
+        query: str,
+        chat_history: Optional[List[Dict[str, str]]],
+        document_ids: Optional[List[str]],
+        tenant_id: Optional[str]
+    ) -> Tuple[Optional[str], Optional[Tuple], Optional[List[float]]]:
+        """Busca la respuesta de una pregunta equivalente sobre el mismo corpus
+
+        Devuelve (respuesta cacheada o None, clave para guardar la nueva, embedding
+        de la consulta para reutilizarlo en la búsqueda).
+        """
+        if self.answer_cache is None or self.vector_store.snapshot.ntotal == 0:
+            return None, None, None
+        # La versión se toma antes de buscar: si cambia durante la generación no se guarda
+        corpus_version = self.vector_store.corpus_version
+        # Solo los últimos mensajes del historial llegan al prompt
+        scope = AnswerCache.make_scope(tenant_id, document_ids, (chat_history or [])[-5:])
+        query_vector = await self.vector_store.embeddings.aembed_query(query)
+        cached = self.answer_cache.get(corpus_version, scope, query_vector)
+        metrics.ANSWER_CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        return cached, (corpus_version, scope, query_vector), query_vector
+    
+    def _check_capacity(self, max_tokens: int):
+        """Rechaza la consulta antes de buscar si el limitador del chat no la atendería a tiempo"""
+        limiter = getattr(self.provider, "limiter", None)
+        if limiter is not None:
+            limiter.check_admission(max_tokens)
+
+    def _remember(self, cache_key: Optional[Tuple], answer: str):
+        if cache_key is not None and answer:
+            self.answer_cache.put(*cache_key, answer)
+    
+    async def _retrieve(
+        self,
+        query: str,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Recupera más candidatos de los necesarios y arma con ellos el contexto"""
+        candidates = await self.vector_store.asearch_similar(
+            query,
+            n_results=settings.CONTEXT_CANDIDATES,
+            document_ids=document_ids,
+            tenant_id=tenant_id,
+            with_vectors=True,
+            query_vector=query_vector
+        )
+        with metrics.span("context_build"):
+            pieces = self.context_builder.build(candidates)
+        metrics.CONTEXT_TOKENS.inc(sum(piece["tokens"] for piece in pieces))
+        return pieces
     
     def _format_context(self, similar_docs: List[Dict[str, Any]]) -> str:
         """Formatea los documentos similares como contexto"""
@@ -30,12 +90,28 @@ class ChatService:
     async def generate_response_stream(
         self, 
         query: str, 
-        chat_history: List[Dict[str, str]] = None
+        chat_history: List[Dict[str, str]] = None,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
-        """Genera una respuesta en streaming usando RAG"""
+        """Genera una respuesta en streaming usando RAG
+
+        Cancelar la tarea que consume el generador (o cerrarlo con `aclose()`)
+        cierra también el stream del proveedor. Una respuesta cacheada se
+        emite por trozos igual que una generada.
+        """
         try:
-            # Buscar documentos similares
-            similar_docs = self.vector_store.search_similar(query, n_results=3)
+            cached, cache_key, query_vector = await self._cached_answer(
+                query, chat_history, document_ids, tenant_id
+            )
+            if cached is not None:
+                for piece in replay_pieces(cached):
+                    yield piece
+                return
+            self._check_capacity(max_tokens=1000)
+            
+            # Buscar documentos similares (opcionalmente limitados a documentos o tenant)
+            similar_docs = await self._retrieve(query, document_ids, tenant_id, query_vector)
             
             # Si no hay resultados, responder con el mensaje específico
             if not self._check_relevance(similar_docs, query):
@@ -68,30 +144,47 @@ class ChatService:
             })
             
             # Generar respuesta en streaming
-            stream = await self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                stream=True,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            started = time.perf_counter()
+            answer = []
+            tokens = self.provider.stream(messages, temperature=0.7, max_tokens=1000)
+            try:
+                async for token in tokens:
+                    if not answer:
+                        metrics.record("llm_ttft", time.perf_counter() - started)
+                    answer.append(token)
+                    yield token
+            finally:
+                # Cerrar el stream del proveedor en cuanto se cierra este generador
+                await tokens.aclose()
+                metrics.record("llm_generation", time.perf_counter() - started)
+                metrics.CHAT_TOKENS.inc(len(answer), model=self.provider.model)
+            # Solo llega aquí una respuesta completa (no cancelada ni con error)
+            self._remember(cache_key, "".join(answer))
                     
+        except Overloaded:
+            # Saturación: el llamador la rechaza con un error propio, no como texto de respuesta
+            raise
         except Exception as e:
             yield f"Error al generar respuesta: {str(e)}"
     
     async def generate_response(
         self, 
         query: str, 
-        chat_history: List[Dict[str, str]] = None
+        chat_history: List[Dict[str, str]] = None,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None
     ) -> str:
         """Genera una respuesta completa usando RAG"""
         try:
-            # Buscar documentos similares
-            similar_docs = self.vector_store.search_similar(query, n_results=3)
+            cached, cache_key, query_vector = await self._cached_answer(
+                query, chat_history, document_ids, tenant_id
+            )
+            if cached is not None:
+                return cached
+            self._check_capacity(max_tokens=1000)
+            
+            # Buscar documentos similares (opcionalmente limitados a documentos o tenant)
+            similar_docs = await self._retrieve(query, document_ids, tenant_id, query_vector)
             
             # Si no hay resultados, responder con el mensaje específico
             if not self._check_relevance(similar_docs, query):
@@ -123,15 +216,13 @@ class ChatService:
             })
             
             # Generar respuesta
-            response = await self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
+            with metrics.span("llm_generation"):
+                answer = await self.provider.complete(messages, temperature=0.7, max_tokens=1000)
+            self._remember(cache_key, answer)
+            return answer
             
+        except Overloaded:
+            raise
         except Exception as e:
             return f"Error al generar respuesta: {str(e)}"
     
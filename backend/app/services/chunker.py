@@ -0,0 +1,209 @@
+import bisect
+import hashlib
+import re
+import uuid
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.config import settings
+
+# Solo las secuencias de espacios que no son ya un único " ": sustituir cada
+# espacio simple por otro igual es la mayor parte del coste con `\s+`
+_WHITESPACE = re.compile(r'[^\S ]\s*| \s+')
+# Último final de frase, de cláusula o espacio en una ventana: el `.*` voraz
+# retrocede desde el final dentro del motor de regex, sin bucles en Python
+_LAST_SENTENCE = re.compile(r'.*[.!?](?= )', re.S)
+_LAST_CLAUSE = re.compile(r'.*[,;:](?= )', re.S)
+_LAST_SPACE = re.compile(r'.* ', re.S)
+_NEXT_SENTENCE = re.compile(r'[.!?] ')
+
+# Misma estimación que EmbeddingsService.estimate_tokens: ~3 bytes UTF-8 por token
+BYTES_PER_TOKEN = 3
+UNITS = ("chars", "tokens")
+
+
+class Chunker:
+    """Divide texto en chunks cortando en finales de frase, de cláusula o de palabra
+
+    Acepta el texto por partes (página a página) y solo guarda lo que aún no se
+    ha emitido. El tamaño y el overlap se miden en caracteres o en tokens
+    estimados (`unit="tokens"`). Cada chunk lleva sus offsets de carácter sobre
+    el texto normalizado del documento, las páginas que abarca y un id
+    determinista derivado de `document_key`, la posición y el contenido.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = None,
+        chunk_overlap: int = None,
+        unit: str = None,
+        document_key: str = "",
+        source: str = "pdf_upload"
+    ):
+        self.chunk_size = chunk_size or settings.CHUNK_SIZE
+        self.chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        self.unit = (unit or settings.CHUNK_UNIT).lower()
+        if self.unit not in UNITS:
+            raise ValueError(f"Unidad de chunk no soportada: {self.unit}")
+        if not 0 <= self.chunk_overlap < self.chunk_size:
+            raise ValueError("El overlap debe ser menor que el tamaño del chunk")
+        self.document_key = document_key.encode("utf-8")
+        self.source = source
+
+        self.buffer = ""
+        self.base = 0   # offset en el documento del primer carácter del buffer
+        self.start = 0  # inicio del siguiente chunk dentro del buffer
+        self.chunk_index = 0
+        self.total_characters = 0
+        # Offsets acumulados en bytes UTF-8; None mientras el buffer sea ASCII
+        self._byte_offsets: Optional[np.ndarray] = None
+        # Offset en el documento donde empieza cada página
+        self.page_offsets: List[int] = []
+        self.page_numbers: List[int] = []
+
+    # --- Conversión entre unidades y posiciones del buffer ---
+
+    def _scale(self) -> int:
+        return BYTES_PER_TOKEN if self.unit == "tokens" else 1
+
+    def _advance(self, pos: int, units: int) -> int:
+        """Posición a `units` unidades por delante de `pos`"""
+        if self._byte_offsets is None:
+            return pos + units * self._scale()
+        target = self._byte_offsets[pos] + units * BYTES_PER_TOKEN
+        return int(np.searchsorted(self._byte_offsets, target, side="right")) - 1
+
+    def _retreat(self, pos: int, units: int) -> int:
+        """Posición a `units` unidades por detrás de `pos`"""
+        if self._byte_offsets is None:
+            return max(pos - units * self._scale(), 0)
+        target = self._byte_offsets[pos] - units * BYTES_PER_TOKEN
+        return int(np.searchsorted(self._byte_offsets, target, side="left"))
+
+    def _update_byte_offsets(self):
+        if self.unit != "tokens" or (self._byte_offsets is None and self.buffer.isascii()):
+            return
+        codes = np.frombuffer(self.buffer.encode("utf-32-le"), dtype=np.uint32)
+        widths = 1 + (codes >= 0x80).astype(np.int64) + (codes >= 0x800) + (codes >= 0x10000)
+        self._byte_offsets = np.concatenate(([0], np.cumsum(widths)))
+
+    # --- Cortes ---
+
+    def _find_end(self, start: int, limit: int) -> int:
+        """Mejor corte en la segunda mitad del chunk: frase, luego cláusula, luego palabra
+
+        El corte nunca pasa de `limit`; el espacio que sigue a la puntuación
+        puede estar justo en `limit`.
+        """
+        low = start + (limit - start) // 2
+        for pattern in (_LAST_SENTENCE, _LAST_CLAUSE):
+            match = pattern.match(self.buffer, low, limit + 1)
+            if match:
+                return match.end()
+        match = _LAST_SPACE.match(self.buffer, low, limit + 1)
+        return match.end() - 1 if match else limit
+
+    def _next_start(self, start: int, end: int) -> int:
+        """Inicio del siguiente chunk: dentro del overlap, alineado a frase o a palabra"""
+        target = max(self._retreat(end, self.chunk_overlap), start + 1)
+        if target >= end:
+            return end
+        match = _NEXT_SENTENCE.search(self.buffer, target, end)
+        if match:
+            return match.end()
+        space = self.buffer.find(" ", target, end)
+        return space + 1 if space != -1 else target
+
+    def _page_at(self, offset: int) -> Optional[int]:
+        position = bisect.bisect_right(self.page_offsets, offset) - 1
+        return self.page_numbers[max(position, 0)] if self.page_numbers else None
+
+    def _make_chunk(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        raw = self.buffer[start:end]
+        content = raw.strip()
+        if not content:
+            return None
+        char_start = self.base + start + len(raw) - len(raw.lstrip())
+        char_end = char_start + len(content)
+        encoded = content.encode("utf-8")
+        digest = hashlib.blake2b(
+            self.document_key + b"\0" + str(char_start).encode() + b"\0" + encoded,
+            digest_size=16
+        ).digest()
+
+        metadata = {
+            "chunk_id": str(uuid.UUID(bytes=digest)),
+            "chunk_index": self.chunk_index,
+            "source": self.source,
+            "char_start": char_start,
+            "char_end": char_end,
+            "tokens": len(encoded) // BYTES_PER_TOKEN + 1
+        }
+        if self.page_numbers:
+            metadata["page_start"] = self._page_at(char_start)
+            metadata["page_end"] = self._page_at(char_end - 1)
+        self.chunk_index += 1
+        return {"content": content, "metadata": metadata}
+
+    def _cut(self, final: bool) -> List[Dict[str, Any]]:
+        chunks = []
+        length = len(self.buffer)
+        while self.start < length:
+            limit = self._advance(self.start, self.chunk_size)
+            if limit >= length:
+                # Sin texto suficiente detrás: esperar a la siguiente página salvo al final
+                if not final:
+                    break
+                end = length
+            else:
+                end = self._find_end(self.start, limit)
+            chunk = self._make_chunk(self.start, end)
+            if chunk:
+                chunks.append(chunk)
+            if end >= length:
+                self.start = length
+                break
+            self.start = self._next_start(self.start, end)
+        return chunks
+
+    def _discard_consumed(self):
+        """Elimina del buffer el texto ya emitido y las marcas de página que ya no hacen falta"""
+        if self.start == 0:
+            return
+        self.base += self.start
+        self.buffer = self.buffer[self.start:]
+        if self._byte_offsets is not None:
+            self._byte_offsets = self._byte_offsets[self.start:] - self._byte_offsets[self.start]
+        self.start = 0
+        first = max(bisect.bisect_right(self.page_offsets, self.base) - 1, 0)
+        del self.page_offsets[:first]
+        del self.page_numbers[:first]
+
+    # --- API ---
+
+    def feed(self, text: str, page: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Añade texto (opcionalmente con su número de página) y devuelve los chunks ya cerrados"""
+        text = _WHITESPACE.sub(" ", text).strip()
+        if not text:
+            return []
+        if self.total_characters:
+            text = " " + text
+        if page is not None:
+            self.page_offsets.append(self.total_characters + (1 if self.total_characters else 0))
+            self.page_numbers.append(page)
+        self.buffer += text
+        self.total_characters += len(text)
+        self._update_byte_offsets()
+
+        chunks = self._cut(final=False)
+        self._discard_consumed()
+        return chunks
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Emite los chunks restantes al final del documento"""
+        chunks = self._cut(final=True)
+        self._discard_consumed()
+        return chunks
+
+    def split(self, text: str) -> List[Dict[str, Any]]:
+        """Divide un texto completo de una vez"""
+        return self.feed(text) + self.finish()
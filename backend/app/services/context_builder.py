@@ -0,0 +1,171 @@
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.config import settings
+from app.services.chunker import BYTES_PER_TOKEN
+from app.services.embeddings_service import EmbeddingsService
+
+
+def _join(parts: List[Dict[str, Any]]) -> str:
+    """Une chunks contiguos de un documento (ordenados por posición) sin repetir el solape
+
+    El contenido de cada chunk es exactamente el texto normalizado entre sus
+    offsets, así que lo que solapa se recorta por posición; si dos chunks
+    solo se tocan, los separa el espacio que el chunker quitó.
+    """
+    content = parts[0]["content"]
+    end = parts[0]["metadata"]["char_end"]
+    for part in parts[1:]:
+        start, part_end = part["metadata"]["char_start"], part["metadata"]["char_end"]
+        if part_end <= end:
+            continue
+        if start >= end:
+            content += " " + part["content"]
+        else:
+            content += part["content"][end - start:]
+        end = part_end
+    return content
+
+
+class ContextBuilder:
+    """Arma el contexto del prompt a partir de los candidatos de la búsqueda
+
+    1. Fusiona los chunks del mismo documento que se solapan o son contiguos,
+       así el solape del chunker no se envía dos veces.
+    2. Ordena los fragmentos con MMR (maximal marginal relevance) sobre los
+       vectores guardados: relevancia frente a la consulta menos parecido con
+       lo ya elegido, con todas las similitudes en una sola multiplicación.
+    3. Los empaqueta en ese orden hasta `max_tokens` tokens estimados; un
+       fragmento fusionado que no cabe se recorta a los chunks más relevantes.
+    """
+
+    def __init__(self, max_tokens: int = None, mmr_lambda: float = None):
+        self.max_tokens = settings.CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+        self.mmr_lambda = settings.CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return EmbeddingsService.estimate_tokens(text)
+
+    @staticmethod
+    def _relevance(result: Dict[str, Any]) -> float:
+        # Distancia L2 al cuadrado entre vectores normalizados: d = 2 - 2·cos
+        return 1.0 - result["distance"] / 2
+
+    def merge(self, results: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Agrupa los resultados en tramos contiguos por documento (ordenados por posición)"""
+        runs: List[List[Dict[str, Any]]] = []
+        by_document: Dict[str, List[Dict[str, Any]]] = {}
+        for result in results:
+            metadata = result["metadata"]
+            if metadata.get("char_start") is None or metadata.get("document_id") is None:
+                # Chunks antiguos sin offsets: no se pueden fusionar
+                runs.append([result])
+            else:
+                by_document.setdefault(metadata["document_id"], []).append(result)
+
+        for parts in by_document.values():
+            parts.sort(key=lambda r: r["metadata"]["char_start"])
+            run = [parts[0]]
+            end = parts[0]["metadata"]["char_end"]
+            for part in parts[1:]:
+                # +1: entre dos chunks contiguos queda el espacio que los separa
+                if part["metadata"]["char_start"] <= end + 1:
+                    run.append(part)
+                    end = max(end, part["metadata"]["char_end"])
+                else:
+                    runs.append(run)
+                    run = [part]
+                    end = part["metadata"]["char_end"]
+            runs.append(run)
+        return runs
+
+    def mmr_order(self, relevance: np.ndarray, vectors: Optional[np.ndarray]) -> List[int]:
+        """Orden MMR de los fragmentos: max λ·rel - (1-λ)·max_sim(elegidos)"""
+        count = len(relevance)
+        if vectors is None or count <= 1:
+            return [int(i) for i in np.argsort(-relevance, kind="stable")]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.where(norms > 0, norms, 1.0)
+        similarity = unit @ unit.T
+
+        order: List[int] = []
+        available = np.ones(count, dtype=bool)
+        redundancy = np.zeros(count, dtype=np.float32)
+        for _ in range(count):
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            scores[~available] = -np.inf
+            pick = int(np.argmax(scores))
+            order.append(pick)
+            available[pick] = False
+            np.maximum(redundancy, similarity[pick], out=redundancy)
+        return order
+
+    def _fit(self, run: List[Dict[str, Any]], budget: int) -> Optional[List[Dict[str, Any]]]:
+        """El subtramo contiguo que cabe en `budget`, creciendo desde el chunk más relevante"""
+        if self.estimate_tokens(_join(run)) <= budget:
+            return run
+        best = max(range(len(run)), key=lambda i: self._relevance(run[i]))
+        low, high = best, best + 1
+        if self.estimate_tokens(run[best]["content"]) > budget:
+            return None
+        while True:
+            # Ampliar por el vecino más relevante mientras quepa
+            neighbours = [i for i in (low - 1, high) if 0 <= i < len(run)]
+            neighbours.sort(key=lambda i: -self._relevance(run[i]))
+            for i in neighbours:
+                new_low, new_high = min(low, i), max(high, i + 1)
+                if self.estimate_tokens(_join(run[new_low:new_high])) <= budget:
+                    low, high = new_low, new_high
+                    break
+            else:
+                return run[low:high]
+
+    def _piece(self, run: List[Dict[str, Any]]) -> Dict[str, Any]:
+        content = _join(run)
+        metadata = dict(run[0]["metadata"])
+        if len(run) > 1:
+            metadata["char_end"] = max(part["metadata"]["char_end"] for part in run)
+            pages = [part["metadata"].get("page_end") for part in run if part["metadata"].get("page_end")]
+            if pages:
+                metadata["page_end"] = max(pages)
+            metadata["chunk_ids"] = [part["metadata"].get("chunk_id") for part in run]
+        return {
+            "content": content,
+            "metadata": metadata,
+            "distance": min(part["distance"] for part in run),
+            "tokens": self.estimate_tokens(content)
+        }
+
+    def build(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fragmentos de contexto fusionados, en orden MMR y dentro del presupuesto"""
+        if not results:
+            return []
+        runs = self.merge(results)
+        relevance = np.array([max(self._relevance(part) for part in run) for run in runs], dtype=np.float32)
+        vectors = None
+        if all("vector" in part for run in runs for part in run):
+            # Vector de un tramo: media de los de sus chunks
+            vectors = np.stack([
+                np.mean([part["vector"] for part in run], axis=0) for run in runs
+            ]).astype(np.float32)
+
+        pieces = []
+        budget = self.max_tokens
+        for i in self.mmr_order(relevance, vectors):
+            run = self._fit(runs[i], budget)
+            if run is None:
+                continue
+            piece = self._piece(run)
+            pieces.append(piece)
+            budget -= piece["tokens"]
+            if budget <= 0:
+                break
+
+        if not pieces:
+            # Ni el mejor chunk cabe: se recorta su texto al presupuesto
+            piece = self._piece([max(results, key=self._relevance)])
+            limit = self.max_tokens * BYTES_PER_TOKEN
+            piece["content"] = piece["content"].encode("utf-8")[:limit].decode("utf-8", "ignore")
+            piece["tokens"] = self.estimate_tokens(piece["content"])
+            pieces.append(piece)
+        return pieces
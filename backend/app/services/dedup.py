@@ -0,0 +1,281 @@
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+
+# Parámetros de las firmas guardadas en los segmentos: cambiarlos invalida las ya escritas
+NUM_PERM = 64
+SHINGLE_WORDS = 3
+_SEED = 20240601
+
+_rng = np.random.RandomState(_SEED)
+# Hash multiplicar-desplazar: (a·x + b) mod 2^64, quedándose con los 32 bits altos
+_PERM_A = _rng.randint(1, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_SHINGLE_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+# Hash polinómico de las palabras: base impar (invertible módulo 2^64)
+_BASE = 0x100000001B3
+_BASE_INVERSE = pow(_BASE, -1, 2 ** 64)
+# Bytes de palabra: ASCII alfanumérico, "_" y cualquier byte de un carácter UTF-8 multibyte
+_WORD_BYTES = np.zeros(256, dtype=bool)
+_WORD_BYTES[[ord(c) for c in "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"]] = True
+_WORD_BYTES[0x80:] = True
+# Chunks por bloque vectorizado: acota la matriz (NUM_PERM, shingles) en memoria
+_BLOCK = 256
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 del contenido del fichero, leído por partes"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for piece in iter(lambda: file.read(settings.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def _powers(base: int, count: int) -> np.ndarray:
+    powers = np.full(count, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+def _shingles(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashes de los shingles de SHINGLE_WORDS palabras (en minúsculas) de varios textos
+
+    Todo el bloque se procesa con NumPy: cada palabra se hashea con sumas
+    prefijas de un hash polinómico sobre los bytes UTF-8. Devuelve los hashes
+    y el texto de cada uno, ordenados por texto; los textos con menos palabras
+    usan sus palabras sueltas y los vacíos, un único shingle 0.
+    """
+    encoded = [text.lower().encode("utf-8") for text in texts]
+    offsets = np.cumsum([0] + [len(data) + 1 for data in encoded])
+    data = np.frombuffer(b"\x00".join(encoded) + b"\x00", dtype=np.uint8)
+    is_word = _WORD_BYTES[data].astype(np.int8)
+    edges = np.diff(np.concatenate(([0], is_word, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum(data.astype(np.uint64) * _powers(_BASE, len(data)), dtype=np.uint64, out=prefix[1:])
+    words = (prefix[ends] - prefix[starts]) * _powers(_BASE_INVERSE, len(data))[starts]
+    words ^= words >> np.uint64(29)
+    words *= _SHINGLE_MIX[0]
+    words ^= words >> np.uint64(32)
+    owners = np.searchsorted(offsets, starts, side="right") - 1
+
+    per_text = np.bincount(owners, minlength=len(texts))
+    width = len(words) - SHINGLE_WORDS + 1
+    hashes, shingle_owners = [], []
+    if width > 0:
+        valid = owners[:width] == owners[SHINGLE_WORDS - 1:]
+        mixed = np.zeros(width, dtype=np.uint64)
+        for offset in range(SHINGLE_WORDS):
+            mixed += words[offset:offset + width] * _SHINGLE_MIX[offset]
+        hashes.append(mixed[valid])
+        shingle_owners.append(owners[:width][valid])
+    short = per_text[owners] < SHINGLE_WORDS
+    hashes.append(words[short])
+    shingle_owners.append(owners[short])
+    empty = np.flatnonzero(per_text == 0)
+    hashes.append(np.zeros(len(empty), dtype=np.uint64))
+    shingle_owners.append(empty)
+
+    hashes = np.concatenate(hashes) >> np.uint64(32)
+    shingle_owners = np.concatenate(shingle_owners)
+    order = np.argsort(shingle_owners, kind="stable")
+    return hashes[order], shingle_owners[order]
+
+
+def signatures(texts: List[str]) -> np.ndarray:
+    """Firmas MinHash (n, NUM_PERM) uint32 de los textos"""
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for block in range(0, len(texts), _BLOCK):
+        hashes, owners = _shingles(texts[block:block + _BLOCK])
+        firsts = np.flatnonzero(np.concatenate(([True], owners[1:] != owners[:-1])))
+        permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+        result[block:block + len(firsts)] = np.minimum.reduceat(permuted, firsts, axis=1).T
+    return result
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Jaccard estimado fila a fila: fracción de permutaciones con el mismo mínimo"""
+    return (left == right).mean(axis=1)
+
+
+def band_keys(sigs: np.ndarray, bands: int) -> np.ndarray:
+    """Clave (n, bands) uint64 de cada banda de filas de la firma, para el LSH"""
+    rows = NUM_PERM // bands
+    keys = np.zeros((len(sigs), bands), dtype=np.uint64)
+    weights = _PERM_A[:rows]
+    for band in range(bands):
+        block = sigs[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys[:, band] = (block * weights).sum(axis=1, dtype=np.uint64) + np.uint64(band)
+    return keys
+
+
+class LSHIndex:
+    """Índice LSH por bandas sobre un array de firmas inmutable
+
+    Cada banda guarda sus claves ordenadas, así que buscar candidatos es un
+    searchsorted por banda para todas las consultas a la vez. Los cubos muy
+    poblados (texto repetido en muchos chunks) se recortan a `max_bucket`.
+    """
+
+    def __init__(self, sigs: np.ndarray, bands: int = None, max_bucket: int = 32):
+        self.signatures = sigs
+        self.bands = bands or settings.DEDUP_BANDS
+        self.max_bucket = max_bucket
+        keys = band_keys(np.asarray(sigs), self.bands)
+        self._order = np.argsort(keys, axis=0, kind="stable")
+        self._sorted = np.take_along_axis(keys, self._order, axis=0)
+
+    def candidates(self, sigs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pares (fila de la consulta, fila del índice) que comparten alguna banda"""
+        keys = band_keys(sigs, self.bands)
+        queries, rows = [], []
+        for band in range(self.bands):
+            column = self._sorted[:, band]
+            left = np.searchsorted(column, keys[:, band], side="left")
+            right = np.minimum(np.searchsorted(column, keys[:, band], side="right"), left + self.max_bucket)
+            counts = right - left
+            hits = np.nonzero(counts)[0]
+            if not len(hits):
+                continue
+            repeats = counts[hits]
+            starts = np.repeat(left[hits] - np.concatenate(([0], np.cumsum(repeats)[:-1])), repeats)
+            positions = starts + np.arange(repeats.sum())
+            queries.append(np.repeat(hits, repeats))
+            rows.append(self._order[positions, band])
+        if not queries:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        pairs = np.unique(np.stack([np.concatenate(queries), np.concatenate(rows)], axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+    def matches(self, sigs: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Candidatos confirmados con la firma completa: (consulta, fila, similitud)"""
+        queries, rows = self.candidates(sigs)
+        if not len(queries):
+            return queries, rows, np.empty(0)
+        scores = similarity(sigs[queries], np.asarray(self.signatures)[rows])
+        keep = scores >= threshold
+        return queries[keep], rows[keep], scores[keep]
+
+
+def _batch_duplicates(sigs: np.ndarray, threshold: float) -> np.ndarray:
+    """Para cada chunk del lote, el primer chunk anterior casi igual (o -1)"""
+    earlier = np.full(len(sigs), -1, dtype=np.int64)
+    if len(sigs) < 2:
+        return earlier
+    queries, rows, _ = LSHIndex(sigs).matches(sigs, threshold)
+    before = rows < queries
+    for query, row in zip(queries[before], rows[before]):
+        if earlier[query] == -1 or row < earlier[query]:
+            earlier[query] = row
+    return earlier
+
+
+def _pending_duplicates(
+    sigs: np.ndarray,
+    pending: List[Dict[str, Any]],
+    threshold: float
+) -> List[Optional[Tuple[int, str]]]:
+    """Para cada chunk, (posición, document_id) de un chunk pendiente casi igual, o None"""
+    found: List[Optional[Tuple[int, str]]] = [None] * len(sigs)
+    pending = [item for item in pending if len(item["signatures"])]
+    if not pending or not len(sigs):
+        return found
+    owners = [(item["document_id"], position) for item in pending for position in range(len(item["signatures"]))]
+    queries, rows, scores = LSHIndex(np.concatenate([item["signatures"] for item in pending])).matches(sigs, threshold)
+    for query in np.argsort(-scores, kind="stable"):
+        if found[queries[query]] is None:
+            document_id, position = owners[rows[query]]
+            found[queries[query]] = (position, document_id)
+    return found
+
+
+def plan_dedup(
+    vector_store,
+    items: List[Dict[str, Any]],
+    tenant_id: str,
+    pending: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """Decide qué chunks de un lote hay que indexar y cuáles ya están
+
+    `items` son documentos del lote ({"document_id", "chunks"}) y `pending`,
+    documentos ya planificados pero aún sin confirmar ({"document_id",
+    "signatures"} de sus chunks a indexar). Un chunk casi igual (Jaccard
+    estimado ≥ DEDUP_THRESHOLD) a otro del mismo tenant ya indexado, a uno
+    pendiente o a uno anterior del lote no se vuelve a embeber: si es de otro
+    documento se enlaza a ese vector ("linked_ids", o "batch_links" por
+    document_id y posición entre los chunks indexados de ese documento) y si
+    es del mismo documento se descarta. Devuelve por documento los chunks a
+    indexar, sus firmas, los enlaces y las cuentas.
+    """
+    threshold = settings.DEDUP_THRESHOLD
+    texts, owners, offsets = [], [], []
+    for position, item in enumerate(items):
+        offsets.append(len(texts))
+        texts.extend(chunk["content"] for chunk in item["chunks"])
+        owners.extend([position] * len(item["chunks"]))
+    sigs = signatures(texts)
+    indexed = vector_store.find_near_duplicates(sigs, tenant_id, threshold)
+    earlier = _batch_duplicates(sigs, threshold)
+    waiting = _pending_duplicates(sigs, pending or [], threshold)
+
+    plans = [
+        {
+            "chunks": [],
+            "signatures": [],
+            "linked_ids": set(),
+            "batch_links": set(),
+            "stats": {"chunks": len(item["chunks"]), "indexed": 0, "linked": 0, "dropped": 0}
+        }
+        for item in items
+    ]
+    # Destino de cada chunk: ("vector", id, documento) o ("chunk", posición en su documento, documento)
+    targets: List[Optional[Tuple[str, int, str]]] = [None] * len(texts)
+    for flat in range(len(texts)):
+        owner = owners[flat]
+        document_id = items[owner]["document_id"]
+        plan = plans[owner]
+        target = None
+        if indexed[flat] is not None:
+            target = ("vector",) + indexed[flat]
+        elif waiting[flat] is not None:
+            target = ("chunk",) + waiting[flat]
+        elif earlier[flat] >= 0:
+            target = targets[earlier[flat]]
+
+        if target is None:
+            chunk_position = len(plan["chunks"])
+            plan["chunks"].append(items[owner]["chunks"][flat - offsets[owner]])
+            plan["signatures"].append(sigs[flat])
+            plan["stats"]["indexed"] += 1
+            targets[flat] = ("chunk", chunk_position, document_id)
+            continue
+
+        targets[flat] = target
+        kind, position, target_document = target
+        if target_document == document_id:
+            plan["stats"]["dropped"] += 1
+        else:
+            plan["stats"]["linked"] += 1
+            if kind == "vector":
+                plan["linked_ids"].add(position)
+            else:
+                plan["batch_links"].add((target_document, position))
+
+    for plan in plans:
+        plan["signatures"] = np.array(plan["signatures"], dtype=np.uint32).reshape(-1, NUM_PERM)
+        plan["linked_ids"] = sorted(plan["linked_ids"])
+        plan["batch_links"] = sorted(plan["batch_links"])
+    return plans
+
+
+def merge_stats(total: Dict[str, int], stats: Dict[str, int]) -> Dict[str, Any]:
+    """Acumula las cuentas de deduplicación y recalcula el ratio (fracción no indexada)"""
+    for key in ("chunks", "indexed", "linked", "dropped"):
+        total[key] = total.get(key, 0) + stats[key]
+    total["ratio"] = round(1 - total["indexed"] / total["chunks"], 4) if total["chunks"] else 0.0
+    return total
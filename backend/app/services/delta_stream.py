@@ -0,0 +1,120 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List
+from app.config import settings
+
+PROTOCOLS = ("legacy", "delta")
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """JSON compacto y sin escapar acentos (\\u00e1 ocupa 6 bytes frente a 2 en UTF-8)"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class DeltaStream:
+    """Agrupa los fragmentos de una respuesta en frames que solo llevan el texto nuevo
+
+    Un frame sale cuando pasa `flush_interval` desde el primer fragmento
+    pendiente o cuando se acumulan `flush_chars` caracteres. Mientras un envío
+    está en curso (cliente que lee despacio) los fragmentos nuevos se
+    concatenan en el siguiente frame en lugar de encolarse uno a uno, así que
+    un cliente lento recibe menos frames más grandes. Si lo pendiente supera
+    `max_pending_chars` (por defecto 4 × `flush_chars`), `push` espera a que
+    el envío en curso termine: el productor deja de leer del LLM al ritmo del
+    cliente en lugar de acumular texto sin límite.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        flush_interval: float = None,
+        flush_chars: int = None,
+        max_pending_chars: int = None
+    ):
+        self.send = send
+        self.flush_interval = settings.WS_FLUSH_INTERVAL_MS / 1000 if flush_interval is None else flush_interval
+        self.flush_chars = flush_chars or settings.WS_FLUSH_CHARS
+        self.max_pending_chars = max_pending_chars or 4 * self.flush_chars
+        self.frames = 0
+        self.characters = 0
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._pending_since = 0.0
+        self._closed = False
+        self._has_data = asyncio.Event()
+        self._full = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def push(self, delta: str):
+        """Añade texto; el envío lo hace la tarea de fondo
+
+        Solo espera si el cliente va tan retrasado que lo pendiente supera
+        `max_pending_chars`.
+        """
+        if not delta:
+            return
+        if self._task.done():
+            # El envío falló (cliente desconectado): propagar el error al productor
+            self._task.result()
+        if not self._pending:
+            self._pending_since = asyncio.get_running_loop().time()
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        self.characters += len(delta)
+        self._has_data.set()
+        if self._pending_chars >= self.flush_chars:
+            self._full.set()
+        if self._pending_chars >= self.max_pending_chars:
+            self._writable.clear()
+            await self._wait_writable()
+
+    async def _wait_writable(self):
+        waiter = asyncio.ensure_future(self._writable.wait())
+        try:
+            await asyncio.wait({waiter, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if self._task.done() and not self._writable.is_set():
+            # El envío falló mientras se esperaba
+            self._task.result()
+
+    async def close(self):
+        """Envía lo pendiente y espera a que termine la tarea de envío"""
+        self._closed = True
+        self._has_data.set()
+        self._full.set()
+        await self._task
+
+    def abort(self):
+        """Descarta lo pendiente sin enviarlo (consulta cancelada)"""
+        self._pending = []
+        self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self._has_data.wait()
+            if not self._pending:
+                if self._closed:
+                    return
+                self._has_data.clear()
+                continue
+            # El plazo cuenta desde el primer fragmento pendiente: lo acumulado
+            # durante un envío lento sale en cuanto termina ese envío
+            remaining = self._pending_since + self.flush_interval - asyncio.get_running_loop().time()
+            if not self._full.is_set() and remaining > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            frame = "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+            self._writable.set()
+            if not self._closed:
+                self._full.clear()
+                self._has_data.clear()
+            await self.send(frame)
+            self.frames += 1
@@ -0,0 +1,127 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+
+
+class DocumentRegistry:
+    """Registro de documentos: id de documento -> tenant, chunks y rangos de ids de vector
+
+    Se guarda dentro del MANIFEST.json del índice, así que se confirma de forma
+    atómica junto con los segmentos. Los vectores de un documento se añaden en
+    un único segmento con ids consecutivos, por lo que basta con guardar rangos
+    [inicio, fin) en lugar de listas de ids. Los chunks casi duplicados de
+    otro documento no tienen vector propio: se enlazan a los ya indexados en
+    "linked_ranges", que cuentan para los filtros como los suyos.
+    """
+
+    def __init__(self, documents: Dict[str, Dict[str, Any]] = None):
+        self.documents = documents or {}
+        self._by_hash: Optional[Dict[Tuple[str, str], str]] = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.documents.get(document_id)
+        return {"document_id": document_id, **entry} if entry else None
+
+    def find_by_hash(self, content_hash: str, tenant_id: str) -> Optional[str]:
+        """Id del documento del tenant con ese hash de fichero, si existe"""
+        if self._by_hash is None:
+            # El registro no cambia una vez creado: el índice se construye una vez
+            self._by_hash = {
+                (entry["content_hash"], entry["tenant_id"]): document_id
+                for document_id, entry in self.documents.items()
+                if entry.get("content_hash")
+            }
+        return self._by_hash.get((content_hash, tenant_id))
+
+    def list(self, tenant_id: str = None) -> List[Dict[str, Any]]:
+        return [
+            {"document_id": document_id, **entry}
+            for document_id, entry in self.documents.items()
+            if tenant_id is None or entry["tenant_id"] == tenant_id
+        ]
+
+    def ranges_for(self, document_ids: Iterable[str] = None, tenant_id: str = None) -> List[List[int]]:
+        """Rangos de ids de vector de los documentos que cumplen el filtro"""
+        selected = set(document_ids) if document_ids else None
+        ranges = []
+        for document_id, entry in self.documents.items():
+            if selected is not None and document_id not in selected:
+                continue
+            if tenant_id is not None and entry["tenant_id"] != tenant_id:
+                continue
+            ranges.extend(entry["vector_ranges"])
+            ranges.extend(entry.get("linked_ranges", []))
+        return ranges
+
+    def referenced_ranges(self, exclude: str = None) -> List[List[int]]:
+        """Rangos que algún documento (salvo `exclude`) usa como propios o enlazados"""
+        return self.ranges_for() if exclude is None else [
+            vector_range
+            for document_id, entry in self.documents.items() if document_id != exclude
+            for vector_range in entry["vector_ranges"] + entry.get("linked_ranges", [])
+        ]
+
+    def with_document(
+        self,
+        document_id: str,
+        tenant_id: str,
+        filename: Optional[str],
+        vector_range: List[int],
+        created_at: float
+    ) -> Dict[str, Dict[str, Any]]:
+        """Devuelve una copia del registro con el rango añadido al documento"""
+        return self.with_documents(
+            [{"document_id": document_id, "tenant_id": tenant_id, "filename": filename, "vector_range": vector_range}],
+            created_at
+        )
+
+    def with_documents(self, entries: Iterable[Dict[str, Any]], created_at: float) -> Dict[str, Dict[str, Any]]:
+        """Como with_document para varios documentos con una sola copia
+
+        Cada entrada lleva "document_id", "tenant_id", "filename" y, opcionales,
+        "vector_range" (vectores nuevos), "linked_ranges" y "content_hash".
+        """
+        documents = dict(self.documents)
+        for item in entries:
+            previous = documents.get(item["document_id"]) or {}
+            vector_range = item.get("vector_range")
+            new_ranges = [vector_range] if vector_range else []
+            linked = item.get("linked_ranges") or []
+            filename = item.get("filename")
+            documents[item["document_id"]] = {
+                "tenant_id": item["tenant_id"],
+                "filename": filename if filename is not None else previous.get("filename"),
+                "chunks": previous.get("chunks", 0) + sum(end - start for start, end in new_ranges),
+                "vector_ranges": previous.get("vector_ranges", []) + new_ranges,
+                "linked_chunks": previous.get("linked_chunks", 0) + sum(end - start for start, end in linked),
+                "linked_ranges": previous.get("linked_ranges", []) + linked,
+                "content_hash": item.get("content_hash") or previous.get("content_hash"),
+                "created_at": previous.get("created_at", created_at)
+            }
+        return documents
+
+    def without_document(self, document_id: str) -> Dict[str, Dict[str, Any]]:
+        documents = dict(self.documents)
+        documents.pop(document_id, None)
+        return documents
+
+    @staticmethod
+    def ranges_to_ids(ranges: List[List[int]]) -> np.ndarray:
+        """Expande rangos [inicio, fin) a un array ordenado de ids (sin repetidos:
+        un vector puede ser propio de un documento y estar enlazado en otro)"""
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges]))
+
+    @staticmethod
+    def ids_to_ranges(ids: Iterable[int]) -> List[List[int]]:
+        """Agrupa ids en rangos [inicio, fin) de ids consecutivos"""
+        ranges: List[List[int]] = []
+        for vector_id in sorted(set(int(i) for i in ids)):
+            if ranges and ranges[-1][1] == vector_id:
+                ranges[-1][1] = vector_id + 1
+            else:
+                ranges.append([vector_id, vector_id + 1])
+        return ranges
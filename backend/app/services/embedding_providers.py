@@ -0,0 +1,117 @@
+import asyncio
+from typing import List, Optional
+import numpy as np
+from app.config import settings
+from app.services.openai_clients import estimate_tokens, get_openai_clients
+
+# Constantes de mezcla (64 bits) para hashear n-gramas y proyectarlos
+_GRAM_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_PROJECTION_SEEDS = tuple(np.uint64(seed) for seed in (
+    0x243F6A8885A308D3, 0x13198A2E03707344, 0xA4093822299F31D0, 0x082EFA98EC4E6C89,
+    0x452821E638D01377, 0xBE5466CF34E90C6C, 0xC0AC29B7C97C50DD, 0x3F84D5B5B5470917
+))
+
+
+class OpenAIEmbeddingProvider:
+    """Embeddings con la API de OpenAI. Los reintentos los gestiona EmbeddingsService"""
+
+    remote = True
+    DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536
+    }
+
+    def __init__(self, model: str = None):
+        # Clientes y limitadores compartidos por todo el proceso
+        self.clients = get_openai_clients()
+        self.model = model or settings.OPENAI_EMBEDDING_MODEL
+        self.dim: Optional[int] = self.DIMENSIONS.get(self.model)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.clients.client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        async with self.clients.request("embeddings", estimate_tokens(texts)) as client:
+            response = await client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+class LocalEmbeddingProvider:
+    """Embeddings locales con NumPy: n-gramas de caracteres hasheados y proyección aleatoria
+
+    Cada texto se convierte en la bolsa de sus n-gramas de caracteres (3 a 5,
+    en minúsculas y con los espacios normalizados) con peso TF sublineal
+    (1 + log tf). Esa bolsa vive en un espacio de 2^64 dimensiones que se
+    proyecta a `dim` con una proyección aleatoria dispersa de signos: cada
+    n-grama suma ±1 en `PROJECTION_NNZ` posiciones derivadas de su hash. No
+    se usa IDF porque depende del corpus y cambiaría los vectores ya guardados.
+
+    Es determinista, no necesita red ni OPENAI_API_KEY y tarda decenas de
+    microsegundos por texto corto.
+    """
+
+    remote = False
+    NGRAM_SIZES = (3, 4, 5)
+    PROJECTION_NNZ = 4
+    # Por encima de este número de textos se calcula en un hilo para no bloquear el event loop
+    INLINE_BATCH = 16
+
+    def __init__(self, dim: int = None):
+        self.dim = dim or settings.LOCAL_EMBEDDING_DIM
+        self.model = f"local-ngram-{self.dim}"
+
+    def _ngram_hashes(self, text: str) -> np.ndarray:
+        text = " " + " ".join(text.lower().split()) + " "
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        hashes = []
+        for n in self.NGRAM_SIZES:
+            count = len(codes) - n + 1
+            if count <= 0:
+                break
+            # Hash polinómico de cada ventana de n caracteres, todas a la vez
+            h = np.full(count, n, dtype=np.uint64)
+            for k in range(n):
+                h = h * _GRAM_PRIME + codes[k:k + count]
+            hashes.append(h)
+        return np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float64)
+        features, counts = np.unique(self._ngram_hashes(text), return_counts=True)
+        if len(features):
+            weights = 1.0 + np.log(counts)
+            for seed in _PROJECTION_SEEDS[:self.PROJECTION_NNZ]:
+                mixed = (features ^ seed) * _MIX
+                mixed ^= mixed >> np.uint64(29)
+                positions = (mixed % np.uint64(self.dim)).astype(np.intp)
+                signs = np.where(mixed >> np.uint64(63), -weights, weights)
+                vector += np.bincount(positions, weights=signs, minlength=self.dim)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.astype(np.float32)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= self.INLINE_BATCH:
+            return self.embed(texts)
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed, texts)
+
+
+EMBEDDING_PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider
+}
+
+
+def get_embedding_provider(name: str = None):
+    """Crea el proveedor de embeddings configurado en EMBEDDING_PROVIDER"""
+    name = (name or settings.EMBEDDING_PROVIDER).lower()
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Proveedor de embeddings no soportado: {name}")
+    return EMBEDDING_PROVIDERS[name]()
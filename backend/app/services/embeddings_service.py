@@ -1,38 +1,233 @@
-from typing import List
-from openai import OpenAI
+import asyncio
+import random
+import time
+from typing import List, Dict, Callable, Optional
 from app.config import settings
+from app.services import metrics
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_providers import get_embedding_provider
+from app.services.query_batcher import QueryBatcher
+from app.services.rate_limiter import Overloaded
 
 class EmbeddingsService:
-    def __init__(self):
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY no está configurada")
-        
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        # Modelo recomendado en la API >=1.0.0
-        self.model = "text-embedding-3-small"
-    
+    def __init__(self, provider=None):
+        # Proveedor configurado en EMBEDDING_PROVIDER (OpenAI o local con NumPy)
+        self.provider = provider or get_embedding_provider()
+        self.model = self.provider.model
+        # Dimensión de los vectores si se conoce de antemano (se comprueba contra el índice)
+        self.dim = self.provider.dim
+
+        self.max_batch_tokens = settings.EMBEDDING_MAX_BATCH_TOKENS
+        self.max_batch_size = settings.EMBEDDING_MAX_BATCH_SIZE
+        self.concurrency = settings.EMBEDDING_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES
+
+        # Un proveedor local calcula más rápido de lo que tarda la caché en responder
+        self.cache = None
+        if settings.EMBEDDING_CACHE_ENABLED and self.provider.remote:
+            self.cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH,
+                max_memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                max_disk_bytes=settings.EMBEDDING_CACHE_MAX_BYTES
+            )
+
+        # Agrupa las consultas concurrentes de distintos clientes en una sola llamada
+        self.query_batcher = None
+        if settings.QUERY_BATCH_MAX_WAIT_MS > 0 and self.provider.remote:
+            self.query_batcher = QueryBatcher(self.aembed_texts)
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Estimación conservadora de tokens (~3 bytes UTF-8 por token)"""
+        return len(text.encode("utf-8")) // 3 + 1
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Agrupa los índices de los textos en lotes limitados por tokens y por tamaño"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = self.estimate_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Devuelve la espera antes del siguiente intento, o None si no se debe reintentar"""
+        if attempt >= self.max_retries:
+            return None
+        # Solo se llega aquí tras un error; con proveedores locales nunca se importa el SDK
+        from openai import RateLimitError, APIStatusError, APIConnectionError, APITimeoutError
+        if isinstance(error, APIStatusError) and not isinstance(error, RateLimitError):
+            if error.status_code < 500:
+                return None
+        elif not isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+            return None
+
+        # Respetar Retry-After si el servidor lo indica
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), 60.0)
+            except ValueError:
+                pass
+
+        # Backoff exponencial con jitter
+        return min(0.5 * (2 ** attempt), 30.0) * (0.5 + random.random())
+
+    def _count_request(self, batch: List[str]):
+        metrics.EMBEDDING_TEXTS.inc(len(batch), model=self.model)
+        metrics.EMBEDDING_TOKENS.inc(sum(self.estimate_tokens(text) for text in batch), model=self.model)
+
+    def _create_with_retry(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        with metrics.span("embedding_request"):
+            while True:
+                try:
+                    vectors = self.provider.embed(batch)
+                    self._count_request(batch)
+                    return vectors
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    metrics.EMBEDDING_RETRIES.inc()
+                    time.sleep(delay)
+                    attempt += 1
+
+    async def _acreate_with_retry(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        with metrics.span("embedding_request"):
+            while True:
+                try:
+                    vectors = await self.provider.aembed(batch)
+                    self._count_request(batch)
+                    return vectors
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    metrics.EMBEDDING_RETRIES.inc()
+                    await asyncio.sleep(delay)
+                    attempt += 1
+
+    def _split_cached(self, texts: List[str]):
+        """Separa los textos ya cacheados de los que hay que pedir a la API
+
+        Devuelve la lista de resultados (con None en los huecos) y un mapa
+        texto -> posiciones para los textos únicos que faltan.
+        """
+        cached = self.cache.get_many(self.model, texts) if self.cache else [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+        if self.cache:
+            misses = sum(len(positions) for positions in missing.values())
+            metrics.EMBEDDING_CACHE_LOOKUPS.inc(len(texts) - misses, result="hit")
+            metrics.EMBEDDING_CACHE_LOOKUPS.inc(misses, result="miss")
+        return cached, missing
+
+    def _fill_missing(self, embeddings, missing: Dict[str, List[int]], unique: List[str], vectors):
+        for text, vector in zip(unique, vectors):
+            for i in missing[text]:
+                embeddings[i] = vector
+
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """Genera embeddings para una lista de textos"""
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts
-            )
-            return [d.embedding for d in response.data]
+            embeddings, missing = self._split_cached(texts)
+            unique = list(missing)
+            vectors: List[List[float]] = [None] * len(unique)
+            for batch in self.make_batches(unique):
+                batch_vectors = self._create_with_retry([unique[i] for i in batch])
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+
+            self._fill_missing(embeddings, missing, unique, vectors)
+            if self.cache:
+                self.cache.put_many(self.model, unique, vectors)
+            return embeddings
         except Exception as e:
             raise Exception(f"Error al generar embeddings: {str(e)}")
-    
-    # Adapter para LangChain: mismo nombre que espera FAISS
+
+    async def aembed_texts(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[List[float]]:
+        """Genera embeddings por lotes concurrentes sin bloquear el event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+            if self.cache:
+                embeddings, missing = await loop.run_in_executor(None, self._split_cached, texts)
+            else:
+                embeddings, missing = self._split_cached(texts)
+            unique = list(missing)
+            vectors: List[List[float]] = [None] * len(unique)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            total = len(texts)
+            done = total - sum(len(positions) for positions in missing.values())
+            if on_progress:
+                on_progress(done, total)
+
+            async def run_batch(batch: List[int]):
+                nonlocal done
+                async with semaphore:
+                    batch_vectors = await self._acreate_with_retry([unique[i] for i in batch])
+                # Mantener el orden original de entrada
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                done += sum(len(missing[unique[i]]) for i in batch)
+                if on_progress:
+                    on_progress(done, total)
+
+            await asyncio.gather(*(run_batch(batch) for batch in self.make_batches(unique)))
+
+            self._fill_missing(embeddings, missing, unique, vectors)
+            if self.cache:
+                await loop.run_in_executor(None, self.cache.put_many, self.model, unique, vectors)
+            return embeddings
+        except Overloaded:
+            raise
+        except Exception as e:
+            raise Exception(f"Error al generar embeddings: {str(e)}")
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Alias síncrono de embed_texts para scripts y clientes externos"""
         return self.embed_texts(texts)
-    
+
     def embed_query(self, query: str) -> List[float]:
         """Genera embedding para una consulta"""
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=query
-            )
-            return response.data[0].embedding
+            with metrics.span("query_embedding"):
+                return self.embed_texts([query])[0]
+        except Exception as e:
+            raise Exception(f"Error al generar embedding para consulta: {str(e)}")
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Genera embedding para una consulta sin bloquear el event loop"""
+        try:
+            with metrics.span("query_embedding"):
+                if not self.provider.remote:
+                    # Calcularlo en el acto cuesta menos que cualquier agrupación
+                    return self.provider.embed([query])[0]
+                if self.query_batcher:
+                    return await self.query_batcher.embed(query)
+                return (await self.aembed_texts([query]))[0]
+        except Overloaded:
+            # Saturación: se propaga tal cual para que el chat la rechace limpiamente
+            raise
         except Exception as e:
             raise Exception(f"Error al generar embedding para consulta: {str(e)}")
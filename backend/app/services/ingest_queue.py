@@ -0,0 +1,323 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List
+from app.config import settings
+from app.services import dedup, metrics
+from app.services.pdf_processor import PDFProcessor, extract_page_range, page_windows
+from app.services.rate_limiter import background
+from app.services.vector_store import VectorStore
+
+
+def _inspect_pdf(file_path: str) -> int:
+    """Valida el PDF y devuelve su número de páginas. Se ejecuta en un proceso del pool"""
+    processor = PDFProcessor()
+    if not processor.validate_pdf(file_path):
+        raise ValueError("Archivo PDF inválido o corrupto")
+    return processor.count_pages(file_path)
+
+
+def _timed_extract(file_path: str, start: int, end: int):
+    """extract_page_range y su duración, medida dentro del proceso del pool"""
+    started = time.perf_counter()
+    pages = extract_page_range(file_path, start, end)
+    return pages, time.perf_counter() - started
+
+
+class IngestJob:
+    """Estado de un trabajo de ingesta"""
+
+    def __init__(self, file_path: str, filename: str, document_id: str, tenant_id: str):
+        self.job_id = str(uuid.uuid4())
+        self.file_path = file_path
+        self.filename = filename
+        self.document_id = document_id
+        self.tenant_id = tenant_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.pages_total = 0
+        self.pages_done = 0
+        self.chunks_done = 0
+        self.content_hash: Optional[str] = None
+        # Chunks vistos, indexados, enlazados y descartados por duplicados (ver dedup.plan_dedup)
+        self.dedup: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def update(self, stage: str = None, progress: float = None, status: str = None):
+        if stage is not None:
+            self.stage = stage
+        if progress is not None:
+            self.progress = round(min(max(progress, 0.0), 1.0), 4)
+        if status is not None:
+            self.status = status
+        self.updated_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "document_id": self.document_id,
+            "tenant_id": self.tenant_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "pages_total": self.pages_total,
+            "pages_done": self.pages_done,
+            "chunks_done": self.chunks_done,
+            "dedup": self.dedup or None,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class IngestQueue:
+    """Cola de ingesta: extracción en procesos, embeddings asíncronos e indexación en hilos
+
+    Cada PDF se procesa por ventanas de páginas que se extraen en paralelo en
+    el pool (hasta PDF_EXTRACT_WORKERS en vuelo) y se consumen en orden de
+    página mientras se generan los embeddings de las anteriores. Los chunks
+    se confirman en el índice por lotes, así que la memoria por ingesta no
+    depende del tamaño del documento.
+    """
+
+    def __init__(self, vector_store: VectorStore):
+        self.vector_store = vector_store
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._bulk_tasks = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Arranca el pool de procesos y las tareas consumidoras"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACT_WORKERS)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(settings.INGEST_CONCURRENT_JOBS)
+        ]
+
+    async def stop(self):
+        """Detiene las tareas consumidoras y el pool de procesos"""
+        for worker in self._workers + list(self._bulk_tasks):
+            worker.cancel()
+        await asyncio.gather(*self._workers, *self._bulk_tasks, return_exceptions=True)
+        self._workers = []
+        self._bulk_tasks = set()
+        self._queue = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(
+        self,
+        file_path: str,
+        filename: str,
+        document_id: Optional[str] = None,
+        tenant_id: Optional[str] = None
+    ) -> IngestJob:
+        """Encola un PDF ya guardado en disco y devuelve su trabajo"""
+        if self._queue is None:
+            self.start()
+        job = IngestJob(
+            file_path,
+            filename,
+            document_id or str(uuid.uuid4()),
+            tenant_id or settings.DEFAULT_TENANT
+        )
+        self.jobs[job.job_id] = job
+        self._trim_history()
+        await self._queue.put(job)
+        return job
+
+    def submit_bulk(self, job: IngestJob) -> IngestJob:
+        """Lanza una ingesta masiva (un BulkJob) en segundo plano, fuera de la cola
+
+        Tiene su propio pipeline entre ficheros; comparte el pool de procesos y
+        el registro de trabajos con las subidas individuales.
+        """
+        # Import diferido: bulk_ingest importa este módulo
+        from app.services.bulk_ingest import BulkIngest
+
+        if self._queue is None:
+            self.start()
+        self.jobs[job.job_id] = job
+        self._trim_history()
+        task = asyncio.create_task(self._run_bulk(BulkIngest(self.vector_store, self._executor), job))
+        self._bulk_tasks.add(task)
+        task.add_done_callback(self._bulk_tasks.discard)
+        return job
+
+    async def _run_bulk(self, bulk, job: IngestJob):
+        try:
+            with background():
+                await bulk.run(job)
+        except Exception as e:
+            print(f"Error en la ingesta masiva {job.job_id}: {e}")
+        finally:
+            if job.cleanup_dir:
+                shutil.rmtree(job.cleanup_dir, ignore_errors=True)
+
+    def get_job(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def _trim_history(self):
+        """Descarta los trabajos terminados más antiguos"""
+        while len(self.jobs) > settings.INGEST_JOB_HISTORY:
+            oldest_id = next(
+                (jid for jid, job in self.jobs.items() if job.status in ("completed", "failed")),
+                None
+            )
+            if oldest_id is None:
+                break
+            del self.jobs[oldest_id]
+
+    async def _worker(self):
+        # Las llamadas a OpenAI de la ingesta ceden el paso a las del chat
+        with background():
+            while True:
+                job = await self._queue.get()
+                try:
+                    await self._run(job)
+                except Exception as e:
+                    # Un trabajo nunca debe acabar con el consumidor de la cola
+                    print(f"Error inesperado en el trabajo de ingesta {job.job_id}: {e}")
+                finally:
+                    self._queue.task_done()
+
+    async def _commit(self, job: IngestJob, chunks: List[Dict[str, Any]], final: bool = False):
+        """Genera los embeddings de un lote de chunks y lo añade al índice
+
+        Con DEDUP_ENABLED, los chunks casi iguales a otros ya indexados no se
+        embeben: se enlazan (otro documento) o se descartan (el mismo). El hash
+        del fichero solo se registra con el último lote (`final`): una subida
+        del mismo fichero mientras tanto no se da por duplicada de un documento
+        a medio indexar.
+        """
+        item = {"documents": chunks, "document_id": job.document_id}
+        if final and job.content_hash:
+            item["content_hash"] = job.content_hash
+        if not chunks and "content_hash" not in item:
+            return
+        loop = asyncio.get_running_loop()
+        if chunks and settings.DEDUP_ENABLED:
+            with metrics.span("dedup"):
+                plan = (await loop.run_in_executor(
+                    None,
+                    dedup.plan_dedup,
+                    self.vector_store,
+                    [{"document_id": job.document_id, "chunks": chunks}],
+                    job.tenant_id
+                ))[0]
+            item.update(
+                documents=plan["chunks"],
+                signatures=plan["signatures"],
+                linked_ids=plan["linked_ids"]
+            )
+            dedup.merge_stats(job.dedup, plan["stats"])
+            metrics.INGEST_DUPLICATES.inc(plan["stats"]["linked"], kind="linked")
+            metrics.INGEST_DUPLICATES.inc(plan["stats"]["dropped"], kind="dropped")
+        item["embeddings"] = (
+            await self.vector_store.aembed_documents(item["documents"]) if item["documents"] else []
+        )
+        await loop.run_in_executor(
+            None,
+            self.vector_store.add_embedded_batch,
+            [{**item, "tenant_id": job.tenant_id, "filename": job.filename}]
+        )
+        job.chunks_done += len(item["documents"])
+        metrics.INGEST_CHUNKS.inc(len(item["documents"]))
+
+    async def _run(self, job: IngestJob):
+        loop = asyncio.get_running_loop()
+        # Ventanas de páginas en extracción; cada proceso abre el fichero por su cuenta
+        in_flight = deque()
+        try:
+            job.update(stage="extracting", status="running")
+            if settings.DEDUP_ENABLED:
+                job.content_hash = await loop.run_in_executor(None, dedup.file_digest, job.file_path)
+                duplicate_of = self.vector_store.find_document_by_hash(job.content_hash, job.tenant_id)
+                if duplicate_of:
+                    # El mismo fichero ya está indexado para este tenant: no se procesa
+                    job.result = {"document_id": duplicate_of, "duplicate_of": duplicate_of, "total_chunks": 0}
+                    job.update(stage="duplicate", status="completed", progress=1.0)
+                    metrics.INGEST_JOBS.inc(status="duplicate")
+                    metrics.INGEST_DUPLICATES.inc(kind="file")
+                    return
+            job.pages_total = await loop.run_in_executor(self._executor, _inspect_pdf, job.file_path)
+
+            workers = settings.PDF_EXTRACT_WORKERS
+            windows = deque(page_windows(job.pages_total, workers, settings.INGEST_PAGE_WINDOW))
+            chunker = PDFProcessor().make_chunker(job.document_id)
+            pending: List[Dict[str, Any]] = []
+
+            def schedule():
+                while windows and len(in_flight) < workers:
+                    start, end = windows.popleft()
+                    in_flight.append(
+                        loop.run_in_executor(self._executor, _timed_extract, job.file_path, start, end)
+                    )
+
+            schedule()
+            # Los resultados se consumen en orden de página
+            while in_flight:
+                pages, extract_seconds = await in_flight.popleft()
+                schedule()
+                metrics.record("pdf_extract", extract_seconds)
+
+                job.update(stage="embedding")
+                with metrics.span("chunking"):
+                    for page, text in pages:
+                        pending.extend(chunker.feed(text, page))
+                job.pages_done += len(pages)
+                metrics.INGEST_PAGES.inc(len(pages))
+
+                if len(pending) >= settings.INGEST_COMMIT_CHUNKS:
+                    await self._commit(job, pending)
+                    pending = []
+                job.update(progress=0.95 * job.pages_done / max(job.pages_total, 1))
+
+            pending.extend(chunker.finish())
+            if not pending and chunker.chunk_index == 0:
+                raise ValueError("El PDF no contiene texto extraíble")
+
+            job.update(stage="indexing")
+            await self._commit(job, pending, final=True)
+
+            job.result = {
+                "document_id": job.document_id,
+                "total_pages": job.pages_total,
+                "total_chunks": job.chunks_done,
+                "total_characters": chunker.total_characters,
+                "dedup": job.dedup or None
+            }
+            job.update(stage="completed", status="completed", progress=1.0)
+            metrics.INGEST_JOBS.inc(status="completed")
+        except Exception as e:
+            job.error = str(e)
+            job.update(stage="failed", status="failed")
+            metrics.INGEST_JOBS.inc(status="failed")
+            for future in in_flight:
+                future.cancel()
+            # Deshacer los lotes ya confirmados de un documento incompleto (aunque
+            # solo enlazaran chunks duplicados)
+            if self.vector_store.get_document(job.document_id) is not None:
+                try:
+                    await loop.run_in_executor(None, self.vector_store.delete_document, job.document_id)
+                except Exception as rollback_error:
+                    print(f"Error al deshacer el documento {job.document_id}: {rollback_error}")
+        finally:
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
@@ -0,0 +1,282 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Límites de los histogramas de duración, en segundos
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Desglose de tiempos de la petición en curso (None si nadie lo ha pedido)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Contador monótono, opcionalmente con etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """Valor que sube y baja. Con `callback` se lee en cada exportación"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        callback: Callable[[], float] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                self.set(self.callback())
+            except Exception as e:
+                # Se exporta el último valor, pero el fallo no pasa desapercibido
+                print(f"Error al leer la métrica {self.name}: {str(e)}")
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con límites fijos, al estilo Prometheus"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: cuentas por límite (no acumuladas), suma y total
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._series.items()
+            )
+        lines = self.header()
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas del proceso, exportables en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        callback: Callable[[], float] = None
+    ) -> Gauge:
+        gauge = self._register(Gauge(name, documentation, labelnames, callback))
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds", "Duración de cada etapa de ingesta y respuesta", ["stage"]
+)
+EMBEDDING_TEXTS = registry.counter(
+    "rag_embedding_texts_total", "Textos enviados al proveedor de embeddings", ["model"]
+)
+EMBEDDING_TOKENS = registry.counter(
+    "rag_embedding_tokens_total", "Tokens estimados enviados al proveedor de embeddings", ["model"]
+)
+EMBEDDING_RETRIES = registry.counter(
+    "rag_embedding_retries_total", "Reintentos de llamadas de embeddings"
+)
+EMBEDDING_CACHE_LOOKUPS = registry.counter(
+    "rag_embedding_cache_lookups_total", "Textos buscados en la caché de embeddings por resultado", ["result"]
+)
+CHAT_TOKENS = registry.counter(
+    "rag_chat_tokens_total", "Fragmentos de texto generados por el proveedor de chat", ["model"]
+)
+CONTEXT_TOKENS = registry.counter(
+    "rag_context_tokens_total", "Tokens estimados de contexto enviados al proveedor de chat"
+)
+ANSWER_CACHE_LOOKUPS = registry.counter(
+    "rag_answer_cache_lookups_total", "Consultas a la caché semántica de respuestas por resultado", ["result"]
+)
+CHAT_REQUESTS = registry.counter(
+    "rag_chat_requests_total", "Consultas de chat por resultado", ["status"]
+)
+INGEST_PAGES = registry.counter("rag_ingest_pages_total", "Páginas de PDF extraídas")
+INGEST_CHUNKS = registry.counter("rag_ingest_chunks_total", "Chunks indexados")
+INGEST_JOBS = registry.counter("rag_ingest_jobs_total", "Trabajos de ingesta terminados por resultado", ["status"])
+INGEST_DUPLICATES = registry.counter(
+    "rag_ingest_duplicates_total", "Duplicados no indexados: PDFs idénticos y chunks enlazados o descartados", ["kind"]
+)
+OPENAI_SHED = registry.counter(
+    "rag_openai_shed_total", "Peticiones interactivas rechazadas por saturación del limitador", ["api"]
+)
+QUERIES_IN_FLIGHT = registry.gauge("rag_queries_in_flight", "Consultas de chat en curso")
+
+
+def record(stage: str, seconds: float):
+    """Registra la duración de una etapa (y en el desglose de la petición, si lo hay)"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Mide el bloque como una etapa: `with span("search"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings():
+    """Recoge el desglose por etapa de lo que se ejecute dentro (misma tarea o tareas hijas)
+
+    Los hilos del executor no heredan el contexto: las etapas que corren allí
+    se miden desde la corrutina que las espera.
+    """
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def timings_ms(timings: Dict[str, float]) -> Dict[str, float]:
+    return {f"{stage}_ms": round(seconds * 1000, 2) for stage, seconds in timings.items()}
@@ -0,0 +1,108 @@
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+from app.config import settings
+from app.services.chunker import BYTES_PER_TOKEN
+from app.services.rate_limiter import RequestLimiter
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Tokens estimados de unos textos, con la misma cuenta que el chunker"""
+    return sum(len(text.encode("utf-8")) // BYTES_PER_TOKEN + 1 for text in texts)
+
+
+def _retry_after(error: Exception) -> float:
+    try:
+        return float(error.response.headers.get("retry-after", 1.0))
+    except (AttributeError, TypeError, ValueError):
+        return 1.0
+
+
+class OpenAIClients:
+    """Clientes de OpenAI únicos por proceso, con un pool HTTP y limitadores comunes
+
+    Embeddings y chat comparten las conexiones (keep-alive) y cada API tiene
+    su limitador de RPM/TPM y concurrencia, porque OpenAI las limita por
+    separado. Un 429 pausa al limitador entero durante el Retry-After, no
+    solo a la petición que lo recibió. El cliente síncrono (scripts, CLI)
+    comparte la configuración pero no pasa por los limitadores.
+    """
+
+    def __init__(self):
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY no está configurada")
+        # Import diferido: el SDK de OpenAI tarda casi un segundo en importarse
+        import httpx
+        from openai import OpenAI, AsyncOpenAI
+
+        limits = httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE
+        )
+        timeout = httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=10.0)
+        # Sin reintentos en el SDK: cada llamada decide los suyos
+        options = {
+            "api_key": settings.OPENAI_API_KEY,
+            "base_url": settings.OPENAI_BASE_URL or None,
+            "max_retries": 0
+        }
+        self.client = OpenAI(**options, http_client=httpx.Client(limits=limits, timeout=timeout))
+        self.async_client = AsyncOpenAI(
+            **options, http_client=httpx.AsyncClient(limits=limits, timeout=timeout)
+        )
+        self.limiters = {
+            "chat": RequestLimiter(
+                "chat",
+                settings.OPENAI_CHAT_RPM,
+                settings.OPENAI_CHAT_TPM,
+                settings.OPENAI_MAX_CONCURRENCY,
+                settings.OPENAI_MAX_WAIT_SECONDS,
+                settings.OPENAI_MAX_QUEUE
+            ),
+            "embeddings": RequestLimiter(
+                "embeddings",
+                settings.OPENAI_EMBEDDING_RPM,
+                settings.OPENAI_EMBEDDING_TPM,
+                settings.OPENAI_MAX_CONCURRENCY,
+                settings.OPENAI_MAX_WAIT_SECONDS,
+                settings.OPENAI_MAX_QUEUE
+            )
+        }
+
+    @asynccontextmanager
+    async def request(self, api: str, tokens: int):
+        """Reserva un turno del limitador de `api` durante el bloque y entrega el cliente
+
+        La prioridad sale del contexto (rate_limiter.background() para la ingesta).
+        """
+        from openai import RateLimitError
+
+        limiter = self.limiters[api]
+        async with limiter.slot(tokens):
+            try:
+                yield self.async_client
+            except RateLimitError as e:
+                limiter.pause(_retry_after(e))
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {api: limiter.stats() for api, limiter in self.limiters.items()}
+
+
+_shared_clients = None
+_shared_lock = threading.Lock()
+
+
+def get_openai_clients() -> OpenAIClients:
+    """Devuelve los clientes de OpenAI compartidos por el proceso"""
+    global _shared_clients
+    if _shared_clients is None:
+        with _shared_lock:
+            if _shared_clients is None:
+                _shared_clients = OpenAIClients()
+    return _shared_clients
+
+
+def openai_clients_stats() -> Dict[str, Any]:
+    """Estado de los limitadores, o {} si nadie ha creado aún los clientes"""
+    return _shared_clients.stats() if _shared_clients is not None else {}
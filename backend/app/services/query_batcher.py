@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+from app.config import settings
+
+
+class QueryBatcher:
+    """Agrupa los embeddings de consultas que llegan casi a la vez en una sola llamada
+
+    La primera consulta de un lote abre una ventana de `max_wait_ms`; el lote
+    sale al cerrarse la ventana o al llegar a `max_batch_size` consultas. Cada
+    llamador recibe su vector en cuanto vuelve la llamada agrupada. Las
+    consultas canceladas mientras esperan se descartan antes de llamar a la API.
+    """
+
+    def __init__(
+        self,
+        embed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = None,
+        max_wait_ms: float = None
+    ):
+        self.embed_many = embed_many
+        self.max_batch_size = max_batch_size or settings.QUERY_BATCH_MAX_SIZE
+        self.max_wait = (settings.QUERY_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.batches = 0
+        self.queries = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Contexto vacío: la llamada agrupada no pertenece a la petición que abrió la ventana
+            task = contextvars.Context().run(asyncio.ensure_future, self._run(batch))
+            # Mantener una referencia para que la tarea no se recoja a medias
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        waiting = [(text, future) for text, future in batch if not future.done()]
+        if not waiting:
+            return
+        self.batches += 1
+        self.queries += len(waiting)
+        try:
+            vectors = await self.embed_many([text for text, _ in waiting])
+        except Exception as e:
+            for _, future in waiting:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(waiting, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional
+from app.services import metrics
+
+# Prioridades: menor número, antes. El chat interactivo adelanta a la ingesta
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background():
+    """Marca como de fondo las llamadas hechas dentro del bloque (y en sus tareas hijas)"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(Exception):
+    """La petición no se puede atender a tiempo: se rechaza en lugar de encolarla"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """Cubo de fichas que se rellena de forma continua hasta el límite por minuto"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya `amount` fichas (0 si ya las hay)"""
+        self.refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RequestLimiter:
+    """Limitador global de peticiones a una API: RPM, TPM y peticiones simultáneas
+
+    Si hay capacidad, la petición sale al momento; si no, espera en una cola
+    por prioridad (las interactivas antes que las de fondo) que se despacha
+    cuando se rellenan los cubos o termina una petición. Una petición
+    interactiva que no podría empezar en `max_wait` segundos, o que llega con
+    la cola llena, se rechaza con `Overloaded` en vez de acumular latencia;
+    las de fondo esperan lo que haga falta. Vive en el event loop (sin hilos).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        max_wait: float,
+        max_queue: int
+    ):
+        self.name = name
+        self.requests = _Bucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = _Bucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.shed = 0
+        self.queued_total = 0
+        # (prioridad, orden de llegada, tokens, future)
+        self._waiters: List = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _wait_time(self, requests: int, tokens: int, now: float) -> float:
+        wait = max(0.0, self.paused_until - now)
+        if self.requests:
+            wait = max(wait, self.requests.wait_for(requests, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_for(tokens, now))
+        return wait
+
+    def _take(self, tokens: int):
+        self.in_flight += 1
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    def _pending(self, priority: int) -> List:
+        return [w for w in self._waiters if w[0] <= priority and not w[3].done()]
+
+    def _dispatch(self):
+        """Da paso a los que esperan, por prioridad, mientras haya capacidad"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.max_concurrency:
+                # release() vuelve a despachar
+                return
+            wait = self._wait_time(1, tokens, now)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            future.set_result(None)
+
+    def check_admission(self, tokens: int = 0, priority: int = None):
+        """Lanza Overloaded si una petición nueva de esta prioridad no saldría a tiempo"""
+        priority = _priority.get() if priority is None else priority
+        if priority != INTERACTIVE:
+            return
+        ahead = self._pending(priority)
+        if not ahead and self.in_flight < self.max_concurrency:
+            estimate = self._wait_time(1, tokens, time.monotonic())
+        else:
+            if len(ahead) >= self.max_queue:
+                self._reject(self.max_wait)
+            estimate = self._wait_time(len(ahead) + 1, sum(w[2] for w in ahead) + tokens, time.monotonic())
+        if estimate > self.max_wait:
+            self._reject(estimate)
+
+    def _reject(self, retry_after: float):
+        self.shed += 1
+        metrics.OPENAI_SHED.inc(api=self.name)
+        raise Overloaded(
+            "Servicio saturado, inténtalo de nuevo en unos segundos", round(retry_after, 1)
+        )
+
+    async def acquire(self, tokens: int = 0, priority: int = None):
+        priority = _priority.get() if priority is None else priority
+        now = time.monotonic()
+        if not self._waiters and self.in_flight < self.max_concurrency and self._wait_time(1, tokens, now) == 0:
+            self._take(tokens)
+            return
+
+        self.check_admission(tokens, priority)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), tokens, future))
+        self.queued_total += 1
+        self._dispatch()
+        timeout = self.max_wait if priority == INTERACTIVE else None
+        # asyncio.wait y no wait_for: en 3.11 wait_for se traga la cancelación
+        # si el turno llega a la vez, y la tarea seguiría con el hueco
+        try:
+            done, _ = await asyncio.wait((future,), timeout=timeout)
+            if not done:
+                future.cancel()
+                self._reject(self.max_wait)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelada justo después de recibir el turno: devolverlo
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            metrics.record("rate_limit_wait", time.monotonic() - now)
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float):
+        """Detiene las salidas (p. ej. tras un 429 con Retry-After)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, priority: int = None):
+        await self.acquire(tokens, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "in_flight": self.in_flight,
+            "queued": len([w for w in self._waiters if not w[3].done()]),
+            "queued_total": self.queued_total,
+            "shed": self.shed,
+            "requests_available": round(self.requests.level, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.level) if self.tokens else None,
+            "paused_for": round(max(0.0, self.paused_until - now), 2)
+        }
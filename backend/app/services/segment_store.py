@@ -0,0 +1,311 @@
+import io
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Optional
+import faiss
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojos entre procesos, solo un worker
+    fcntl = None
+
+
+def _mmap_flags(index_type: str) -> int:
+    """Flags de faiss.read_index para mapear un índice en lugar de copiarlo en memoria
+
+    FAISS 1.7 solo mapea las listas invertidas de IVF: un HNSW se lee entero
+    en cada proceso. Los segmentos planos no tienen índice, se buscan sobre
+    vectors.npy mapeado.
+    """
+    if index_type.split("-")[0] in ("ivf", "ivfpq"):
+        # Las listas invertidas se leen como OnDiskInvertedLists sobre el fichero
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return 0
+
+
+class DocStore:
+    """Documentos de un segmento, leídos de docs.jsonl (mapeado) solo cuando se piden
+
+    Se indexa por id de vector como un dict: `offsets` dice dónde empieza
+    cada línea, así que abrir un segmento no lee ni deserializa nada y las
+    páginas del fichero las comparte el page cache entre workers.
+    """
+
+    def __init__(self, path: str, ids: np.ndarray, offsets: np.ndarray):
+        self.ids = ids
+        self.offsets = offsets
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(ids) else b""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._data[self.offsets[row]:self.offsets[row + 1]])
+
+    def __getitem__(self, vector_id: int) -> Dict[str, Any]:
+        row = int(np.searchsorted(self.ids, vector_id))
+        if row >= len(self.ids) or self.ids[row] != vector_id:
+            raise KeyError(vector_id)
+        return self.row(row)
+
+    def __iter__(self):
+        """Documentos en el orden de los ids"""
+        return (self.row(row) for row in range(len(self.ids)))
+
+
+class SegmentStore:
+    """Persistencia del índice como segmentos inmutables de solo-añadir
+
+    Estructura en disco:
+        MANIFEST.json                 segmentos confirmados, dimensión y siguiente id
+        segments/<nombre>/vectors.npy  float32 (n, dim), se abre con mmap
+        segments/<nombre>/ids.npy      int64 (n,), ids de vector ascendentes
+        segments/<nombre>/docs.jsonl   un documento por línea, en el mismo orden
+        segments/<nombre>/offsets.npy  int64 (n+1,), posición de cada línea de docs.jsonl
+        segments/<nombre>/minhash.npy  uint32 (n, 64), firmas para deduplicar (opcional)
+        segments/<nombre>/index-*.faiss  índice ANN de cada tipo y cuantización (no en los planos)
+        WRITE.lock, COMPACT.lock      cerrojos entre procesos (varios workers)
+
+    Un segmento se escribe primero en un directorio temporal, se sincroniza y se
+    renombra. Solo pasa a formar parte del índice cuando el manifiesto (que se
+    reemplaza de forma atómica) lo referencia, así que un fallo a mitad de una
+    escritura nunca afecta a los datos ya confirmados.
+
+    Con varios procesos sobre el mismo directorio, quien escribe toma
+    WRITE.lock en exclusiva y quien recarga lo toma compartido; la
+    generación del manifiesto dice si lo que hay en disco es más nuevo.
+    """
+
+    MANIFEST = "MANIFEST.json"
+    WRITE_LOCK = "WRITE.lock"
+    COMPACT_LOCK = "COMPACT.lock"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.segments_path = os.path.join(path, "segments")
+
+    @staticmethod
+    def _fsync_dir(path: str):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _atomic_write(self, path: str, data: bytes):
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_dir(os.path.dirname(path))
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, self.MANIFEST))
+
+    def _open_lock(self, name: str) -> int:
+        os.makedirs(self.path, exist_ok=True)
+        # Un descriptor por adquisición: flock sobre descriptores distintos se
+        # excluye también entre hilos del mismo proceso
+        return os.open(os.path.join(self.path, name), os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def lock(self, shared: bool = False):
+        """Cerrojo entre procesos del índice: exclusivo para confirmar, compartido para recargar"""
+        if fcntl is None:
+            yield
+            return
+        fd = self._open_lock(self.WRITE_LOCK)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            # Cerrar el descriptor libera el cerrojo
+            os.close(fd)
+
+    @contextmanager
+    def try_compaction_lock(self):
+        """Cede True si este proceso es el único compactando en este momento"""
+        if fcntl is None:
+            yield True
+            return
+        fd = self._open_lock(self.COMPACT_LOCK)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def manifest_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Firma barata (inodo, mtime, tamaño) del manifiesto para detectar cambios sin leerlo"""
+        try:
+            stat = os.stat(os.path.join(self.path, self.MANIFEST))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def empty_manifest(cls) -> Dict[str, Any]:
+        return {
+            "format": cls.FORMAT_VERSION,
+            "generation": 0,      # sube con cada confirmación
+            "corpus_version": 0,  # sube solo al añadir, borrar o limpiar documentos
+            "dim": None,
+            "embedding_model": None,  # modelo con el que se generaron los vectores
+            "next_id": 0,
+            "segments": [],
+            "documents": {},  # registro de documentos (ver DocumentRegistry)
+            "deleted": []     # rangos [inicio, fin) de ids borrados pendientes de purga
+        }
+
+    def read_manifest(self) -> Dict[str, Any]:
+        """Lee el manifiesto confirmado, o uno vacío si aún no existe"""
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        manifest = self.empty_manifest()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest.update(json.load(f))
+        return manifest
+
+    def commit(self, manifest: Dict[str, Any]):
+        """Confirma un manifiesto nuevo de forma atómica (y le asigna la siguiente generación)"""
+        manifest["generation"] = manifest.get("generation", 0) + 1
+        os.makedirs(self.path, exist_ok=True)
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        self._atomic_write(os.path.join(self.path, self.MANIFEST), data)
+
+    def write_segment(
+        self,
+        ids: np.ndarray,
+        vectors: np.ndarray,
+        docs: List[Dict[str, Any]],
+        signatures: Optional[np.ndarray] = None
+    ) -> str:
+        """Escribe un segmento completo en disco y devuelve su nombre (aún sin confirmar)
+
+        `signatures` son las firmas MinHash de los chunks, para detectar duplicados.
+        """
+        os.makedirs(self.segments_path, exist_ok=True)
+        name = f"seg-{int(ids[0]):012d}-{uuid.uuid4().hex[:8]}"
+        tmp_dir = os.path.join(self.segments_path, f".tmp-{name}")
+        os.makedirs(tmp_dir)
+
+        arrays = [("vectors.npy", vectors), ("ids.npy", ids)]
+        if signatures is not None:
+            arrays.append(("minhash.npy", signatures))
+        for filename, array in arrays:
+            with open(os.path.join(tmp_dir, filename), "wb") as f:
+                np.save(f, array)
+                f.flush()
+                os.fsync(f.fileno())
+
+        offsets = [0]
+        with open(os.path.join(tmp_dir, "docs.jsonl"), "wb") as f:
+            for doc in docs:
+                line = json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(os.path.join(tmp_dir, "offsets.npy"), "wb") as f:
+            np.save(f, np.array(offsets, dtype=np.int64))
+            f.flush()
+            os.fsync(f.fileno())
+
+        final_dir = os.path.join(self.segments_path, name)
+        os.rename(tmp_dir, final_dir)
+        self._fsync_dir(self.segments_path)
+        return name
+
+    def load_segment(self, name: str) -> Tuple[np.ndarray, np.ndarray, DocStore]:
+        """Abre un segmento: vectores, ids y documentos por mmap, sin leerlos"""
+        seg_dir = os.path.join(self.segments_path, name)
+        vectors = np.load(os.path.join(seg_dir, "vectors.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(seg_dir, "ids.npy"), mmap_mode="r")
+        docs_path = os.path.join(seg_dir, "docs.jsonl")
+        offsets_path = os.path.join(seg_dir, "offsets.npy")
+        if not os.path.exists(offsets_path):
+            # Segmento anterior a los offsets: se calculan una vez y se guardan junto a él
+            offsets, position = [np.zeros(1, dtype=np.int64)], 0
+            with open(docs_path, "rb") as f:
+                for piece in iter(lambda: f.read(16 * 1024 * 1024), b""):
+                    offsets.append(np.flatnonzero(np.frombuffer(piece, dtype=np.uint8) == ord("\n")) + position + 1)
+                    position += len(piece)
+            offsets = np.concatenate(offsets).astype(np.int64)
+            buffer = io.BytesIO()
+            np.save(buffer, offsets)
+            self._atomic_write(offsets_path, buffer.getvalue())
+        offsets = np.load(offsets_path, mmap_mode="r")
+        return ids, vectors, DocStore(docs_path, ids, offsets)
+
+    def load_signatures(self, name: str) -> Optional[np.ndarray]:
+        """Firmas MinHash del segmento (mmap), o None si se escribió sin ellas"""
+        path = os.path.join(self.segments_path, name, "minhash.npy")
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def index_path(self, name: str, index_type: str) -> str:
+        return os.path.join(self.segments_path, name, f"index-{index_type}.faiss")
+
+    def read_index(self, name: str, index_type: str, mmap: bool = False) -> Optional[faiss.Index]:
+        """Lee el índice guardado de un segmento, si existe
+
+        `index_type` es la clave de ann_index.index_key (tipo y cuantización).
+        Con `mmap` se mapea el fichero de solo lectura: las páginas se comparten
+        entre todos los procesos que abren el mismo segmento.
+        """
+        path = self.index_path(name, index_type)
+        if not os.path.exists(path):
+            return None
+        return faiss.read_index(path, _mmap_flags(index_type) if mmap else 0)
+
+    def write_index(self, name: str, index_type: str, index: faiss.Index):
+        """Guarda el índice junto al segmento para no reconstruirlo al arrancar (y poder mapearlo)"""
+        path = self.index_path(name, index_type)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+
+    def delete_segments(self, names: List[str]):
+        for name in names:
+            shutil.rmtree(os.path.join(self.segments_path, name), ignore_errors=True)
+
+    def remove_unreferenced(self, manifest: Dict[str, Any], min_age: float = 3600.0):
+        """Borra segmentos huérfanos o temporales que dejó una escritura interrumpida
+
+        Con varios procesos, solo es seguro con WRITE.lock exclusivo y
+        COMPACT.lock tomados (nadie está compactando). Los escritores construyen
+        su segmento sin cerrojos antes de confirmarlo, así que los que no tienen
+        al menos `min_age` segundos se dejan para una limpieza posterior.
+        """
+        if not os.path.isdir(self.segments_path):
+            return
+        referenced = set(manifest["segments"])
+        now = time.time()
+        for name in os.listdir(self.segments_path):
+            path = os.path.join(self.segments_path, name)
+            if name in referenced:
+                continue
+            try:
+                if now - os.path.getmtime(path) < min_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from app.services import metrics
+
+STARTUP_SECONDS = metrics.registry.gauge(
+    "rag_startup_phase_seconds", "Duración de cada fase del arranque del proceso", ["phase"]
+)
+
+
+class Startup:
+    """Arranque en dos tiempos: la app acepta conexiones en cuanto se importa y los
+    servicios pesados (imports, carga del índice, clientes) se crean después
+
+    `start()` lanza el calentamiento en un hilo; las peticiones que necesitan
+    los servicios esperan con `wait()`. `timings` guarda la duración de cada
+    fase para seguir cuánto cuestan los imports y la carga según crece el corpus.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.services: Any = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, phase: str, seconds: float):
+        self.timings[phase] = seconds
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mide el bloque como una fase del arranque"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def start(self, build: Callable[[], Any], on_ready: Callable[[Any], None] = None):
+        """Lanza el calentamiento. `build` corre en un hilo; `on_ready`, en el event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._warm_up(build, on_ready))
+
+    async def _warm_up(self, build: Callable[[], Any], on_ready: Optional[Callable[[Any], None]]):
+        started = time.perf_counter()
+        try:
+            services = await asyncio.get_running_loop().run_in_executor(None, build)
+            if on_ready:
+                on_ready(services)
+            self.services = services
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error al preparar los servicios: {e}")
+        finally:
+            self.record("warm_up", time.perf_counter() - started)
+
+    @property
+    def ready(self) -> bool:
+        return self.services is not None
+
+    async def wait(self) -> Any:
+        """Los servicios, esperando al calentamiento si aún no terminó"""
+        if self.services is None:
+            if self._task is None:
+                raise RuntimeError("Los servicios aún no se han iniciado")
+            await asyncio.shield(self._task)
+        if self.services is None:
+            raise RuntimeError(f"Los servicios no se pudieron iniciar: {self.error}")
+        return self.services
+
+    def status(self) -> Dict[str, Any]:
+        if self.ready:
+            status = "ready"
+        else:
+            status = "failed" if self.error else "warming_up"
+        return {
+            "status": status,
+            "error": self.error,
+            "startup_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.timings.items()}
+        }
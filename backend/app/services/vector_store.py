@@ -1,111 +1,908 @@
+import asyncio
 import os
-from typing import List, Dict, Any
-from langchain.vectorstores import FAISS
+import pickle
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import faiss
+import numpy as np
 from app.config import settings
 from app.services.embeddings_service import EmbeddingsService
+from app.services.segment_store import DocStore, SegmentStore
+from app.services import ann_index, dedup, metrics
+from app.services.document_registry import DocumentRegistry
+from app.services.rate_limiter import Overloaded
+
+
+class Segment:
+    """Segmento inmutable abierto: vectores float32, ids y documentos (mmap, leídos bajo
+    demanda), índice FAISS y firmas MinHash de los chunks (si se escribieron)
+
+    Los segmentos planos no tienen índice (`index` es None): se buscan de forma
+    exacta directamente sobre los vectores mapeados, compartidos entre workers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ids: np.ndarray,
+        vectors: np.ndarray,
+        docs: DocStore,
+        index: Optional[faiss.Index],
+        index_type: str,
+        signatures: Optional[np.ndarray] = None,
+        quantization: str = "none"
+    ):
+        self.name = name
+        self.ids = ids
+        self.vectors = vectors
+        self.docs = docs
+        self.index = index
+        self.index_type = index_type
+        self.signatures = signatures
+        self.quantization = quantization
+        # Distancias aproximadas (int8, float16, PQ): se recalculan con los vectores float32
+        self.lossy = index is not None and ann_index.is_lossy(index_type, quantization)
+        self._lsh: Optional[dedup.LSHIndex] = None
+        self._norms: Optional[np.ndarray] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def lsh(self) -> Optional[dedup.LSHIndex]:
+        """Índice LSH de las firmas, construido la primera vez que se busca un duplicado"""
+        if self._lsh is None and self.signatures is not None:
+            self._lsh = dedup.LSHIndex(self.signatures)
+        return self._lsh
+
+    @property
+    def norms(self) -> np.ndarray:
+        """Normas al cuadrado de los vectores, para la búsqueda exacta de los segmentos planos"""
+        if self._norms is None:
+            self._norms = ann_index.squared_norms(self.vectors)
+        return self._norms
+
+
+class Snapshot:
+    """Versión publicada del índice: segmentos, registro de documentos e ids borrados
+
+    Nunca se modifica una vez publicada.
+    """
+
+    def __init__(
+        self,
+        segments: Tuple[Segment, ...] = (),
+        version: int = 0,
+        registry: DocumentRegistry = None,
+        deleted: np.ndarray = None
+    ):
+        self.segments = segments
+        self.version = version
+        self.registry = registry or DocumentRegistry()
+        # Ids de vector borrados aún presentes en algún segmento (ordenados)
+        self.deleted = deleted if deleted is not None else np.empty(0, dtype=np.int64)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(segment.size for segment in self.segments) - len(self.deleted)
+
+
+class _LegacyObject:
+    """Sustituto de las clases de LangChain (InMemoryDocstore, Document) del index.pkl antiguo
+
+    Solo recupera sus atributos, así que la migración no necesita LangChain instalado.
+    """
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = state[0] or {}
+        # Los modelos de pydantic guardan sus campos en "__dict__"
+        self.__dict__.update(state.get("__dict__", state))
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Unpickler restringido: las clases de LangChain pasan a _LegacyObject y el resto se rechaza"""
+
+    ALLOWED = {("copyreg", "_reconstructor"), ("builtins", "object"), ("collections", "OrderedDict")}
+
+    def find_class(self, module: str, name: str):
+        if module.split(".")[0] in ("langchain", "langchain_community", "langchain_core"):
+            return _LegacyObject
+        if (module, name) in self.ALLOWED:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Clase no permitida en index.pkl: {module}.{name}")
+
+
+def _ids_in(sorted_ids: np.ndarray, low: int, high: int) -> np.ndarray:
+    """Subconjunto de un array ordenado de ids dentro de [low, high]"""
+    return sorted_ids[np.searchsorted(sorted_ids, low):np.searchsorted(sorted_ids, high, side="right")]
+
+
+def _id_selector(ids: np.ndarray) -> faiss.IDSelector:
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    # IDSelectorBatch copia los ids; guardamos la referencia por seguridad
+    selector.referenced_ids = ids
+    return selector
+
 
 class VectorStore:
+    """Almacén vectorial por segmentos con lecturas sobre snapshots inmutables
+
+    Cada subida se añade como un segmento nuevo (solo se escriben sus vectores y
+    documentos) y se publica un snapshot nuevo con una sola asignación. Los
+    lectores toman la referencia actual y buscan sobre ella sin bloqueos. Un
+    compactador en segundo plano fusiona los segmentos pequeños.
+
+    Varios procesos (workers de uvicorn) pueden compartir el directorio: los
+    vectores y los índices IVF se mapean de solo lectura, cada escritura toma el cerrojo
+    exclusivo del SegmentStore y parte del último manifiesto confirmado, y un
+    hilo recarga el snapshot cuando otro proceso confirma una generación nueva.
+    """
+
     def __init__(self):
-        # Usar nuestro servicio que implementa embed_documents/embed_query con OpenAI >=1.0
+        # Servicio de embeddings con el proveedor configurado (OpenAI o local)
         self.embeddings = EmbeddingsService()
-        self.vectorstore = None
+        self.snapshot = Snapshot()
+        # Cambia cuando cambian los documentos, no al compactar: sirve de clave a las cachés de respuestas.
+        # Se guarda en el manifiesto para que coincida en todos los workers
+        self.corpus_version = 0
+        # Serializa a los escritores (y a la recarga) entre sí; los lectores no lo usan
+        self._write_lock = threading.Lock()
         self.storage_path = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, "faiss_index")
+        self.segment_store = SegmentStore(self.storage_path)
+        self.manifest = self.segment_store.read_manifest()
+        # Firma del manifiesto que refleja el snapshot publicado
+        self._manifest_signature = None
+
+        if settings.FAISS_THREADS > 0 or settings.WORKERS > 1:
+            # Con varios workers, repartir los núcleos en lugar de que cada uno use todos
+            faiss.omp_set_num_threads(
+                settings.FAISS_THREADS or max(1, (os.cpu_count() or 1) // settings.WORKERS)
+            )
+
+        self._compact_event = threading.Event()
+        self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+        self._compactor.start()
+
         self.load_vectorstore()
-    
+
+        if settings.INDEX_RELOAD_INTERVAL_MS > 0:
+            self._reloader = threading.Thread(target=self._reload_loop, daemon=True)
+            self._reloader.start()
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
     def load_vectorstore(self):
-        """Carga el vectorstore desde disco"""
+        """Carga los segmentos confirmados desde disco"""
         try:
-            if os.path.exists(self.storage_path):
-                self.vectorstore = FAISS.load_local(
-                    self.storage_path,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-            else:
-                self.vectorstore = None
+            with self._write_lock, self.segment_store.lock():
+                if not self.segment_store.exists() and os.path.exists(os.path.join(self.storage_path, "index.faiss")):
+                    self._migrate_legacy_index()
+
+                manifest = self.segment_store.read_manifest()
+                self._check_embedding_space(manifest)
+                with self.segment_store.try_compaction_lock() as owned:
+                    # Si otro worker está compactando, su segmento aún no confirmado no es basura
+                    if owned:
+                        self.segment_store.remove_unreferenced(manifest)
+                segments = tuple(self._open_segment(name) for name in manifest["segments"])
+                self._install(manifest, segments)
+            self._compact_event.set()
         except Exception as e:
             print(f"Error al cargar vectorstore: {e}")
-            self.vectorstore = None
-    
-    def save_vectorstore(self):
-        """Guarda el vectorstore en disco"""
+            self.snapshot = Snapshot((), self.snapshot.version + 1)
+
+    def _check_embedding_space(self, manifest: Dict[str, Any], dim: Optional[int] = None):
+        """Comprueba que los vectores del proveedor actual son comparables con los del índice
+
+        La dimensión depende del proveedor (1536 con text-embedding-3-small,
+        LOCAL_EMBEDDING_DIM con el local) y vectores de modelos distintos no se
+        pueden mezclar aunque coincida la dimensión.
+        """
+        dim = dim or self.embeddings.dim
+        if manifest["dim"] is not None and dim is not None and manifest["dim"] != dim:
+            raise ValueError(
+                f"Dimensión de embeddings {dim} ({self.embeddings.model}) distinta a la del índice "
+                f"({manifest['dim']}); vacíe el índice o vuelva al proveedor anterior"
+            )
+        model = manifest.get("embedding_model")
+        if model is not None and model != self.embeddings.model:
+            raise ValueError(
+                f"El índice se creó con el modelo {model} y el proveedor actual usa "
+                f"{self.embeddings.model}; vacíe el índice o vuelva al proveedor anterior"
+            )
+
+    def _open_segment(self, name: str) -> Segment:
+        """Abre un segmento y carga o construye su índice según su tamaño y la cuantización
+
+        Los segmentos planos no llevan índice: una copia de sus vectores en un
+        IndexFlat sería memoria privada de cada worker.
+        """
+        ids, vectors, docs = self.segment_store.load_segment(name)
+        index_type = ann_index.resolve_index_type(len(ids))
+        quantization = ann_index.resolve_quantization()
+        index = None
+        if index_type != "flat":
+            key = ann_index.index_key(index_type, quantization)
+            index = self.segment_store.read_index(name, key, mmap=settings.INDEX_MMAP)
+            if index is None:
+                index = ann_index.build_index(vectors, ids, index_type, quantization)
+                self.segment_store.write_index(name, key, index)
+                if settings.INDEX_MMAP:
+                    # Cambiar la copia privada por el fichero mapeado, compartido entre workers
+                    index = self.segment_store.read_index(name, key, mmap=True)
+        signatures = self.segment_store.load_signatures(name)
+        return Segment(name, ids, vectors, docs, index, index_type, signatures, quantization)
+
+    def _migrate_legacy_index(self):
+        """Convierte un índice antiguo de LangChain (index.faiss + index.pkl) en un segmento"""
         try:
-            if self.vectorstore:
-                self.vectorstore.save_local(self.storage_path)
+            index = faiss.read_index(os.path.join(self.storage_path, "index.faiss"))
+            with open(os.path.join(self.storage_path, "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = _LegacyUnpickler(f).load()
+
+            vectors = index.reconstruct_n(0, index.ntotal)
+            docs = []
+            for i in range(index.ntotal):
+                doc = docstore._dict[index_to_docstore_id[i]]
+                docs.append({"content": doc.page_content, "metadata": doc.metadata})
+
+            ids = np.arange(index.ntotal, dtype=np.int64)
+            for doc in docs:
+                doc["metadata"].update(document_id="legacy", tenant_id=settings.DEFAULT_TENANT)
+            name = self.segment_store.write_segment(ids, vectors, docs)
+            manifest = self.segment_store.read_manifest()
+            manifest.update(
+                dim=int(vectors.shape[1]),
+                next_id=int(index.ntotal),
+                segments=[name],
+                documents=DocumentRegistry().with_document(
+                    "legacy", settings.DEFAULT_TENANT, None, [0, int(index.ntotal)], time.time()
+                )
+            )
+            self.segment_store.commit(manifest)
+            os.remove(os.path.join(self.storage_path, "index.faiss"))
+            os.remove(os.path.join(self.storage_path, "index.pkl"))
         except Exception as e:
-            print(f"Error al guardar vectorstore: {e}")
-    
+            print(f"No se pudo migrar el índice antiguo, vuelva a subir los documentos: {e}")
+
     def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """Añade documentos al almacén vectorial"""
         try:
-            # Preparar textos y metadatos
             texts = [doc["content"] for doc in documents]
-            metadatas = [doc["metadata"] for doc in documents]
-
-            if self.vectorstore is None:
-                # Crear nuevo vectorstore
-                self.vectorstore = FAISS.from_texts(
-                    texts=texts,
-                    embedding=self.embeddings,
-                    metadatas=metadatas
+            embeddings = self.embeddings.embed_texts(texts)
+            return self.add_embedded_documents(documents, embeddings)
+        except Exception as e:
+            raise Exception(f"Error al añadir documentos al almacén vectorial: {str(e)}")
+
+    async def aembed_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[List[float]]:
+        """Genera los embeddings de los documentos con el motor asíncrono por lotes"""
+        texts = [doc["content"] for doc in documents]
+        return await self.embeddings.aembed_texts(texts, on_progress=on_progress)
+
+    async def aadd_documents(self, documents: List[Dict[str, Any]]) -> bool:
+        """Versión asíncrona de add_documents: embeddings concurrentes e indexación en un hilo"""
+        embeddings = await self.aembed_documents(documents)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.add_embedded_documents, documents, embeddings)
+
+    def add_embedded_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        document_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        filename: Optional[str] = None
+    ) -> bool:
+        """Añade los chunks de un documento con embeddings ya calculados como un segmento nuevo"""
+        self.add_embedded_batch([{
+            "documents": documents,
+            "embeddings": embeddings,
+            "document_id": document_id,
+            "tenant_id": tenant_id,
+            "filename": filename
+        }])
+        return True
+
+    def add_embedded_batch(self, batch: List[Dict[str, Any]], skip_existing: bool = False) -> List[str]:
+        """Añade varios documentos con embeddings ya calculados en un solo segmento y un solo commit
+
+        Cada elemento lleva "documents", "embeddings" y, opcionalmente,
+        "document_id", "tenant_id", "filename", "content_hash" (hash del
+        fichero), "signatures" (MinHash de los chunks) y los enlaces a chunks
+        casi duplicados de otros documentos que no se indexan de nuevo:
+        "linked_ids" (vectores ya confirmados) y "batch_links" ((document_id,
+        posición) de un chunk de otro documento del mismo lote). Ver
+        dedup.plan_dedup. Un elemento sin chunks ni enlaces pero con
+        "content_hash" solo registra el hash (último commit de una ingesta por
+        lotes). Los ids de cada documento quedan consecutivos dentro del
+        segmento, como en una subida individual. Con `skip_existing`, los
+        documentos que ya están en el registro (visto bajo el cerrojo) se
+        descartan. Devuelve los ids de los añadidos.
+
+        Bajo el cerrojo de escritura solo se reserva el rango de ids y luego
+        se confirma el manifiesto: el segmento y su índice (el entrenamiento
+        IVF/HNSW de un lote grande) se construyen sin bloquear a los demás
+        escritores ni a la recarga de los otros workers, como al compactar.
+        """
+        name = None
+        started = time.perf_counter()
+        try:
+            batch = [
+                {**item, "document_id": item.get("document_id") or str(uuid.uuid4())}
+                for item in batch
+                if item["documents"] or item.get("linked_ids") or item.get("batch_links") or item.get("content_hash")
+            ]
+            if skip_existing:
+                # Filtro previo sin cerrojo; se repite antes de confirmar
+                batch = [item for item in batch if self.snapshot.registry.get(item["document_id"]) is None]
+            if not batch:
+                return []
+
+            docs, vectors, signatures = [], [], []
+            for item in batch:
+                if not item["documents"]:
+                    continue
+                tenant_id = item.get("tenant_id") or settings.DEFAULT_TENANT
+                vectors.append(np.asarray(item["embeddings"], dtype=np.float32))
+                if settings.DEDUP_ENABLED:
+                    item_signatures = item.get("signatures")
+                    if item_signatures is None:
+                        item_signatures = dedup.signatures([doc["content"] for doc in item["documents"]])
+                    signatures.append(item_signatures)
+                docs.extend(
+                    {
+                        "content": doc["content"],
+                        "metadata": {**doc["metadata"], "document_id": item["document_id"], "tenant_id": tenant_id}
+                    }
+                    for doc in item["documents"]
                 )
-            else:
-                # Añadir a vectorstore existente
-                self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
-            
-            # Guardar en disco
-            self.save_vectorstore()
-            
-            return True
+
+            start, segment = None, None
+            if docs:
+                vectors = np.concatenate(vectors)
+                with self._write_lock, self.segment_store.lock():
+                    # Partir de lo último confirmado, aunque lo haya escrito otro worker
+                    self._sync_with_disk()
+                    manifest = dict(self.manifest)
+                    self._check_embedding_space(manifest, int(vectors.shape[1]))
+                    if manifest["dim"] is None:
+                        manifest["dim"] = int(vectors.shape[1])
+                        manifest["embedding_model"] = self.embeddings.model
+                    start = manifest["next_id"]
+                    manifest["next_id"] = start + len(docs)
+                    with metrics.span("manifest_commit"):
+                        self.segment_store.commit(manifest)
+                    self._install(manifest, self.snapshot.segments)
+
+                # Solo se escribe el segmento nuevo; el resto del índice no se toca
+                ids = np.arange(start, start + len(docs), dtype=np.int64)
+                with metrics.span("segment_write"):
+                    name = self.segment_store.write_segment(
+                        ids, vectors, docs, np.concatenate(signatures) if signatures else None
+                    )
+                segment = self._open_segment(name)
+
+            with self._write_lock, self.segment_store.lock():
+                self._sync_with_disk()
+                manifest = dict(self.manifest)
+                registry = DocumentRegistry(manifest["documents"])
+                entries, starts, skipped, offset = [], {}, [], start
+                for item in batch:
+                    document_id = item["document_id"]
+                    count = len(item["documents"])
+                    vector_range = [offset, offset + count] if count else None
+                    if count:
+                        offset += count
+                    if skip_existing and registry.get(document_id) is not None:
+                        # Otro proceso lo confirmó mientras se escribía el segmento: sus vectores
+                        # quedan como borrados y el compactador los purga
+                        if vector_range:
+                            skipped.append(vector_range)
+                        continue
+                    if vector_range:
+                        starts[document_id] = vector_range[0]
+                    entries.append({
+                        "document_id": document_id,
+                        "tenant_id": item.get("tenant_id") or settings.DEFAULT_TENANT,
+                        "filename": item.get("filename"),
+                        "content_hash": item.get("content_hash"),
+                        "vector_range": vector_range,
+                        "linked_ids": list(item.get("linked_ids") or []),
+                        "batch_links": item.get("batch_links") or []
+                    })
+                if not entries:
+                    if name:
+                        self.segment_store.delete_segments([name])
+                        name = None
+                    return []
+
+                # Enlaces a chunks indexados en este lote o en uno anterior aún no visto al planificar
+                for entry in entries:
+                    for target_document, position in entry.pop("batch_links"):
+                        if target_document in starts:
+                            entry["linked_ids"].append(starts[target_document] + position)
+                            continue
+                        target = registry.get(target_document)
+                        if target:
+                            own_ids = DocumentRegistry.ranges_to_ids(target["vector_ranges"])
+                            if position < len(own_ids):
+                                entry["linked_ids"].append(int(own_ids[position]))
+                    entry["linked_ranges"] = DocumentRegistry.ids_to_ranges(entry.pop("linked_ids"))
+
+                new_segments = self.snapshot.segments
+                if segment:
+                    manifest["segments"] = manifest["segments"] + [name]
+                    manifest["deleted"] = manifest["deleted"] + skipped
+                    new_segments = new_segments + (segment,)
+                manifest["documents"] = registry.with_documents(entries, time.time())
+                manifest["corpus_version"] += 1
+                with metrics.span("manifest_commit"):
+                    self.segment_store.commit(manifest)
+                name = None
+                self._install(manifest, new_segments)
+
+            self._compact_event.set()
+            metrics.record("index_add", time.perf_counter() - started)
+            return [entry["document_id"] for entry in entries]
         except Exception as e:
+            if name:
+                # Segmento escrito pero no confirmado
+                self.segment_store.delete_segments([name])
             raise Exception(f"Error al añadir documentos al almacén vectorial: {str(e)}")
-    
-    def search_similar(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Busca documentos similares a la consulta"""
+
+    def delete_document(self, document_id: str) -> bool:
+        """Elimina un documento del índice sin reconstruirlo ni recalcular embeddings
+
+        Sus ids se marcan como borrados y las búsquedas los excluyen dentro de
+        FAISS con un IDSelector; el compactador los purga físicamente después.
+        """
+        try:
+            with self._write_lock, self.segment_store.lock():
+                self._sync_with_disk()
+                registry = DocumentRegistry(self.manifest["documents"])
+                entry = registry.get(document_id)
+                if entry is None:
+                    return False
+                # Los vectores que otro documento enlaza (o posee) siguen vivos
+                candidates = DocumentRegistry.ranges_to_ids(
+                    entry["vector_ranges"] + entry.get("linked_ranges", [])
+                )
+                low, high = (int(candidates[0]), int(candidates[-1])) if len(candidates) else (0, -1)
+                referenced = DocumentRegistry.ranges_to_ids([
+                    [max(start, low), min(end, high + 1)]
+                    for start, end in registry.referenced_ranges(exclude=document_id)
+                    if start <= high and end > low
+                ])
+                manifest = dict(self.manifest)
+                manifest["documents"] = registry.without_document(document_id)
+                manifest["deleted"] = manifest["deleted"] + DocumentRegistry.ids_to_ranges(
+                    np.setdiff1d(candidates, referenced, assume_unique=True)
+                )
+                manifest["corpus_version"] += 1
+                self.segment_store.commit(manifest)
+                self._install(manifest, self.snapshot.segments)
+
+            self._compact_event.set()
+            return True
+        except Exception as e:
+            raise Exception(f"Error al eliminar el documento: {str(e)}")
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot.registry.get(document_id)
+
+    def find_document_by_hash(self, content_hash: str, tenant_id: Optional[str] = None) -> Optional[str]:
+        """Documento del tenant subido desde un fichero idéntico, si lo hay"""
+        return self.snapshot.registry.find_by_hash(content_hash, tenant_id or settings.DEFAULT_TENANT)
+
+    def find_near_duplicates(
+        self,
+        signatures: np.ndarray,
+        tenant_id: str,
+        threshold: float
+    ) -> List[Optional[Tuple[int, str]]]:
+        """Para cada firma MinHash, (id de vector, document_id) del chunk vivo del
+        tenant más parecido con Jaccard estimado ≥ `threshold`, o None"""
+        snapshot = self.snapshot
+        best: List[Optional[Tuple[int, str]]] = [None] * len(signatures)
+        best_score = np.zeros(len(signatures))
+        if not len(signatures):
+            return best
+        for segment in snapshot.segments:
+            lsh = segment.lsh
+            if lsh is None:
+                continue
+            queries, rows, scores = lsh.matches(signatures, threshold)
+            if not len(queries):
+                continue
+            vector_ids = np.asarray(segment.ids)[rows]
+            live = ~np.isin(vector_ids, snapshot.deleted)
+            for query, vector_id, score in zip(queries[live], vector_ids[live], scores[live]):
+                if score <= best_score[query]:
+                    continue
+                metadata = segment.docs[int(vector_id)]["metadata"]
+                if metadata.get("tenant_id") != tenant_id:
+                    continue
+                best[query] = (int(vector_id), metadata.get("document_id"))
+                best_score[query] = score
+        return best
+
+    def list_documents(self, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.snapshot.registry.list(tenant_id)
+
+    def _install(self, manifest: Dict[str, Any], segments: Tuple[Segment, ...]):
+        """Adopta un manifiesto confirmado y publica el snapshot de sus segmentos"""
+        self.manifest = manifest
+        self.corpus_version = manifest["corpus_version"]
+        self._publish(segments)
+        self._manifest_signature = self.segment_store.manifest_signature()
+
+    def _sync_with_disk(self) -> bool:
+        """Adopta el manifiesto de disco si otro proceso confirmó uno más nuevo
+
+        Se llama con los cerrojos tomados. Los segmentos ya abiertos se
+        reutilizan; solo se abren (mapean) los nuevos. Devuelve si hubo cambios.
+        """
+        signature = self.segment_store.manifest_signature()
+        if signature == self._manifest_signature:
+            return False
+        manifest = self.segment_store.read_manifest()
+        if manifest["generation"] == self.manifest["generation"]:
+            self._manifest_signature = signature
+            return False
+        self._check_embedding_space(manifest)
+        opened = {segment.name: segment for segment in self.snapshot.segments}
+        segments = tuple(opened.get(name) or self._open_segment(name) for name in manifest["segments"])
+        self._install(manifest, segments)
+        return True
+
+    def reload(self) -> bool:
+        """Publica la última versión confirmada en disco. Devuelve si cambió algo"""
+        with self._write_lock, self.segment_store.lock(shared=True):
+            return self._sync_with_disk()
+
+    def _reload_loop(self):
+        interval = settings.INDEX_RELOAD_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            try:
+                # Solo un stat por vuelta mientras nadie confirme nada
+                if self.segment_store.manifest_signature() != self._manifest_signature:
+                    self.reload()
+            except Exception as e:
+                print(f"Error al recargar el índice: {e}")
+
+    def _publish(self, segments: Tuple[Segment, ...]):
+        """Publica un nuevo snapshot (con el registro y los borrados del manifiesto) de forma atómica"""
+        self.snapshot = Snapshot(
+            segments,
+            self.snapshot.version + 1,
+            DocumentRegistry(self.manifest["documents"]),
+            DocumentRegistry.ranges_to_ids(self.manifest["deleted"])
+        )
+
+    def _compaction_loop(self):
+        while True:
+            self._compact_event.wait()
+            self._compact_event.clear()
+            try:
+                # Con varios workers compacta uno solo a la vez
+                with self.segment_store.try_compaction_lock() as owned:
+                    while owned and self.compact_once():
+                        pass
+            except Exception as e:
+                print(f"Error al compactar segmentos: {e}")
+
+    def _pick_compaction(self, snapshot: Snapshot) -> List[Segment]:
+        """Elige los segmentos a reescribir: los más pequeños si sobran segmentos,
+        o uno con demasiados vectores borrados"""
+        if len(snapshot.segments) > settings.SEGMENT_MAX_COUNT:
+            return sorted(snapshot.segments, key=lambda s: s.size)[:settings.SEGMENT_MERGE_FACTOR]
+        for segment in snapshot.segments:
+            # Un segmento fusionado no tiene ids contiguos: su intervalo puede incluir
+            # ids (y borrados) de otros segmentos, así que se cuenta la pertenencia real
+            span = _ids_in(snapshot.deleted, int(segment.ids[0]), int(segment.ids[-1]))
+            deleted = int(np.isin(segment.ids, span, assume_unique=True).sum()) if len(span) else 0
+            if deleted and deleted / segment.size >= settings.SEGMENT_PURGE_RATIO:
+                return [segment]
+        return []
+
+    @staticmethod
+    def _prune_deleted(ranges: List[List[int]], segments: Tuple[Segment, ...]) -> List[List[int]]:
+        """Descarta los rangos borrados que ya no están en ningún segmento"""
+        kept = []
+        for start, end in ranges:
+            for segment in segments:
+                position = np.searchsorted(segment.ids, start)
+                if position < segment.size and segment.ids[position] < end:
+                    kept.append([start, end])
+                    break
+        return kept
+
+    def compact_once(self) -> bool:
+        """Fusiona segmentos pequeños y purga vectores borrados. Devuelve si hubo cambios"""
+        snapshot = self.snapshot
+        victims = self._pick_compaction(snapshot)
+        if not victims:
+            return False
+
+        started = time.perf_counter()
+        victims.sort(key=lambda s: int(s.ids[0]))
+        ids = np.concatenate([np.asarray(s.ids) for s in victims])
+        live = ~np.isin(ids, snapshot.deleted)
+        if len(victims) == 1 and live.all():
+            # Nada que purgar: reescribirlo no cambiaría nada y el bucle no pararía
+            return False
+        ids = ids[live]
+        vectors = np.concatenate([np.asarray(s.vectors) for s in victims])[live]
+        signatures = None
+        if settings.DEDUP_ENABLED:
+            # Los segmentos anteriores a la deduplicación reciben sus firmas al fusionarse
+            signatures = np.concatenate([
+                np.asarray(s.signatures) if s.signatures is not None
+                else dedup.signatures([doc["content"] for doc in s.docs])
+                for s in victims
+            ])[live]
+        rows = np.flatnonzero(live)
+        sizes = np.cumsum([0] + [s.size for s in victims])
+        owners = np.searchsorted(sizes, rows, side="right") - 1
+        docs = [victims[owner].docs.row(int(row - sizes[owner])) for row, owner in zip(rows, owners)]
+
+        # La escritura del segmento fusionado se hace sin bloquear a los escritores
+        merged = None
+        if len(ids):
+            name = self.segment_store.write_segment(ids, vectors, docs, signatures)
+            merged = self._open_segment(name)
+        victim_names = {s.name for s in victims}
+
+        with self._write_lock, self.segment_store.lock():
+            self._sync_with_disk()
+            current = self.snapshot.segments
+            if not victim_names.issubset({s.name for s in current}):
+                # El índice cambió (p. ej. se limpió) mientras se fusionaba
+                if merged:
+                    self.segment_store.delete_segments([merged.name])
+                return False
+            segments = ((merged,) if merged else ()) + tuple(s for s in current if s.name not in victim_names)
+            manifest = dict(self.manifest)
+            manifest["segments"] = [s.name for s in segments]
+            manifest["deleted"] = self._prune_deleted(manifest["deleted"], segments)
+            self.segment_store.commit(manifest)
+            self._install(manifest, segments)
+            # Con el cerrojo tomado: ningún worker recargando abre un segmento a medio borrar.
+            # Los snapshots antiguos mantienen abiertos sus mmap aunque se borren los ficheros
+            self.segment_store.delete_segments(list(victim_names))
+        metrics.record("compaction", time.perf_counter() - started)
+        return True
+
+    def _search_plan(
+        self,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None
+    ) -> Optional[Tuple[Snapshot, Optional[np.ndarray]]]:
+        """Snapshot e ids permitidos para una búsqueda, o None si no hay nada que buscar
+
+        Se resuelve antes de generar el embedding para no gastarlo en búsquedas vacías.
+        """
+        # Leer un snapshot consistente sin bloquear a los escritores
+        snapshot = self.snapshot
+        if snapshot.ntotal == 0:
+            return None
+        allowed = None
+        if document_ids or tenant_id:
+            allowed = DocumentRegistry.ranges_to_ids(
+                snapshot.registry.ranges_for(document_ids, tenant_id)
+            )
+            if not len(allowed):
+                return None
+        return snapshot, allowed
+
+    def _search_snapshot(
+        self,
+        snapshot: Snapshot,
+        allowed: Optional[np.ndarray],
+        query_vector: np.ndarray,
+        n_results: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Búsqueda sobre un snapshot (FAISS y numpy liberan el GIL, se puede llamar desde un hilo)"""
+        # Buscar en cada segmento y quedarse con los mejores globales
+        candidates = []
+        for segment in snapshot.segments:
+            low, high = int(segment.ids[0]), int(segment.ids[-1])
+            segment_allowed, segment_deleted = None, None
+            if allowed is not None:
+                segment_allowed = _ids_in(allowed, low, high)
+                if not len(segment_allowed):
+                    continue
+            else:
+                segment_deleted = _ids_in(snapshot.deleted, low, high)
+
+            if segment.index is None:
+                # Segmento plano: búsqueda exacta sobre los vectores mapeados
+                if segment_allowed is not None:
+                    rows = np.searchsorted(segment.ids, segment_allowed)
+                    distances, best = ann_index.exact_search(
+                        query_vector[0], segment.vectors[rows], n_results, segment.norms[rows]
+                    )
+                    ids = segment_allowed[best]
+                else:
+                    distances, best = ann_index.exact_search(
+                        query_vector[0], segment.vectors, n_results, segment.norms,
+                        np.searchsorted(segment.ids, segment_deleted)
+                    )
+                    ids = segment.ids[best]
+                for distance, vector_id in zip(distances, ids):
+                    candidates.append((float(distance), int(vector_id), segment))
+                continue
+
+            selector = None
+            if segment_allowed is not None:
+                selector = _id_selector(segment_allowed)
+            elif len(segment_deleted):
+                inner = _id_selector(segment_deleted)
+                selector = faiss.IDSelectorNot(inner)
+                selector.referenced_inner = inner
+
+            params = ann_index.search_params(segment.index_type, nprobe, ef_search, selector)
+            # Con distancias aproximadas se piden más candidatos y se reordenan con los vectores float32
+            rescore = segment.lossy and settings.VECTOR_RESCORE_FACTOR > 1
+            k = n_results * settings.VECTOR_RESCORE_FACTOR if rescore else n_results
+            distances, ids = segment.index.search(query_vector, min(k, segment.size), params=params)
+            found = ids[0] != -1
+            distances, ids = distances[0][found], ids[0][found]
+            if rescore and len(ids):
+                rows = np.searchsorted(segment.ids, ids)
+                distances = ann_index.exact_distances(query_vector[0], segment.vectors[rows])
+                best = np.argsort(distances)[:n_results]
+                distances, ids = distances[best], ids[best]
+            for distance, vector_id in zip(distances, ids):
+                candidates.append((float(distance), int(vector_id), segment))
+        candidates.sort(key=lambda c: c[0])
+
+        # Formatear resultados
+        formatted_results = []
+        for distance, vector_id, segment in candidates[:n_results]:
+            doc = segment.docs[vector_id]
+            result = {
+                "content": doc["content"],
+                "metadata": doc["metadata"],
+                "distance": distance
+            }
+            if with_vectors:
+                # Vector guardado (sin cuantizar), alineado con los ids ordenados del segmento
+                row = int(np.searchsorted(segment.ids, vector_id))
+                result["vector"] = np.array(segment.vectors[row], dtype=np.float32)
+            formatted_results.append(result)
+
+        return formatted_results
+
+    def search_similar(
+        self,
+        query: str,
+        n_results: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None,
+        with_vectors: bool = False,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Busca documentos similares a la consulta
+
+        `nprobe` (IVF) y `ef_search` (HNSW) ajustan el equilibrio recall/latencia
+        en los segmentos con índice ANN; los segmentos planos los ignoran.
+        `document_ids` y `tenant_id` limitan la búsqueda con un IDSelector dentro
+        del índice, y los segmentos sin vectores del filtro ni se consultan.
+        Con `with_vectors` cada resultado lleva también su vector guardado, y
+        con `query_vector` se reutiliza un embedding de la consulta ya calculado.
+        """
         try:
-            if self.vectorstore is None:
+            plan = self._search_plan(document_ids, tenant_id)
+            if plan is None:
                 return []
-            
-            # Buscar documentos similares
-            docs = self.vectorstore.similarity_search_with_score(query, k=n_results)
-            
-            # Formatear resultados
-            formatted_results = []
-            for doc, score in docs:
-                formatted_results.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "distance": float(score)
-                })
-            
-            return formatted_results
+            if query_vector is None:
+                query_vector = self.embeddings.embed_query(query)
+            query_vector = np.asarray([query_vector], dtype=np.float32)
+            with metrics.span("search"):
+                return self._search_snapshot(
+                    *plan, query_vector, n_results, nprobe, ef_search, with_vectors
+                )
+        except Exception as e:
+            raise Exception(f"Error al buscar documentos similares: {str(e)}")
+
+    async def asearch_similar(
+        self,
+        query: str,
+        n_results: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+        tenant_id: Optional[str] = None,
+        with_vectors: bool = False,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Versión asíncrona de `search_similar` para el event loop
+
+        El embedding se pide con el cliente asíncrono y la búsqueda FAISS se
+        ejecuta en el pool de hilos, así que una consulta no bloquea al resto
+        de conexiones.
+        """
+        try:
+            plan = self._search_plan(document_ids, tenant_id)
+            if plan is None:
+                return []
+            if query_vector is None:
+                query_vector = await self.embeddings.aembed_query(query)
+            query_vector = np.asarray([query_vector], dtype=np.float32)
+            loop = asyncio.get_running_loop()
+            # Se mide desde aquí: el hilo del executor no ve el desglose de la petición
+            with metrics.span("search"):
+                return await loop.run_in_executor(
+                    None,
+                    self._search_snapshot,
+                    *plan, query_vector, n_results, nprobe, ef_search, with_vectors
+                )
+        except Overloaded:
+            raise
         except Exception as e:
             raise Exception(f"Error al buscar documentos similares: {str(e)}")
-    
+
     def get_collection_info(self) -> Dict[str, Any]:
         """Obtiene información sobre la colección"""
         try:
-            if self.vectorstore is None:
-                return {
-                    "total_documents": 0,
-                    "collection_name": "pdf_documents"
-                }
-            
-            # Obtener información del vectorstore
+            snapshot = self.snapshot
             return {
-                "total_documents": self.vectorstore.index.ntotal if hasattr(self.vectorstore, 'index') else 0,
-                "collection_name": "pdf_documents"
+                "total_documents": snapshot.ntotal,
+                "collection_name": "pdf_documents",
+                "version": snapshot.version,
+                "segments": len(snapshot.segments),
+                "documents": len(snapshot.registry),
+                "index_types": sorted({s.index_type for s in snapshot.segments})
             }
         except Exception as e:
             raise Exception(f"Error al obtener información de la colección: {str(e)}")
-    
+
     def clear_collection(self) -> bool:
         """Limpia toda la colección"""
         try:
-            self.vectorstore = None
-            if os.path.exists(self.storage_path):
-                import shutil
-                shutil.rmtree(self.storage_path)
+            with self._write_lock, self.segment_store.lock():
+                self._sync_with_disk()
+                previous = self.manifest
+                # Se confirma un manifiesto vacío (no se borra el directorio) para que las
+                # generaciones y la versión del corpus sigan subiendo en todos los workers
+                manifest = SegmentStore.empty_manifest()
+                manifest["generation"] = previous["generation"]
+                manifest["corpus_version"] = previous["corpus_version"] + 1
+                self.segment_store.commit(manifest)
+                self._install(manifest, ())
+                self.segment_store.delete_segments(previous["segments"])
             return True
         except Exception as e:
             raise Exception(f"Error al limpiar la colección: {str(e)}")
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Devuelve la instancia única del almacén vectorial del proceso"""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = VectorStore()
+    return _shared_store
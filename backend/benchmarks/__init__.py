@@ -0,0 +1 @@
+# Benchmarks y pruebas de carga del backend
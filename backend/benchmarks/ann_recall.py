@@ -0,0 +1,95 @@
+"""Informe de recall vs latencia y tamaño de los índices ANN frente a la búsqueda plana exacta
+
+Uso (desde backend/):
+    python -m benchmarks.ann_recall --vectors 200000 --dim 384
+    python -m benchmarks.ann_recall --from-index --output ann_report.json
+
+Con --from-index se usan los vectores del índice persistido y como consultas
+vectores del propio corpus con ruido; si no, se genera un corpus sintético
+agrupado en clusters (más parecido a embeddings reales que el ruido uniforme).
+Las filas con cuantización (fp16, int8) se miden sin recalcular y recalculando
+las distancias con los float32 sobre --rescore veces k candidatos.
+"""
+import argparse
+import json
+import os
+import numpy as np
+from app.config import settings
+from app.services import ann_index
+from app.services.segment_store import SegmentStore
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    vectors = centers[assignment] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def stored_corpus() -> np.ndarray:
+    store = SegmentStore(os.path.join(settings.CHROMA_PERSIST_DIRECTORY, "faiss_index"))
+    manifest = store.read_manifest()
+    if not manifest["segments"]:
+        raise SystemExit("El índice persistido está vacío")
+    return np.concatenate([np.asarray(store.load_segment(name)[1]) for name in manifest["segments"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=settings.VECTOR_RESCORE_FACTOR)
+    parser.add_argument("--from-index", action="store_true")
+    parser.add_argument("--output", help="Fichero JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    vectors = stored_corpus() if args.from_index else synthetic_corpus(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    dim = vectors.shape[1]
+    configs = (
+        [{"index_type": "ivf", "nprobe": p} for p in (1, 4, 16, 64)]
+        + [{"index_type": "hnsw", "ef_search": ef} for ef in (16, 64, 256)]
+    )
+    if dim % settings.PQ_M == 0:
+        configs += [{"index_type": "ivfpq", "nprobe": p} for p in (4, 16, 64)]
+        configs += [{"index_type": "ivfpq", "nprobe": 16, "rescore": args.rescore}]
+    for quantization in ("fp16", "int8"):
+        for rescore in (1, args.rescore):
+            configs += [
+                {"index_type": "flat", "quantization": quantization, "rescore": rescore},
+                {"index_type": "ivf", "nprobe": 16, "quantization": quantization, "rescore": rescore},
+                {"index_type": "hnsw", "ef_search": 64, "quantization": quantization, "rescore": rescore}
+            ]
+
+    report = ann_index.recall_report(vectors, queries, k=args.k, configs=configs)
+
+    print(f"{len(vectors)} vectores, dim={dim}, {len(queries)} consultas, k={args.k}")
+    print(
+        f"{'índice':<8} {'param':<14} {'cuant.':<6} {'rescore':>7} {'recall':>7} "
+        f"{'ms/consulta':>12} {'build s':>8} {'bytes/vec':>10}"
+    )
+    for row in report:
+        param = ""
+        if "nprobe" in row:
+            param = f"nprobe={row['nprobe']}"
+        elif "ef_search" in row:
+            param = f"efSearch={row['ef_search']}"
+        print(
+            f"{row['index_type']:<8} {param:<14} {row.get('quantization', 'none'):<6} "
+            f"{row.get('rescore', 1):>7} {row['recall']:>7.4f} {row['ms_per_query']:>12.4f} "
+            f"{row['build_s']:>8.2f} {row['bytes_per_vector']:>10.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"vectors": len(vectors), "dim": dim, "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
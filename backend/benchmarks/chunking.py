@@ -0,0 +1,142 @@
+"""Rendimiento del chunker frente al algoritmo anterior de PDFProcessor.chunk_text
+
+Uso (desde backend/):
+    python -m benchmarks.chunking --megabytes 8
+    python -m benchmarks.chunking --megabytes 4 --page-chars 3000 --output chunking.json
+
+Genera texto sintético con frases de longitud variable (con acentos, para que
+el modo por tokens tenga que contar bytes UTF-8) y mide throughput, número de
+chunks y redundancia: fracción de caracteres repetidos por el overlap.
+"""
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from typing import List, Dict, Any, Callable
+from app.services.chunker import Chunker
+
+_WORDS = (
+    "el la de que y en un una los las se del por con para como más pero sus "
+    "índice búsqueda vector documento página consulta respuesta modelo sistema "
+    "información análisis resultado proceso función datos también según año"
+).split()
+
+
+def synthetic_text(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(4, 30))]
+        if len(words) > 8 and rng.random() < 0.5:
+            words[rng.randint(2, len(words) - 3)] += rng.choice(",;")
+        sentence = " ".join(words).capitalize() + rng.choice("...?!")
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+    """Copia literal del algoritmo original de PDFProcessor.chunk_text"""
+    text = re.sub(r'\s+', ' ', text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            for i in range(end, max(start + chunk_size // 2, end - 100), -1):
+                if text[i] in '.!?':
+                    end = i + 1
+                    break
+                elif text[i] in ',;':
+                    end = i + 1
+                    break
+                elif text[i] == ' ':
+                    end = i
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - chunk_overlap
+        if start >= len(text):
+            break
+    return [
+        {"content": chunk, "metadata": {"chunk_id": str(uuid.uuid4()), "chunk_index": i, "source": "pdf_upload"}}
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def paged(text: str, page_chars: int) -> List[str]:
+    return [text[i:i + page_chars] for i in range(0, len(text), page_chars)]
+
+
+def chunk_pages(pages: List[str], **kwargs) -> List[Dict[str, Any]]:
+    chunker = Chunker(**kwargs)
+    chunks = []
+    for page_no, page in enumerate(pages, start=1):
+        chunks.extend(chunker.feed(page, page_no))
+    return chunks + chunker.finish()
+
+
+def measure(name: str, text_length: int, run: Callable[[], List[Dict[str, Any]]], repeat: int) -> Dict[str, Any]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = run()
+        best = min(best, time.perf_counter() - start)
+    emitted = sum(len(c["content"]) for c in chunks)
+    return {
+        "name": name,
+        "seconds": round(best, 4),
+        "mb_per_s": round(text_length / (1024 * 1024) / best, 2),
+        "chunks": len(chunks),
+        "mean_chars": round(emitted / max(len(chunks), 1), 1),
+        "redundancy": round(emitted / text_length - 1, 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=8)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--token-size", type=int, default=256)
+    parser.add_argument("--token-overlap", type=int, default=48)
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Fichero JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    text = synthetic_text(args.megabytes)
+    length = len(re.sub(r'\s+', ' ', text).strip())
+    pages = paged(text, args.page_chars)
+    chars = {"chunk_size": args.chunk_size, "chunk_overlap": args.overlap, "unit": "chars"}
+    tokens = {"chunk_size": args.token_size, "chunk_overlap": args.token_overlap, "unit": "tokens"}
+
+    report = [
+        measure("legacy", length, lambda: legacy_chunk_text(text, args.chunk_size, args.overlap), args.repeat),
+        measure("chunker", length, lambda: Chunker(**chars).split(text), args.repeat),
+        measure("chunker-pages", length, lambda: chunk_pages(pages, **chars), args.repeat),
+        measure("chunker-tokens", length, lambda: Chunker(**tokens).split(text), args.repeat),
+        measure("chunker-tokens-pages", length, lambda: chunk_pages(pages, **tokens), args.repeat),
+    ]
+
+    print(f"{length / (1024 * 1024):.2f} MB de texto, {len(pages)} páginas")
+    print(f"{'variante':<22} {'s':>8} {'MB/s':>8} {'chunks':>8} {'media':>8} {'redund.':>8}")
+    for row in report:
+        print(
+            f"{row['name']:<22} {row['seconds']:>8.3f} {row['mb_per_s']:>8.2f} "
+            f"{row['chunks']:>8} {row['mean_chars']:>8.1f} {row['redundancy']:>8.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"characters": length, "pages": len(pages), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
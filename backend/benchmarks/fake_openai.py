@@ -0,0 +1,245 @@
+"""Servidor local compatible con la API de OpenAI para benchmarks y pruebas de carga
+
+Uso (desde backend/):
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 300 --tokens-per-s 50
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=x python -m app.main
+
+Implementa `POST /v1/embeddings` y `POST /v1/chat/completions` (con y sin
+stream SSE). Los embeddings son los del proveedor local (n-gramas hasheados)
+con la dimensión del modelo pedido, así que la búsqueda sigue teniendo
+sentido; las respuestas de chat son extractivas sobre el contexto del prompt.
+La latencia inicial, el ritmo de tokens y la tasa de errores (429 con
+Retry-After o 500) son configurables.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.chat_providers import LocalChatProvider
+from app.services.embedding_providers import LocalEmbeddingProvider, OpenAIEmbeddingProvider
+
+_TOKEN = re.compile(r"\S+\s*")
+
+
+def create_app(
+    latency_ms: float = 0,
+    embedding_latency_ms: float = None,
+    tokens_per_s: float = 0,
+    answer_tokens: int = 0,
+    error_rate: float = 0.0,
+    seed: int = 0
+) -> FastAPI:
+    """Crea la app del servidor simulado
+
+    `latency_ms` es el tiempo hasta el primer token del chat; `embedding_latency_ms`
+    el de cada llamada de embeddings (por defecto el mismo). `tokens_per_s` = 0
+    envía los tokens sin pausa y `answer_tokens` > 0 fija la longitud de la
+    respuesta repitiendo o recortando la extractiva.
+    """
+    app = FastAPI(title="OpenAI simulado")
+    rng = random.Random(seed)
+    embedding_delay = (latency_ms if embedding_latency_ms is None else embedding_latency_ms) / 1000
+    providers: Dict[int, LocalEmbeddingProvider] = {}
+    chat = LocalChatProvider(token_delay_ms=0)
+    app.state.stats = {"embedding_calls": 0, "embedded_texts": 0, "chat_calls": 0, "errors": 0}
+
+    def injected_error():
+        if error_rate <= 0 or rng.random() >= error_rate:
+            return None
+        app.state.stats["errors"] += 1
+        if rng.random() < 0.5:
+            return JSONResponse(
+                {"error": {"message": "Rate limit simulado", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"Retry-After": "0.05"}
+            )
+        return JSONResponse({"error": {"message": "Error simulado", "type": "server_error"}}, status_code=500)
+
+    def answer_token_list(messages: List[Dict[str, str]], max_tokens: int) -> List[str]:
+        tokens = _TOKEN.findall(chat.answer(messages))
+        if answer_tokens > 0:
+            tokens = (tokens * (answer_tokens // max(len(tokens), 1) + 1))[:answer_tokens]
+        return tokens[:max_tokens]
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        error = injected_error()
+        if error is not None:
+            return error
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        model = body.get("model", "text-embedding-3-small")
+        dim = body.get("dimensions") or OpenAIEmbeddingProvider.DIMENSIONS.get(model, 1536)
+        provider = providers.setdefault(dim, LocalEmbeddingProvider(dim=dim))
+
+        if embedding_delay:
+            await asyncio.sleep(embedding_delay)
+        vectors = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [provider.embed_one(text) for text in texts]
+        )
+        app.state.stats["embedding_calls"] += 1
+        app.state.stats["embedded_texts"] += len(texts)
+
+        # El cliente oficial pide base64 (float32 little-endian) por defecto
+        as_base64 = body.get("encoding_format") == "base64"
+        data = [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": base64.b64encode(vector.astype("<f4").tobytes()).decode() if as_base64
+                else vector.tolist()
+            }
+            for i, vector in enumerate(vectors)
+        ]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = injected_error()
+        if error is not None:
+            return error
+        app.state.stats["chat_calls"] += 1
+        model = body.get("model", "gpt-3.5-turbo")
+        tokens = answer_token_list(body.get("messages", []), body.get("max_tokens") or 1000)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000 + (len(tokens) / tokens_per_s if tokens_per_s else 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            }
+
+        def event(delta: Dict[str, Any], finish_reason=None) -> str:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def events():
+            await asyncio.sleep(latency_ms / 1000)
+            yield event({"role": "assistant", "content": ""})
+            interval = 1 / tokens_per_s if tokens_per_s else 0
+            # Ritmo fijo respecto al inicio para que las pausas no acumulen deriva
+            started = time.perf_counter()
+            for i, token in enumerate(tokens):
+                if interval:
+                    delay = started + i * interval - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield event({"content": token})
+            yield event({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Ejecuta una app ASGI con uvicorn en un hilo aparte (con su propio event loop)
+
+    `call` ejecuta una corrutina en ese mismo loop, que es lo que necesitan
+    los servicios de la app (los clientes asíncronos de OpenAI quedan ligados
+    al loop en el que se usan por primera vez).
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = None, **options):
+        self.host = host
+        self.port = port or free_port(host)
+        config = uvicorn.Config(app, host=self.host, port=self.port, log_level="warning", **options)
+        self.server = uvicorn.Server(config)
+        self.loop: asyncio.AbstractEventLoop = None
+        self.thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        await self.server.serve()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 30) -> "ServerThread":
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.time() > deadline:
+                raise RuntimeError(f"No se pudo arrancar el servidor en {self.url}")
+            time.sleep(0.02)
+        return self
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--embedding-latency-ms", type=float, default=None)
+    parser.add_argument("--tokens-per-s", type=float, default=50)
+    parser.add_argument("--answer-tokens", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate
+    )
+    print(f"OpenAI simulado en http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Benchmark de extremo a extremo: ingesta, búsqueda y TTFT por WebSocket contra un OpenAI simulado
+
+Uso (desde backend/):
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --pdf-pages 10 100 500 --corpus-sizes 10000 100000 \\
+        --clients 1 10 50 200 --output load_test.json
+
+Arranca `benchmarks.fake_openai` en un hilo y apunta el backend a él con
+OPENAI_BASE_URL, con un directorio de índice temporal y sin caché de
+embeddings. Luego mide, en este orden:
+
+  1. Ingesta: PDFs sintéticos de `--pdf-pages` páginas por la IngestQueue
+     real (extracción en procesos, embeddings, commits por lotes): páginas/s
+     y chunks/s.
+  2. Búsqueda: latencia p50/p99 de `asearch_similar` (embedding + FAISS) y
+     solo de FAISS con el índice rellenado con vectores sintéticos hasta cada
+     `--corpus-sizes`, tras compactar.
+  3. Chat: `--clients` conexiones simultáneas a /ws/chat (protocolo delta)
+     con la app real servida por uvicorn; cada cliente hace `--queries`
+     consultas seguidas. Tiempo hasta el primer delta (TTFT) y hasta
+     "complete", p50/p99, y errores.
+
+El informe JSON incluye el commit, la fecha y la configuración.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List
+
+
+def percentile(values: List[float], q: float) -> float:
+    import numpy as np
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def configure_environment(args, fake_url: str):
+    """Variables que lee app.config; hay que fijarlas antes de importar la app"""
+    os.environ["OPENAI_BASE_URL"] = f"{fake_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["EMBEDDING_PROVIDER"] = "openai"
+    os.environ["CHAT_PROVIDER"] = "openai"
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(args.work_dir, "vectorstore")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(args.work_dir, "uploads")
+
+
+async def run_ingest(args, ingest_queue) -> List[Dict[str, Any]]:
+    from benchmarks.synthetic_pdf import synthetic_pdf
+
+    results = []
+    for n_pages in args.pdf_pages:
+        path = os.path.join(args.work_dir, f"synthetic_{n_pages}.pdf")
+        synthetic_pdf(path, n_pages, args.words_per_page, seed=n_pages)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        job = await ingest_queue.submit(path, os.path.basename(path))
+        while job.status not in ("completed", "failed"):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        if job.status == "failed":
+            raise RuntimeError(f"Falló la ingesta de {n_pages} páginas: {job.error}")
+
+        results.append({
+            "pages": n_pages,
+            "bytes": size,
+            "chunks": job.chunks_done,
+            "seconds": round(elapsed, 3),
+            "pages_per_s": round(n_pages / elapsed, 1),
+            "chunks_per_s": round(job.chunks_done / elapsed, 1)
+        })
+    return results
+
+
+def pad_corpus(vector_store, target: int, seed: int):
+    """Rellena el índice con vectores aleatorios normalizados hasta `target` vectores"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    dim = vector_store.manifest["dim"]
+    batch = 20000
+    while vector_store.snapshot.ntotal < target:
+        count = min(batch, target - vector_store.snapshot.ntotal)
+        vectors = rng.standard_normal((count, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        docs = [{"content": f"relleno {i}", "metadata": {"chunk_index": i}} for i in range(count)]
+        vector_store.add_embedded_documents(docs, vectors, filename="relleno")
+    # Medir sobre el índice ya compactado, no durante una fusión
+    while vector_store.compact_once():
+        pass
+
+
+async def run_search(args, vector_store, queries: List[str]) -> List[Dict[str, Any]]:
+    import numpy as np
+
+    results = []
+    vectors = [
+        np.asarray([await vector_store.embeddings.aembed_query(q)], dtype=np.float32)
+        for q in queries
+    ]
+    for target in sorted(args.corpus_sizes):
+        pad_corpus(vector_store, target, seed=target)
+        end_to_end, faiss_only = [], []
+        for i in range(args.searches):
+            query = queries[i % len(queries)]
+            start = time.perf_counter()
+            await vector_store.asearch_similar(query)
+            end_to_end.append((time.perf_counter() - start) * 1000)
+
+            plan = vector_store._search_plan()
+            start = time.perf_counter()
+            vector_store._search_snapshot(*plan, vectors[i % len(vectors)], 5)
+            faiss_only.append((time.perf_counter() - start) * 1000)
+
+        results.append({
+            "corpus_size": vector_store.snapshot.ntotal,
+            "segments": len(vector_store.snapshot.segments),
+            "searches": args.searches,
+            "p50_ms": percentile(end_to_end, 50),
+            "p99_ms": percentile(end_to_end, 99),
+            "faiss_p50_ms": percentile(faiss_only, 50),
+            "faiss_p99_ms": percentile(faiss_only, 99)
+        })
+    return results
+
+
+async def run_clients(url: str, n_clients: int, n_queries: int, queries: List[str]) -> Dict[str, Any]:
+    import websockets
+
+    ttft: List[float] = []
+    totals: List[float] = []
+    errors = 0
+
+    async def client(client_no: int):
+        nonlocal errors
+        async with websockets.connect(url, max_size=None) as ws:
+            await ws.send(json.dumps({"type": "hello", "protocol": "delta"}))
+            json.loads(await ws.recv())
+            for i in range(n_queries):
+                request_id = f"{client_no}-{i}"
+                start = time.perf_counter()
+                first = None
+                await ws.send(json.dumps({
+                    "query": queries[(client_no + i) % len(queries)],
+                    "request_id": request_id
+                }))
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message.get("request_id") != request_id:
+                        continue
+                    if message["type"] == "delta" and first is None:
+                        first = time.perf_counter()
+                    elif message["type"] == "complete":
+                        break
+                    elif message["type"] == "error":
+                        errors += 1
+                        break
+                if first is not None:
+                    ttft.append((first - start) * 1000)
+                    totals.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(client(c) for c in range(n_clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors += sum(1 for outcome in outcomes if isinstance(outcome, BaseException))
+
+    return {
+        "clients": n_clients,
+        "queries": len(totals),
+        "errors": errors,
+        "queries_per_s": round(len(totals) / elapsed, 2),
+        "ttft_p50_ms": percentile(ttft, 50),
+        "ttft_p99_ms": percentile(ttft, 99),
+        "total_p50_ms": percentile(totals, 50),
+        "total_p99_ms": percentile(totals, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Tiempo hasta el primer token del chat")
+    parser.add_argument("--embedding-latency-ms", type=float, default=30)
+    parser.add_argument("--tokens-per-s", type=float, default=100)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--work-dir", help="Directorio de trabajo (por defecto uno temporal que se borra)")
+    parser.add_argument("--output", help="Fichero JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    keep_work_dir = bool(args.work_dir)
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="chatrag-bench-")
+
+    # app.config lee el entorno al importarse (también desde benchmarks.fake_openai)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        fake_port = sock.getsockname()[1]
+    configure_environment(args, f"http://127.0.0.1:{fake_port}")
+    from benchmarks.fake_openai import ServerThread, create_app
+    fake_app = create_app(
+        latency_ms=args.latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate
+    )
+    fake = ServerThread(fake_app, port=fake_port).start()
+
+    from app.config import settings
+    from app.main import app, startup
+    from benchmarks.synthetic_pdf import synthetic_pages
+
+    queries = [
+        sentence.strip() + "?"
+        for page in synthetic_pages(8, args.words_per_page, seed=10)
+        for sentence in page.split(".")[1:4]
+        if sentence.strip()
+    ]
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k != "work_dir"}
+    }
+
+    # Ingesta y búsqueda se ejecutan en el loop del backend, como en producción
+    backend = ServerThread(app, ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE).start()
+    try:
+        services = backend.call(startup.wait())
+        report["startup_ms"] = startup.status()["startup_ms"]
+        report["ingest"] = backend.call(run_ingest(args, services.ingest_queue))
+        print(f"{'páginas':>8} {'chunks':>8} {'s':>8} {'páginas/s':>10} {'chunks/s':>10}")
+        for row in report["ingest"]:
+            print(f"{row['pages']:>8} {row['chunks']:>8} {row['seconds']:>8} "
+                  f"{row['pages_per_s']:>10} {row['chunks_per_s']:>10}")
+
+        report["search"] = backend.call(run_search(args, services.vector_store, queries))
+        print(f"\n{'vectores':>9} {'segm.':>6} {'p50 ms':>8} {'p99 ms':>8} {'faiss p50':>10} {'faiss p99':>10}")
+        for row in report["search"]:
+            print(f"{row['corpus_size']:>9} {row['segments']:>6} {row['p50_ms']:>8} {row['p99_ms']:>8} "
+                  f"{row['faiss_p50_ms']:>10} {row['faiss_p99_ms']:>10}")
+
+        ws_url = backend.url.replace("http", "ws") + "/ws/chat"
+        report["chat"] = [
+            asyncio.run(run_clients(ws_url, n_clients, args.queries, queries))
+            for n_clients in args.clients
+        ]
+        print(f"\n{'clientes':>8} {'consultas':>9} {'errores':>8} {'TTFT p50':>9} {'TTFT p99':>9} "
+              f"{'total p50':>10} {'total p99':>10}")
+        for row in report["chat"]:
+            print(f"{row['clients']:>8} {row['queries']:>9} {row['errors']:>8} {row['ttft_p50_ms']:>9} "
+                  f"{row['ttft_p99_ms']:>9} {row['total_p50_ms']:>10} {row['total_p99_ms']:>10}")
+
+        report["fake_openai"] = dict(fake_app.state.stats)
+    finally:
+        backend.stop()
+        fake.stop()
+        if not keep_work_dir:
+            shutil.rmtree(args.work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Throughput y latencia de embeddings de consultas con y sin micro-batching
+
+Uso (desde backend/):
+    python -m benchmarks.query_batching --clients 200 --queries 20
+    python -m benchmarks.query_batching --waits 0 2 5 10 --output batching.json
+
+La API de embeddings se simula dentro del proceso: cada llamada tarda
+`--api-latency-ms` más `--per-item-ms` por texto y como mucho hay
+`--api-concurrency` llamadas a la vez (como el límite de peticiones de una
+cuenta). Cada cliente lanza sus consultas una tras otra. Se usa el camino real
+de `EmbeddingsService.aembed_query` sin caché; `--waits 0` es sin agrupar.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List, Dict, Any
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+from app.services.embeddings_service import EmbeddingsService
+from app.services.query_batcher import QueryBatcher
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+async def run_config(args, max_wait_ms: float) -> Dict[str, Any]:
+    service = EmbeddingsService()
+    service.cache = None
+    service.query_batcher = QueryBatcher(service.aembed_texts, args.max_batch, max_wait_ms) if max_wait_ms > 0 else None
+
+    api_slots = asyncio.Semaphore(args.api_concurrency)
+    api_calls = 0
+
+    async def fake_create(batch: List[str]) -> List[List[float]]:
+        nonlocal api_calls
+        async with api_slots:
+            api_calls += 1
+            await asyncio.sleep((args.api_latency_ms + args.per_item_ms * len(batch)) / 1000)
+        return [[0.0] * 8 for _ in batch]
+
+    service._acreate_with_retry = fake_create
+    latencies: List[float] = []
+
+    async def client(client_id: int):
+        for i in range(args.queries):
+            start = time.perf_counter()
+            await service.aembed_query(f"consulta {client_id}-{i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "max_wait_ms": max_wait_ms,
+        "queries": len(latencies),
+        "api_calls": api_calls,
+        "queries_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 1, 2, 5, 10])
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--api-latency-ms", type=float, default=40)
+    parser.add_argument("--per-item-ms", type=float, default=0.2)
+    parser.add_argument("--api-concurrency", type=int, default=16)
+    parser.add_argument("--output", help="Fichero JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    report = [asyncio.run(run_config(args, wait)) for wait in args.waits]
+
+    print(f"{args.clients} clientes x {args.queries} consultas, API {args.api_latency_ms} ms, "
+          f"{args.api_concurrency} llamadas simultáneas")
+    print(f"{'espera ms':>9} {'llamadas':>9} {'consultas/s':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in report:
+        print(f"{row['max_wait_ms']:>9} {row['api_calls']:>9} {row['queries_per_s']:>12} "
+              f"{row['p50_ms']:>8} {row['p99_ms']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Memoria por chunk del índice y de los documentos, y coste de leerlos bajo demanda
+
+Uso (desde backend/):
+    python -m benchmarks.storage_footprint --chunks 20000 --dim 1536
+    python -m benchmarks.storage_footprint --chunks 50000 --dim 384 --output footprint.json
+
+Escribe un segmento sintético con el SegmentStore y compara la carga anterior
+de los documentos (todos deserializados en un dict por id) con el DocStore
+mapeado, y el tamaño del índice FAISS plano con vectores float32, float16 e
+int8. La memoria de los documentos es la del heap de Python (tracemalloc); las
+páginas mapeadas son page cache compartido entre workers y no cuentan. El
+efecto en el recall se mide con benchmarks/ann_recall.py.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+import faiss
+import numpy as np
+from app.services import ann_index
+from app.services.segment_store import SegmentStore
+from benchmarks.chunking import synthetic_text
+
+
+def synthetic_docs(n: int, chars: int):
+    text = synthetic_text(n * chars / (1024 * 1024) + 0.1)
+    docs = []
+    for i in range(n):
+        start = i * chars
+        docs.append({
+            "content": text[start:start + chars],
+            "metadata": {
+                "chunk_id": str(uuid.uuid4()),
+                "chunk_index": i % 500,
+                "source": f"documento-{i // 500:05d}.pdf",
+                "char_start": start,
+                "char_end": start + chars,
+                "tokens": chars // 4 + 1,
+                "page_start": i // 3,
+                "page_end": i // 3,
+                "document_id": str(uuid.uuid4()),
+                "tenant_id": "default"
+            }
+        })
+    return docs
+
+
+def traced(load):
+    """Objeto que devuelve `load` y bytes del heap de Python que retiene"""
+    tracemalloc.start()
+    value = load()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, retained
+
+
+def lookup_us(docs, ids: np.ndarray, lookups: int = 2000) -> float:
+    rng = np.random.default_rng(0)
+    sample = [int(vector_id) for vector_id in rng.choice(ids, lookups)]
+    start = time.perf_counter()
+    for vector_id in sample:
+        docs[vector_id]["metadata"]
+    return (time.perf_counter() - start) * 1e6 / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--chars", type=int, default=1000, help="Caracteres por chunk")
+    parser.add_argument("--output", help="Fichero JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(args.chunks, dtype=np.int64)
+    docs = synthetic_docs(args.chunks, args.chars)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = SegmentStore(path)
+        name = store.write_segment(ids, vectors, docs)
+        del docs
+        docs_path = os.path.join(store.segments_path, name, "docs.jsonl")
+
+        def load_dict():
+            with open(docs_path, "r", encoding="utf-8") as f:
+                return {int(vector_id): json.loads(line) for vector_id, line in zip(ids, f)}
+
+        loaded, dict_bytes = traced(load_dict)
+        dict_us = lookup_us(loaded, ids)
+        del loaded
+        (_, _, docstore), docstore_bytes = traced(lambda: store.load_segment(name))
+        docstore_us = lookup_us(docstore, ids)
+        disk_bytes = os.path.getsize(docs_path)
+
+    report = {
+        "chunks": args.chunks,
+        "dim": args.dim,
+        "docs": {
+            "dict": {"bytes_per_chunk": round(dict_bytes / args.chunks, 1), "lookup_us": round(dict_us, 2)},
+            "docstore": {
+                "bytes_per_chunk": round(docstore_bytes / args.chunks, 1),
+                "lookup_us": round(docstore_us, 2),
+                "disk_bytes_per_chunk": round(disk_bytes / args.chunks, 1)
+            }
+        },
+        "index": {}
+    }
+    for quantization in ann_index.QUANTIZATIONS:
+        index = ann_index.build_index(vectors, ids, "flat", quantization)
+        report["index"][quantization] = round(len(faiss.serialize_index(index)) / args.chunks, 1)
+
+    print(f"{args.chunks} chunks de {args.chars} caracteres, dim={args.dim}")
+    print(f"{'documentos':<12} {'bytes/chunk':>12} {'µs/lectura':>11}")
+    for kind, row in report["docs"].items():
+        print(f"{kind:<12} {row['bytes_per_chunk']:>12.1f} {row['lookup_us']:>11.2f}")
+    print(f"{'índice':<12} {'bytes/chunk':>12}")
+    for quantization, size in report["index"].items():
+        print(f"{quantization:<12} {size:>12.1f}")
+
+    before = report["docs"]["dict"]["bytes_per_chunk"] + report["index"]["none"]
+    after = report["docs"]["docstore"]["bytes_per_chunk"] + report["index"]["int8"]
+    report["mb_per_million"] = {"before": round(before / 1.048576, 1), "after": round(after / 1.048576, 1)}
+    print(
+        f"Por millón de chunks: {report['mb_per_million']['before']:.0f} MB (float32 + dict) -> "
+        f"{report['mb_per_million']['after']:.0f} MB (int8 + DocStore)"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""PDFs sintéticos de texto para benchmarks y pruebas de carga
+
+Genera PDFs mínimos (una fuente estándar y un stream de texto por página) sin
+dependencias externas, de forma determinista a partir de una semilla.
+"""
+import random
+from typing import List
+
+_WORDS = (
+    "el la de que y en un una los las se del por con para como más pero sus "
+    "índice búsqueda vector documento página consulta respuesta modelo sistema "
+    "información análisis resultado proceso función datos también según año "
+    "contrato cliente factura servicio periodo importe cláusula anexo informe"
+).split()
+
+
+def synthetic_pages(n_pages: int, words_per_page: int = 350, seed: int = 0) -> List[str]:
+    """Texto de cada página: frases de longitud variable con puntuación"""
+    rng = random.Random(seed)
+    pages = []
+    for page_no in range(n_pages):
+        sentences, count = [f"Página {page_no + 1}."], 0
+        while count < words_per_page:
+            length = rng.randint(5, 25)
+            words = [rng.choice(_WORDS) for _ in range(length)]
+            if length > 8 and rng.random() < 0.4:
+                words[rng.randint(2, length - 3)] += ","
+            sentences.append(" ".join(words).capitalize() + rng.choice("...?"))
+            count += length
+        pages.append(" ".join(sentences))
+    return pages
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], line_chars: int = 90):
+    """Escribe un PDF con una página por texto (Helvetica, WinAnsi)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + 2 * len(pages)
+
+    for i, text in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        lines = [text[j:j + line_chars] for j in range(0, len(text), line_chars)]
+        operations = "BT /F1 9 Tf 11 TL 36 760 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        data = operations.encode("cp1252", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def synthetic_pdf(path: str, n_pages: int, words_per_page: int = 350, seed: int = 0) -> List[str]:
+    """Genera un PDF sintético y devuelve el texto de sus páginas"""
+    pages = synthetic_pages(n_pages, words_per_page, seed)
+    write_pdf(path, pages)
+    return pages
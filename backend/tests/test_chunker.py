@@ -0,0 +1,82 @@
+import bisect
+import random
+from app.services.chunker import BYTES_PER_TOKEN, Chunker
+
+_WORDS = "el índice de búsqueda vector documento página consulta respuesta modelo datos año".split()
+
+
+def _pages(count: int = 6, seed: int = 0):
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        sentences = []
+        for _ in range(rng.randint(8, 20)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(3, 18))]
+            if len(words) > 6 and rng.random() < 0.4:
+                words[3] += ","
+            sentences.append(" ".join(words).capitalize() + rng.choice(".?!"))
+        pages.append("  ".join(sentences) + "\n")
+    return pages
+
+
+def _chunk_pages(chunker: Chunker, pages):
+    chunks = []
+    for number, text in enumerate(pages, start=1):
+        chunks.extend(chunker.feed(text, number))
+    return chunks + chunker.finish()
+
+
+def _document(pages):
+    """Texto normalizado del documento y offset donde empieza cada página"""
+    parts = [" ".join(text.split()) for text in pages]
+    offsets, position = [], 0
+    for part in parts:
+        offsets.append(position)
+        position += len(part) + 1
+    return " ".join(parts), offsets
+
+
+def test_chunks_respect_size_overlap_and_pages():
+    pages = _pages()
+    text, offsets = _document(pages)
+    chunks = _chunk_pages(Chunker(chunk_size=200, chunk_overlap=50, unit="chars"), pages)
+
+    assert len(chunks) > 10
+    assert [c["metadata"]["chunk_index"] for c in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        metadata = chunk["metadata"]
+        assert len(chunk["content"]) <= 200
+        assert text[metadata["char_start"]:metadata["char_end"]] == chunk["content"]
+        assert metadata["page_start"] == bisect.bisect_right(offsets, metadata["char_start"])
+        assert metadata["page_end"] == bisect.bisect_right(offsets, metadata["char_end"] - 1)
+
+    overlaps = [
+        previous["metadata"]["char_end"] - current["metadata"]["char_start"]
+        for previous, current in zip(chunks, chunks[1:])
+    ]
+    assert all(overlap <= 50 for overlap in overlaps)
+    assert sum(overlap > 0 for overlap in overlaps) >= len(overlaps) // 2
+    # Todo el documento queda cubierto
+    assert chunks[0]["metadata"]["char_start"] == 0
+    assert chunks[-1]["metadata"]["char_end"] == len(text)
+    assert all(c["metadata"]["char_start"] < n["metadata"]["char_start"] for c, n in zip(chunks, chunks[1:]))
+
+
+def test_page_by_page_matches_whole_text():
+    pages = _pages(seed=1)
+    whole = Chunker(chunk_size=300, chunk_overlap=60, unit="chars").split(" ".join(pages))
+    streamed = _chunk_pages(Chunker(chunk_size=300, chunk_overlap=60, unit="chars"), pages)
+    assert [c["content"] for c in streamed] == [c["content"] for c in whole]
+
+
+def test_token_unit_limits_utf8_bytes():
+    pages = _pages(seed=2)
+    chunks = _chunk_pages(Chunker(chunk_size=60, chunk_overlap=10, unit="tokens"), pages)
+    assert all(len(c["content"].encode("utf-8")) <= 60 * BYTES_PER_TOKEN for c in chunks)
+
+
+def test_punctuation_at_limit_does_not_overflow():
+    # El punto cae justo en la posición CHUNK_SIZE: cortar detrás de él daría 21 caracteres
+    text = "abcd efgh ijkl mnopq. rstu vwxy zabc defg hijk lmno."
+    chunks = Chunker(chunk_size=20, chunk_overlap=5, unit="chars").split(text)
+    assert all(len(c["content"]) <= 20 for c in chunks)
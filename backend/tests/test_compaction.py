@@ -0,0 +1,52 @@
+import time
+import numpy as np
+import pytest
+from app.config import settings
+from app.services.vector_store import VectorStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMA_PERSIST_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "INDEX_RELOAD_INTERVAL_MS", 0)
+    monkeypatch.setattr(settings, "SEGMENT_MAX_COUNT", 2)
+    monkeypatch.setattr(settings, "SEGMENT_MERGE_FACTOR", 2)
+    return VectorStore()
+
+
+def _add(store: VectorStore, document_id: str, count: int):
+    rng = np.random.default_rng(len(document_id) + count)
+    docs = [{"content": f"{document_id} {i}", "metadata": {"chunk_index": i}} for i in range(count)]
+    vectors = rng.standard_normal((count, settings.LOCAL_EMBEDDING_DIM)).astype(np.float32)
+    store.add_embedded_documents(docs, vectors, document_id=document_id)
+
+
+def _wait_idle(store: VectorStore, quiet: float = 1.0, timeout: float = 10.0) -> bool:
+    """True si la generación del manifiesto deja de cambiar durante `quiet` segundos"""
+    deadline = time.monotonic() + timeout
+    generation, since = store.manifest["generation"], time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        if store.manifest["generation"] != generation:
+            generation, since = store.manifest["generation"], time.monotonic()
+        elif time.monotonic() - since >= quiet:
+            return True
+    return False
+
+
+def test_delete_after_smallest_merge_leaves_compactor_idle(store):
+    # Los dos segmentos pequeños se fusionan: ids 0-9 y 110-119, con "b" (10-109) en medio
+    _add(store, "a", 10)
+    _add(store, "b", 100)
+    _add(store, "c", 10)
+    assert _wait_idle(store)
+    merged = [segment for segment in store.snapshot.segments if segment.size == 20]
+    assert merged and not np.isin(np.arange(10, 110), merged[0].ids).any()
+
+    assert store.delete_document("b")
+    assert _wait_idle(store)
+    assert store.snapshot.ntotal == 20
+    assert [segment.size for segment in store.snapshot.segments] == [20]
+    assert not store.compact_once()
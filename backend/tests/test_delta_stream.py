@@ -0,0 +1,46 @@
+import asyncio
+from app.services.delta_stream import DeltaStream
+
+
+def test_slow_client_applies_backpressure():
+    async def scenario():
+        sent = []
+        peak = 0
+
+        async def slow_send(frame: str):
+            await asyncio.sleep(0.02)
+            sent.append(frame)
+
+        stream = DeltaStream(slow_send, flush_interval=0.001, flush_chars=10, max_pending_chars=40)
+        deltas = [f"{i:04d}" for i in range(200)]
+        started = asyncio.get_running_loop().time()
+        for delta in deltas:
+            await stream.push(delta)
+            peak = max(peak, stream._pending_chars)
+        await stream.close()
+        return deltas, sent, peak, asyncio.get_running_loop().time() - started
+
+    deltas, sent, peak, elapsed = asyncio.run(scenario())
+    assert "".join(sent) == "".join(deltas)
+    # El productor nunca acumula más de la marca alta (más el último fragmento)
+    assert peak < 40 + 4
+    # Y va al ritmo del cliente: 800 caracteres en frames de ≤ 44 tardan varios envíos
+    assert len(sent) >= 800 // 44
+    assert elapsed >= 0.02 * (len(sent) - 1)
+
+
+def test_failed_send_reaches_blocked_producer():
+    async def scenario():
+        async def broken_send(frame: str):
+            await asyncio.sleep(0.01)
+            raise ConnectionError("cliente desconectado")
+
+        stream = DeltaStream(broken_send, flush_interval=0.001, flush_chars=4, max_pending_chars=8)
+        for i in range(1000):
+            await stream.push(f"{i:04d}")
+
+    try:
+        asyncio.run(scenario())
+    except ConnectionError:
+        return
+    raise AssertionError("push debería propagar el error del envío")
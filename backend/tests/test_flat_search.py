@@ -0,0 +1,72 @@
+import os
+import faiss
+import numpy as np
+import pytest
+from app.config import settings
+from app.services.vector_store import VectorStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMA_PERSIST_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "INDEX_RELOAD_INTERVAL_MS", 0)
+    monkeypatch.setattr(settings, "DEDUP_ENABLED", False)
+    # Sin compactación: cada documento queda en su segmento plano
+    monkeypatch.setattr(settings, "SEGMENT_MAX_COUNT", 100)
+    return VectorStore()
+
+
+def _add(store: VectorStore, document_id: str, vectors: np.ndarray):
+    docs = [{"content": f"{document_id} {i}", "metadata": {"chunk_index": i}} for i in range(len(vectors))]
+    store.add_embedded_documents(docs, vectors, document_id=document_id)
+
+
+def _exact(vectors: np.ndarray, query: np.ndarray, k: int):
+    """Referencia: IndexFlatL2 de FAISS sobre todos los vectores"""
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    distances, rows = index.search(query.reshape(1, -1), k)
+    return distances[0], rows[0]
+
+
+def _search(store: VectorStore, query: np.ndarray, k: int, **filters):
+    return store.search_similar("", n_results=k, query_vector=query.tolist(), **filters)
+
+
+def test_flat_segments_match_faiss_without_index_files(store):
+    rng = np.random.default_rng(0)
+    dim = settings.LOCAL_EMBEDDING_DIM
+    corpus = {
+        name: rng.standard_normal((count, dim)).astype(np.float32)
+        for name, count in (("a", 40), ("b", 25), ("c", 30))
+    }
+    for name, vectors in corpus.items():
+        _add(store, name, vectors)
+
+    assert all(segment.index is None for segment in store.snapshot.segments)
+    segments_path = store.segment_store.segments_path
+    for name in os.listdir(segments_path):
+        assert not any(filename.endswith(".faiss") for filename in os.listdir(os.path.join(segments_path, name)))
+
+    query = rng.standard_normal(dim).astype(np.float32)
+    everything = np.concatenate(list(corpus.values()))
+    labels = [f"{name} {i}" for name, vectors in corpus.items() for i in range(len(vectors))]
+    distances, rows = _exact(everything, query, 10)
+    results = _search(store, query, 10)
+    assert [r["content"] for r in results] == [labels[row] for row in rows]
+    assert np.allclose([r["distance"] for r in results], distances, rtol=1e-4)
+
+    # Filtro por documento: solo sus vectores
+    distances, rows = _exact(corpus["b"], query, 5)
+    results = _search(store, query, 5, document_ids=["b"])
+    assert [r["content"] for r in results] == [f"b {row}" for row in rows]
+
+    # Los vectores borrados no salen, aunque se pidan más resultados de los que quedan
+    assert store.delete_document("a")
+    rest = np.concatenate([corpus["b"], corpus["c"]])
+    labels = labels[40:]
+    distances, rows = _exact(rest, query, len(rest))
+    results = _search(store, query, 100)
+    assert [r["content"] for r in results] == [labels[row] for row in rows]
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from app.services.rate_limiter import BACKGROUND, INTERACTIVE, Overloaded, RequestLimiter
+
+
+def _limiter(**overrides) -> RequestLimiter:
+    options = dict(
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_concurrency=1,
+        max_wait=5.0,
+        max_queue=10
+    )
+    options.update(overrides)
+    return RequestLimiter("test", **options)
+
+
+def test_interactive_goes_before_background():
+    async def scenario():
+        limiter = _limiter()
+        order = []
+
+        async def worker(label: str, priority: int):
+            async with limiter.slot(priority=priority):
+                order.append(label)
+                await asyncio.sleep(0.01)
+
+        # Ocupa el único hueco para que el resto tenga que encolarse
+        await limiter.acquire(priority=INTERACTIVE)
+        tasks = [asyncio.create_task(worker(f"fondo-{i}", BACKGROUND)) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("chat", INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 3
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(scenario())
+    assert order == ["chat", "fondo-0", "fondo-1"]
+    assert limiter.in_flight == 0
+
+
+def test_request_is_shed_when_estimate_exceeds_max_wait():
+    async def scenario():
+        # 60 RPM: una ficha por segundo, y el cubo ya vacío
+        limiter = _limiter(requests_per_minute=60, max_concurrency=10, max_wait=0.5)
+        limiter.requests.level = 0
+        with pytest.raises(Overloaded) as error:
+            limiter.check_admission(priority=INTERACTIVE)
+        assert error.value.retry_after > 0.5
+        with pytest.raises(Overloaded):
+            await limiter.acquire(priority=INTERACTIVE)
+        # Las de fondo no se rechazan: esperan su turno
+        limiter.check_admission(priority=BACKGROUND)
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.shed == 2
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    async def scenario():
+        limiter = _limiter()
+        await limiter.acquire(priority=INTERACTIVE)
+        waiter = asyncio.create_task(limiter.acquire(priority=INTERACTIVE))
+        await asyncio.sleep(0)
+        # El turno pasa al que espera y se cancela antes de que llegue a usarlo
+        limiter.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.in_flight == 0
+
+        # El hueco devuelto sirve a la siguiente petición sin esperar
+        await asyncio.wait_for(limiter.acquire(priority=INTERACTIVE), 0.1)
+
+        # Cancelada aún en la cola: no recibe el hueco al liberarse
+        queued = asyncio.create_task(limiter.acquire(priority=BACKGROUND))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.in_flight == 0
+    assert limiter.stats()["queued"] == 0
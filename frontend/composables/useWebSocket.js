@@ -8,6 +8,10 @@ export const useWebSocket = () => {
   const messages = ref([])
   const currentResponse = ref('')
   const isProcessing = ref(false)
+  // Protocolo de streaming acordado con el servidor: 'legacy' hasta recibir el hello
+  const protocol = ref('legacy')
+  // Consulta cuya respuesta se está mostrando (las demás se ignoran)
+  const currentRequestId = ref(null)
 
   const config = useRuntimeConfig()
 
@@ -25,25 +29,48 @@ export const useWebSocket = () => {
       socket.value.onopen = () => {
         isConnected.value = true
         isConnecting.value = false
+        protocol.value = 'legacy'
+        // Pedir el protocolo "delta": solo texto nuevo, agrupado en frames
+        socket.value.send(JSON.stringify({ type: 'hello', protocol: 'delta' }))
         console.log('WebSocket conectado')
       }
 
       socket.value.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data)
+
+          // Ignorar restos de consultas anteriores o canceladas
+          if (data.request_id && currentRequestId.value && data.request_id !== currentRequestId.value) {
+            return
+          }
           
           switch (data.type) {
+            case 'hello':
+              protocol.value = data.protocol
+              break
+
             case 'processing':
               isProcessing.value = true
               currentResponse.value = ''
               break
               
+            case 'delta':
+              currentResponse.value += data.content
+              break
+
             case 'chunk':
               currentResponse.value = data.full_response
               break
               
+            case 'cancelled':
+              isProcessing.value = false
+              currentRequestId.value = null
+              currentResponse.value = ''
+              break
+
             case 'complete':
               isProcessing.value = false
+              currentRequestId.value = null
               if (currentResponse.value) {
                 messages.value.push({
                   id: Date.now(),
@@ -113,9 +140,11 @@ export const useWebSocket = () => {
     })
 
     // Enviar mensaje al servidor
+    currentRequestId.value = `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`
     const message = {
       query: query,
-      chat_history: chatHistory
+      chat_history: chatHistory,
+      request_id: currentRequestId.value
     }
 
     try {
@@ -127,6 +156,14 @@ export const useWebSocket = () => {
     }
   }
 
+  // Detener la respuesta en curso: el servidor corta también la generación
+  const cancelMessage = () => {
+    if (!currentRequestId.value || !socket.value || socket.value.readyState !== WebSocket.OPEN) {
+      return
+    }
+    socket.value.send(JSON.stringify({ type: 'cancel', request_id: currentRequestId.value }))
+  }
+
   const clearMessages = () => {
     messages.value = []
     currentResponse.value = ''
@@ -151,9 +188,11 @@ export const useWebSocket = () => {
     messages: readonly(messages),
     currentResponse: readonly(currentResponse),
     isProcessing: readonly(isProcessing),
+    protocol: readonly(protocol),
     connect,
     disconnect,
     sendMessage,
+    cancelMessage,
     clearMessages
   }
 }